@@ -0,0 +1,201 @@
+"""
+Benchmark of assess_sequences on a synthetic corpus of PMC articles.
+
+Times the text extraction (`get_text`), every detector of `PMCScraper`
+and the end-to-end `analyze_pdf` on articles generated by
+`synthetic_jats`, with the E-utilities responses mocked by `responses`.
+Throughput is reported in articles per second (best of `--repeat` runs)
+together with the peak memory traced by tracemalloc in a separate run.
+Detectors relying on NLTK are skipped if its punkt tokenizer is not
+installed.
+
+Usage:
+    python benchmarks/bench_assess_sequences.py --articles 200 --seed 0
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import os
+import re
+import sys
+import time
+import tracemalloc
+from argparse import Namespace
+from urllib.parse import parse_qs, urlparse
+
+import responses
+from bs4 import BeautifulSoup
+
+from mishmash.scrape_pdf import PMCScraper, analyze_pdf
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic_jats import esearch_count_xml, generate_corpus  # noqa: E402
+
+EFETCH_URL = re.compile(r".*/efetch\.fcgi.*")
+ESEARCH_URL = re.compile(r".*/esearch\.fcgi.*")
+
+DETECTORS = (
+    "get_accession_tuples", "get_database_names", "check_non_insdc_db",
+    "get_pcr_primers", "get_method_weights", "get_code_links",
+    "get_number_of_records_sra",
+)
+
+
+def _query_param(request, name: str) -> str:
+    return parse_qs(urlparse(request.url).query).get(name, [""])[0]
+
+
+def mock_eutils(articles: list) -> responses.RequestsMock:
+    """Serves the articles (and their SRA record counts) over HTTP."""
+    by_id = {a.pmc_id: a for a in articles}
+    counts = {k: v for a in articles for k, v in a.sra_counts.items()}
+    mock = responses.RequestsMock(assert_all_requests_are_fired=False)
+    mock.add_callback(
+        responses.GET, EFETCH_URL,
+        callback=lambda r: (200, {}, by_id[_query_param(r, "id")].xml),
+    )
+    mock.add_callback(
+        responses.GET, ESEARCH_URL,
+        callback=lambda r: (
+            200, {}, esearch_count_xml(counts.get(_query_param(r, "term"), 0))
+        ),
+    )
+    return mock
+
+
+def _scrapers_with_soup(articles: list) -> list:
+    scrapers = []
+    for article in articles:
+        scraper = PMCScraper(article.pmc_id)
+        scraper.content = BeautifulSoup(article.xml, features="xml")
+        scrapers.append(scraper)
+    return scrapers
+
+
+def _scrapers_with_text(texts: dict) -> list:
+    scrapers = []
+    for pmc_id, text in texts.items():
+        scraper = PMCScraper(pmc_id)
+        scraper.is_blocked = False
+        scraper.core_text = text
+        scrapers.append(scraper)
+    return scrapers
+
+
+def bench_parse(articles, texts):
+    return None, lambda _: [BeautifulSoup(a.xml, features="xml")
+                            for a in articles]
+
+
+def bench_get_text(articles, texts):
+    # get_text modifies the soup - every run gets its own
+    def run(scrapers):
+        for scraper in scrapers:
+            scraper.get_text()
+    return lambda: _scrapers_with_soup(articles), run
+
+
+def bench_detector(name):
+    def bench(articles, texts):
+        def run(scrapers):
+            for scraper in scrapers:
+                getattr(scraper, name)()
+        return lambda: _scrapers_with_text(texts), run
+    return bench
+
+
+def bench_analyze_pdf(articles, texts):
+    args = Namespace(pmc_list=[a.pmc_id for a in articles],
+                     pmc_input_file=None, include_journal_data=True)
+
+    def run(_):
+        # silence the list of the blocked articles
+        with contextlib.redirect_stdout(io.StringIO()):
+            analyze_pdf(args)
+    return None, run
+
+
+def measure(setup, run, repeat: int, memory: bool):
+    """Returns the best time of `repeat` runs and the peak memory of
+    a separate (traced) one."""
+    best = float("inf")
+    for _ in range(repeat):
+        state = setup() if setup else None
+        gc.collect()
+        start = time.perf_counter()
+        run(state)
+        best = min(best, time.perf_counter() - start)
+    peak = None
+    if memory:
+        state = setup() if setup else None
+        gc.collect()
+        tracemalloc.start()
+        try:
+            run(state)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--articles", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min_paragraphs", type=int, default=5)
+    parser.add_argument("--max_paragraphs", type=int, default=80)
+    parser.add_argument("--accession_density", type=float, default=0.5,
+                        help="Expected accessions per 1000 words.")
+    parser.add_argument("--blocked_fraction", type=float, default=0.05)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip_memory", action="store_true",
+                        help="Do not measure the peak memory.")
+    parser.add_argument("--only", nargs="+",
+                        help="Names of the benchmarks to run.")
+    args = parser.parse_args()
+
+    articles = generate_corpus(
+        args.articles, args.seed, min_paragraphs=args.min_paragraphs,
+        max_paragraphs=args.max_paragraphs,
+        blocked_fraction=args.blocked_fraction,
+        accession_density=args.accession_density,
+    )
+    readable = [a for a in articles if not a.blocked]
+    texts = {}
+    for scraper in _scrapers_with_soup(readable):
+        texts[scraper.pmc_id] = scraper.get_text()
+    size = sum(len(a.xml) for a in articles)
+    print(f"{len(articles)} articles ({len(readable)} readable), "
+          f"{size / 2**20:.1f} MiB of XML, seed {args.seed}")
+
+    benchmarks = {
+        "parse": (bench_parse, articles),
+        "get_text": (bench_get_text, readable),
+        **{name: (bench_detector(name), readable) for name in DETECTORS},
+        "analyze_pdf": (bench_analyze_pdf, articles),
+    }
+    if args.only:
+        benchmarks = {k: v for k, v in benchmarks.items() if k in args.only}
+
+    print(f"{'benchmark':<28}{'articles':>10}{'seconds':>10}"
+          f"{'articles/s':>12}{'peak MiB':>10}")
+    with mock_eutils(articles):
+        for name, (bench, corpus) in benchmarks.items():
+            setup, run = bench(corpus, texts)
+            try:
+                elapsed, peak = measure(
+                    setup, run, args.repeat, not args.skip_memory
+                )
+            except LookupError:
+                print(f"{name:<28}skipped (NLTK punkt tokenizer missing)")
+                continue
+            peak = f"{peak / 2**20:>10.1f}" if peak is not None else \
+                f"{'-':>10}"
+            print(f"{name:<28}{len(corpus):>10}{elapsed:>10.3f}"
+                  f"{len(corpus) / elapsed:>12.1f}{peak}")
+
+
+if __name__ == "__main__":
+    main()
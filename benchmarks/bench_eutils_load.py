@@ -0,0 +1,117 @@
+"""
+Load test of the metadata pipeline against the local E-utilities stand-in.
+
+Serves a synthetic SRA corpus (see `synthetic_sra`) from
+`mishmash.mock_eutils` with the given latency and failure rates, resolves
+its studies to runs and fetches the metadata of all the runs, just like
+`assess_metadata` does. Reports the throughput of both steps, the
+requests, retries and failures seen by the client and the failures
+injected by the server.
+
+Usage:
+    python benchmarks/bench_eutils_load.py --runs 5000 --latency 0.2 \\
+        --rate_limit 10 --truncate_rate 0.02 --n_jobs 4
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from mishmash.entrezpy_clients._batching import AdaptiveBatchSizer
+from mishmash.entrezpy_clients._client import get_client, set_eutils_url
+from mishmash.entrezpy_clients._efetch import EFetchAnalyzer
+from mishmash.entrezpy_clients._pipelines import (
+    fetch_run_metadata, get_run_ids_by_type
+)
+from mishmash.entrezpy_clients._utils import RateLimiter
+from mishmash.mock_eutils import MockEUtilsData, MockEUtilsServer
+from mishmash.telemetry import METRICS
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic_sra import RUNS_PER_STUDY, iter_responses  # noqa: E402
+
+EMAIL = "load@example.com"
+
+
+def make_data(n_runs: int, seed: int) -> MockEUtilsData:
+    data = MockEUtilsData()
+    for response, _ in iter_responses(n_runs, seed=seed):
+        data.add_package_set(response)
+    for response, _ in iter_responses(n_runs, docsum=True, seed=seed):
+        data.add_docsums(response)
+    return data
+
+
+def _client_stats(eutil: str) -> str:
+    counts = [
+        METRICS.value(f"mishmash_{name}_total", eutil=eutil)
+        for name in ("requests", "retries", "request_failures")
+    ]
+    return "{:.0f} requests, {:.0f} retries, {:.0f} failures".format(*counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--n_jobs", type=int, default=4)
+    parser.add_argument("--client_rate", type=float, default=10,
+                        help="Requests per second sent by the client.")
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--rate_limit", type=float,
+                        help="Requests per second served by the server.")
+    parser.add_argument("--truncate_rate", type=float, default=0.0)
+    parser.add_argument("--timeout_rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=5.0,
+                        help="Timeout of the client requests (in seconds).")
+    args = parser.parse_args()
+
+    data = make_data(args.runs, args.seed)
+    n_studies = (args.runs - 1) // RUNS_PER_STUDY + 1
+    studies = [f"SRP{i:07d}" for i in range(n_studies)]
+    print(f"{args.runs} runs in {len(data.docsums)} experiments and "
+          f"{n_studies} studies, seed {args.seed}")
+
+    server = MockEUtilsServer(
+        data, latency=args.latency, jitter=args.jitter,
+        rate_limit=args.rate_limit, truncate_rate=args.truncate_rate,
+        timeout_rate=args.timeout_rate, stall=2 * args.timeout,
+        seed=args.seed,
+    )
+    with server:
+        set_eutils_url(server.url)
+        client = get_client(EMAIL)
+        client.limiter = RateLimiter(args.client_rate)
+        client.timeout = args.timeout
+
+        start = time.perf_counter()
+        run_ids = get_run_ids_by_type(EMAIL, studies, args.n_jobs)
+        elapsed = time.perf_counter() - start
+        print(f"run IDs:  {len(run_ids)} runs in {elapsed:.1f} s "
+              f"({len(run_ids) / elapsed:.0f} runs/s); "
+              f"esearch: {_client_stats('esearch')}; "
+              f"efetch: {_client_stats('efetch')}")
+
+        METRICS.clear()
+        sizer = AdaptiveBatchSizer()
+        start = time.perf_counter()
+        result, failed = fetch_run_metadata(
+            EMAIL, run_ids, EFetchAnalyzer("ERROR", compact=True),
+            args.n_jobs, "ERROR", sizer,
+        )
+        elapsed = time.perf_counter() - start
+        fetched = len(result.runs) if result is not None else 0
+        print(f"metadata: {fetched} runs in {elapsed:.1f} s "
+              f"({fetched / elapsed:.0f} runs/s), "
+              f"{sum(len(b) for b, _ in failed)} runs failed; "
+              f"efetch: {_client_stats('efetch')}")
+        summary = sizer.summary()
+        summary.pop("history")
+        print(f"batches:  {summary}")
+        print(f"server:   {dict(server.stats)}")
+
+
+if __name__ == "__main__":
+    main()
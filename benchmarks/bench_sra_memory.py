@@ -0,0 +1,114 @@
+"""
+Memory benchmark of the SRA object models.
+
+Builds the same study -> sample -> experiment -> run hierarchy with both
+the classic (`_sra_meta`) and the compact (`_sra_compact`) classes and
+reports memory retained by the objects, as measured by tracemalloc.
+
+Usage:
+    python benchmarks/bench_sra_memory.py --runs 1000000
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+from mishmash.entrezpy_clients._sra_compact import COMPACT_MODELS
+from mishmash.entrezpy_clients._sra_meta import MODELS
+
+SAMPLES_PER_STUDY = 1000
+
+
+def _custom_meta(prefix, level, width, seed):
+    # keys are formatted anew for every object, just like they are when
+    # parsing the XML responses
+    return {
+        f"{prefix}_{j} [{level}]": f"value {(seed + j) % 97}"
+        for j in range(width)
+    }
+
+
+def build_hierarchy(models, n_runs, sample_width, runs_per_experiment):
+    studies, runs = {}, {}
+    n_experiments = max(n_runs // runs_per_experiment, 1)
+    for i in range(n_experiments):
+        study_id = f"SRP{i // SAMPLES_PER_STUDY:06d}"
+        if study_id not in studies:
+            studies[study_id] = models["study"](
+                id=study_id, bioproject_id=f"PRJNA{i:07d}",
+                center_name="Some Sequencing Center",
+                custom_meta=_custom_meta("study_attr", "STUDY", 2, i),
+            )
+        sample = models["sample"](
+            id=f"SRS{i:08d}", name=f"sample_{i}", title=f"Sample {i}",
+            biosample_id=f"SAMN{i:08d}", organism="human gut metagenome",
+            tax_id="408170", study_id=study_id,
+            custom_meta=_custom_meta("sample_attr", "SAMPLE", sample_width, i),
+        )
+        studies[study_id].samples.append(sample)
+        experiment = models["experiment"](
+            id=f"SRX{i:08d}", instrument="Illumina MiSeq",
+            platform="ILLUMINA", sample_id=sample.id,
+            library=models["library"](
+                name=f"lib_{i}", layout="PAIRED",
+                selection="PCR", source="METAGENOMIC"
+            ),
+            custom_meta=_custom_meta("exp_attr", "EXPERIMENT", 2, i),
+        )
+        sample.experiments.append(experiment)
+        for j in range(runs_per_experiment):
+            run_id = f"SRR{i * runs_per_experiment + j:08d}"
+            runs[run_id] = models["run"](
+                id=run_id, public=True, bytes=123456789 + i,
+                bases=987654321 + i, spots=3000000 + j,
+                experiment_id=experiment.id,
+                custom_meta=_custom_meta("run_attr", "RUN", 1, i),
+            )
+            experiment.runs.append(runs[run_id])
+    return studies, runs
+
+
+def measure(models, n_runs, sample_width, runs_per_experiment):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    hierarchy = build_hierarchy(
+        models, n_runs, sample_width, runs_per_experiment
+    )
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del hierarchy
+    gc.collect()
+    return retained, peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=1_000_000)
+    parser.add_argument("--sample_width", type=int, default=20,
+                        help="Number of custom attributes per sample.")
+    parser.add_argument("--runs_per_experiment", type=int, default=1)
+    parser.add_argument("--model", choices=["classic", "compact", "both"],
+                        default="both")
+    args = parser.parse_args()
+
+    models = {"classic": MODELS, "compact": COMPACT_MODELS}
+    if args.model != "both":
+        models = {args.model: models[args.model]}
+
+    print(f"{'model':<10}{'runs':>10}{'retained MiB':>15}"
+          f"{'peak MiB':>12}{'B/run':>10}{'build s':>10}")
+    for name, model_set in models.items():
+        retained, peak, elapsed = measure(
+            model_set, args.runs, args.sample_width, args.runs_per_experiment
+        )
+        print(f"{name:<10}{args.runs:>10}{retained / 2 ** 20:>15.1f}"
+              f"{peak / 2 ** 20:>12.1f}{retained / args.runs:>10.0f}"
+              f"{elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
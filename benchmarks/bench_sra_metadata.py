@@ -0,0 +1,193 @@
+"""
+Scaling benchmark of the SRA metadata parsing.
+
+Feeds synthetic EFetch responses generated by `synthetic_sra` through
+`EFetchResult` and times every phase separately:
+
+    parse           xmltodict parsing of the responses
+    find_run_ids    `_find_all_run_ids` on the parsed packages
+    build           building the objects (`add_metadata` minus parsing)
+    extract_run_ids run IDs from the document summaries
+    to_df           `metadata_to_df` (dense)
+    to_sparse_df    `metadata_to_df(sparse=True)`
+    long_records    `iter_long_records`
+
+Every corpus size is measured in a fresh process, so that the peak RSS
+reported for it is not inflated by the previous ones. Results can be
+saved as a baseline (see `baselines/`) and later runs compared to it.
+
+Usage:
+    python benchmarks/bench_sra_metadata.py --runs 1000 10000 100000
+    python benchmarks/bench_sra_metadata.py --runs 10000 \\
+        --baseline benchmarks/baselines/bench_sra_metadata.json
+"""
+
+import argparse
+import gc
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from xmltodict import parse as parsexml
+
+from mishmash.entrezpy_clients._efetch import EFetchResult
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic_sra import iter_responses  # noqa: E402
+
+PHASES = (
+    "parse", "find_run_ids", "build", "extract_run_ids",
+    "to_df", "to_sparse_df", "long_records",
+)
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    obs = func(*args)
+    return obs, time.perf_counter() - start
+
+
+def measure(n_runs: int, options: dict) -> dict:
+    """Times all the phases on a corpus of `n_runs` runs.
+
+    Returns:
+        dict: Seconds spent in every phase, the number of columns of
+            the resulting DataFrame and the peak RSS (in MiB).
+    """
+    batch_runs, compact = options["batch_runs"], options["compact"]
+    generator = {k: v for k, v in options.items()
+                 if k not in ("batch_runs", "compact")}
+    times = dict.fromkeys(PHASES, 0.0)
+    result = EFetchResult.empty("ERROR", compact=compact)
+    gc.collect()
+
+    # responses are generated (untimed) and processed one at a time
+    for response, run_ids in iter_responses(
+        n_runs, batch_runs=batch_runs, **generator
+    ):
+        parsed, elapsed = _timed(
+            lambda x: json.loads(json.dumps(parsexml(x))), response
+        )
+        times["parse"] += elapsed
+        packages = parsed["EXPERIMENT_PACKAGE_SET"]["EXPERIMENT_PACKAGE"]
+        packages = packages if isinstance(packages, list) else [packages]
+        _, elapsed = _timed(EFetchResult._find_all_run_ids, packages)
+        times["find_run_ids"] += elapsed
+        del parsed, packages
+
+        # add_metadata parses the response again
+        _, elapsed = _timed(
+            result.add_metadata, io.StringIO(response), run_ids
+        )
+        times["build"] += elapsed
+    times["build"] -= times["parse"]
+    result.metadata_raw = None
+
+    docsums = EFetchResult.empty("ERROR")
+    for response, _ in iter_responses(
+        n_runs, batch_runs=batch_runs, docsum=True, **generator
+    ):
+        _, elapsed = _timed(docsums.extract_run_ids, io.StringIO(response))
+        times["extract_run_ids"] += elapsed
+    assert len(docsums.metadata) == n_runs
+    del docsums
+
+    df, times["to_df"] = _timed(result.metadata_to_df)
+    assert len(df) == n_runs
+    columns = df.shape[1]
+    del df
+    gc.collect()
+    _, times["to_sparse_df"] = _timed(result.metadata_to_df, True)
+    gc.collect()
+    _, times["long_records"] = _timed(
+        lambda: sum(1 for _ in result.iter_long_records())
+    )
+
+    # ru_maxrss is in KiB on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {"seconds": times, "columns": columns, "peak_rss_mib": peak}
+
+
+def measure_isolated(n_runs: int, options: dict) -> dict:
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(1, mp_context=context) as executor:
+        return executor.submit(measure, n_runs, options).result()
+
+
+def _print_results(results: dict, baseline: dict = None):
+    print(f"{'runs':>9}  {'phase':<16}{'seconds':>10}{'runs/s':>12}"
+          f"{'vs base':>9}")
+    for n_runs, obs in results.items():
+        base = (baseline or {}).get(n_runs, {}).get("seconds", {})
+        for phase in PHASES:
+            elapsed = obs["seconds"][phase]
+            ratio = f"{elapsed / base[phase]:>8.2f}x" if base.get(phase) \
+                else f"{'-':>9}"
+            print(f"{n_runs:>9}  {phase:<16}{elapsed:>10.3f}"
+                  f"{int(n_runs) / max(elapsed, 1e-9):>12.0f}{ratio}")
+        print(f"{n_runs:>9}  {obs['columns']} columns, peak RSS "
+              f"{obs['peak_rss_mib']:.0f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, nargs="+",
+                        default=[1000, 10000, 100000],
+                        help="Corpus sizes (in runs) to measure.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch_runs", type=int, default=500,
+                        help="Runs per EFetch response.")
+    parser.add_argument("--max_runs_per_experiment", type=int, default=3)
+    parser.add_argument("--pooled_fraction", type=float, default=0.05)
+    parser.add_argument("--sample_width", type=int, default=20,
+                        help="Number of custom attributes per sample.")
+    parser.add_argument("--model", choices=["classic", "compact"],
+                        default="compact")
+    parser.add_argument("--baseline", type=str,
+                        help="Baseline (JSON) to compare the results to.")
+    parser.add_argument("--save_baseline", type=str,
+                        help="Save the results as a baseline (JSON).")
+    args = parser.parse_args()
+
+    options = {
+        "seed": args.seed, "batch_runs": args.batch_runs,
+        "max_runs_per_experiment": args.max_runs_per_experiment,
+        "pooled_fraction": args.pooled_fraction,
+        "sample_width": args.sample_width,
+        "compact": args.model == "compact",
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["options"] != options:
+            print("Warning: the baseline was recorded with different "
+                  f"options: {baseline['options']}.")
+        baseline = baseline["results"]
+
+    results = {}
+    for n_runs in args.runs:
+        results[str(n_runs)] = measure_isolated(n_runs, options)
+    _print_results(results, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "cpus": os.cpu_count(),
+                "options": options,
+                "results": results,
+            }, f, indent=2)
+            f.write("\n")
+        print(f"Baseline saved to {args.save_baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Startup-time benchmark of the mishmash CLI.
+
+Every command is run in a fresh interpreter, `--repeat` times; the best
+and the median wall time are reported, together with the time left after
+subtracting the startup of a bare interpreter. With `--importtime`, the
+modules taking the longest to import (cumulatively) are listed for every
+command as well.
+
+Usage:
+    python benchmarks/bench_startup.py --repeat 10 --importtime 5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+COMMANDS = {
+    "python": "pass",
+    "import mishmash.cli": "import mishmash.cli",
+    "mishmash --help": "from mishmash.cli import main; main()",
+    "assess_metadata --help": "from mishmash.cli import main; main()",
+    "assess_sequences --help": "from mishmash.cli import main; main()",
+    "import fetch_metadata": "import mishmash.fetch_metadata",
+    "import scrape_pdf": "import mishmash.scrape_pdf",
+}
+ARGV = {
+    "mishmash --help": ["--help"],
+    "assess_metadata --help": ["assess_metadata", "--help"],
+    "assess_sequences --help": ["assess_sequences", "--help"],
+}
+
+
+def _command(name: str, importtime: bool = False) -> list:
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    return command + ["-c", COMMANDS[name], *ARGV.get(name, [])]
+
+
+def run(name: str, repeat: int) -> list:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(_command(name), stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def slowest_imports(name: str, limit: int) -> list:
+    # lines look like: 'import time: self [us] | cumulative | module'
+    stderr = subprocess.run(
+        _command(name, importtime=True), stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE, text=True
+    ).stderr
+    imports = []
+    for line in stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            imports.append((int(parts[1]), parts[2].strip()))
+    top_level = [x for x in imports if not x[1].startswith(" ")]
+    return sorted(top_level, reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--importtime", type=int, default=0,
+                        help="Number of the slowest imports to list.")
+    args = parser.parse_args()
+    os.environ["PYTHONDONTWRITEBYTECODE"] = "1"
+
+    print(f"{'command':<26}{'best ms':>10}{'median ms':>11}"
+          f"{'- python ms':>13}")
+    baseline = None
+    for name in COMMANDS:
+        times = run(name, args.repeat)
+        best, median = min(times), statistics.median(times)
+        baseline = baseline if baseline is not None else best
+        print(f"{name:<26}{1000 * best:>10.0f}{1000 * median:>11.0f}"
+              f"{1000 * (best - baseline):>13.0f}")
+        if args.importtime and name != "python":
+            for cumulative, module in slowest_imports(name, args.importtime):
+                print(f"    {module:<36}{cumulative / 1000:>8.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
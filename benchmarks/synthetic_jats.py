@@ -0,0 +1,385 @@
+"""
+Seeded generator of synthetic PMC JATS articles.
+
+Generates articles resembling the PMC EFetch responses processed by
+`PMCScraper`: journal and author metadata in the front matter, a body in
+one of several section layouts and the back matter with a data
+availability statement and references. Size, accession density, primers,
+URLs, mentions of non-INSDC databases and blocking comments vary from
+article to article; every article comes with the ground truth of what was
+put into it. The same seed always produces the same corpus.
+
+Usage:
+    python benchmarks/synthetic_jats.py --articles 10 --output_dir corpus
+"""
+
+import argparse
+import os
+import random
+from dataclasses import dataclass, field
+from typing import Dict, List
+from xml.sax.saxutils import escape
+
+BLOCKING_COMMENT = (
+    "The publisher of this article does not allow downloading of the full "
+    "text in XML form."
+)
+
+# section layouts of the article body
+LAYOUTS = ("imrad", "nested", "flat", "no_body")
+
+WORDS = (
+    "the of and in to a with for was were samples data analysis we that by "
+    "on as from study were this these using at which microbial community "
+    "composition diversity gut soil water host species abundance taxa "
+    "relative significant differences between groups treatment control "
+    "sequencing reads quality filtered genome bacterial fungal observed "
+    "associated increased decreased compared across time points patients "
+    "mice cohort collected stored extracted DNA libraries prepared"
+).split()
+AMPLICON_WORDS = ("amplicon", "16S", "marker gene", "ITS2", "V4 region")
+SHOTGUN_WORDS = ("metagenomic", "shotgun", "whole genome", "metagenomics")
+JOURNALS = (
+    ("Microbiome", "BioMed Central"),
+    ("mSystems", "American Society for Microbiology"),
+    ("ISME J", "Nature Publishing Group"),
+    ("PLoS One", "Public Library of Science"),
+    ("Front Microbiol", "Frontiers Media S.A."),
+)
+INSTITUTIONS = (
+    "ETH Zurich", "University of California San Diego", "Broad Institute",
+    "Wageningen University", "University of Tokyo", "Karolinska Institutet",
+)
+# accession prefixes and number of digits, as found in the articles (note
+# that mishmash does not recognise the SAMEA BioSample IDs)
+ACCESSIONS = (
+    ("PRJNA", 6), ("PRJEB", 5), ("PRJDB", 5), ("SRP", 6), ("ERP", 6),
+    ("SAMN", 8), ("SAMEA", 7), ("SRS", 7), ("SRX", 7), ("SRR", 7),
+    ("ERR", 7), ("DRR", 6), ("SRA", 6),
+)
+REPOSITORY_URLS = (
+    "https://github.com/{user}/{repo}", "https://zenodo.org/record/{num}",
+    "https://bitbucket.org/{user}/{repo}", "https://figshare.com/s/{num}",
+    "https://codeocean.com/capsule/{num}",
+)
+# tools cited in the articles - excluded from the code links by mishmash
+TOOL_URLS = (
+    "https://github.com/lh3/minimap2", "https://github.com/OpenGene/fastp",
+    "https://benjjneb.github.io/dada2", "https://github.com/biobakery/humann",
+)
+OTHER_URLS = (
+    "https://www.ncbi.nlm.nih.gov/sra", "https://www.R-project.org",
+    "https://qiime2.org", "https://www.arb-silva.de/{num}",
+)
+NON_INSDC_STATEMENTS = (
+    "Raw reads were deposited in the Genome Sequence Archive (GSA) under "
+    "accession number CRA{num6}.",
+    "Sequences are available on MG-RAST under project ID mgp{num5}.",
+    "The data are available from figshare at https://figshare.com/s/{num}.",
+    "Sequencing data were deposited in the European Phenome-Genome Archive "
+    "(EGA) and can be found at https://ega-archive.org/studies/{num}.",
+)
+PRIMER_BASES = "ACGT" * 6 + "NWVMH"
+
+
+@dataclass
+class SyntheticArticle:
+    """A synthetic article together with what was put into it.
+
+    Attributes:
+        pmc_id (str): PMC ID of the article.
+        xml (str): The JATS document, as returned by EFetch.
+        layout (str): Layout of the body (see LAYOUTS).
+        blocked (bool): Whether the article has a blocking comment
+            instead of its full text.
+        accessions (list): Accession IDs mentioned in the text.
+        primers (list): Primer sequences mentioned in the text.
+        repository_urls (list): URLs of code repositories.
+        non_insdc (bool): Whether the data availability statement refers
+            to a non-INSDC database.
+        sra_counts (dict): Number of SRA records of every accession.
+    """
+
+    pmc_id: str
+    xml: str
+    layout: str
+    blocked: bool = False
+    accessions: List[str] = field(default_factory=list)
+    primers: List[str] = field(default_factory=list)
+    repository_urls: List[str] = field(default_factory=list)
+    non_insdc: bool = False
+    sra_counts: Dict[str, int] = field(default_factory=dict)
+
+
+class _ArticleWriter:
+    def __init__(self, rng: random.Random, accession_density: float,
+                 primer_probability: float, url_probability: float):
+        self.rng = rng
+        self.accession_density = accession_density
+        self.primer_probability = primer_probability
+        self.url_probability = url_probability
+        self.accessions, self.primers, self.repository_urls = [], [], []
+
+    def _format(self, template: str) -> str:
+        rng = self.rng
+        return template.format(
+            user=rng.choice(["lab", "jdoe", "microbe-lab", "bokulich"]),
+            repo=rng.choice(["analysis", "pipeline", "paper-code"]),
+            num=rng.randrange(10**6, 10**7),
+            num5=f"{rng.randrange(10**5):05d}",
+            num6=f"{rng.randrange(10**6):06d}",
+        )
+
+    def accession(self) -> str:
+        prefix, digits = self.rng.choice(ACCESSIONS)
+        accession = f"{prefix}{self.rng.randrange(10**digits):0{digits}d}"
+        self.accessions.append(accession)
+        return accession
+
+    def primer(self) -> str:
+        primer = "".join(
+            self.rng.choice(PRIMER_BASES)
+            for _ in range(self.rng.randint(18, 24))
+        )
+        self.primers.append(primer)
+        return primer
+
+    def sentence(self, method_words: tuple) -> str:
+        rng = self.rng
+        words = rng.choices(WORDS, k=rng.randint(8, 25))
+        words[0] = words[0].capitalize()
+        if rng.random() < 0.3:
+            words.insert(rng.randint(1, len(words)),
+                         rng.choice(method_words))
+        # accession density is given per 1000 words
+        if rng.random() < self.accession_density * len(words) / 1000:
+            words.insert(rng.randint(1, len(words)), self.accession())
+        if rng.random() < self.primer_probability:
+            words += ["using", "primers", self.primer(), "and",
+                      self.primer()]
+        if rng.random() < self.url_probability:
+            words += ["(", self._format(rng.choice(TOOL_URLS + OTHER_URLS)),
+                      ")"]
+        return " ".join(words) + "."
+
+    def paragraph(self, method_words: tuple) -> str:
+        sentences = [self.sentence(method_words)
+                     for _ in range(self.rng.randint(3, 8))]
+        return f"<p>{escape(' '.join(sentences))}</p>"
+
+    def section(self, title: str, n_paragraphs: int, method_words: tuple,
+                nested: bool = False) -> str:
+        parts = [f"<sec><title>{title}</title>"]
+        if nested and n_paragraphs > 1:
+            for i in range(0, n_paragraphs, 2):
+                parts.append(self.section(
+                    f"{title} {i // 2 + 1}", min(2, n_paragraphs - i),
+                    method_words
+                ))
+        else:
+            parts += [self.paragraph(method_words)
+                      for _ in range(n_paragraphs)]
+        parts.append("</sec>")
+        return "".join(parts)
+
+
+def _front(rng: random.Random, pmc_id: str, writer: _ArticleWriter,
+           method_words: tuple) -> str:
+    journal, publisher = rng.choice(JOURNALS)
+    year = rng.randint(2012, 2024)
+    return (
+        "<front><journal-meta><journal-title-group>"
+        f"<journal-title>{escape(journal)}</journal-title>"
+        "</journal-title-group><publisher>"
+        f"<publisher-name>{escape(publisher)}</publisher-name>"
+        "</publisher></journal-meta><article-meta>"
+        f'<article-id pub-id-type="pmc">{pmc_id[3:]}</article-id>'
+        "<title-group><article-title>A synthetic study of the "
+        f"{rng.choice(['gut', 'soil', 'marine'])} microbiome"
+        "</article-title></title-group><contrib-group>"
+        '<contrib contrib-type="author"><name><surname>Doe</surname>'
+        "<given-names>J</given-names></name>"
+        '<xref ref-type="aff" rid="aff1">1</xref></contrib>'
+        "</contrib-group>"
+        f'<aff id="aff1"><institution>{rng.choice(INSTITUTIONS)}'
+        "</institution>, Somewhere</aff>"
+        '<pub-date pub-type="epub">'
+        f"<day>1</day><month>6</month><year>{year}</year></pub-date>"
+        f"<abstract>{writer.paragraph(method_words)}</abstract>"
+        "</article-meta></front>"
+    )
+
+
+def generate_article(
+    rng: random.Random,
+    pmc_id: str,
+    n_paragraphs: int = 20,
+    layout: str = "imrad",
+    accession_density: float = 0.5,
+    primer_probability: float = 0.01,
+    url_probability: float = 0.01,
+    repository_probability: float = 0.5,
+    non_insdc_probability: float = 0.1,
+    blocked: bool = False,
+) -> SyntheticArticle:
+    """Generates a single article.
+
+    Args:
+        rng (random.Random): Source of randomness.
+        pmc_id (str): PMC ID of the article, e.g. 'PMC1000001'.
+        n_paragraphs (int): Number of paragraphs in the body.
+        layout (str): Layout of the body (see LAYOUTS).
+        accession_density (float): Expected number of accessions per 1000
+            words (the data availability statement always has some, unless
+            the data went to a non-INSDC database).
+        primer_probability (float): Probability of a sentence listing
+            primers.
+        url_probability (float): Probability of a sentence citing a URL.
+        repository_probability (float): Probability of the article linking
+            to a code repository.
+        non_insdc_probability (float): Probability of the data being
+            deposited to a non-INSDC database.
+        blocked (bool): Whether to generate an article with a blocking
+            comment (and only its front matter).
+
+    Returns:
+        SyntheticArticle: The article with its ground truth.
+    """
+    writer = _ArticleWriter(
+        rng, accession_density, primer_probability, url_probability
+    )
+    method_words = rng.choice(
+        [AMPLICON_WORDS, SHOTGUN_WORDS, AMPLICON_WORDS + SHOTGUN_WORDS]
+    )
+    front = _front(rng, pmc_id, writer, method_words)
+    article = SyntheticArticle(pmc_id=pmc_id, xml="", layout=layout,
+                               blocked=blocked)
+    if blocked:
+        article.xml = (
+            "<pmc-articleset><article article-type=\"research-article\">"
+            f"{front}<!--{BLOCKING_COMMENT}--></article></pmc-articleset>"
+        )
+        return article
+
+    titles = ["Introduction", "Methods", "Results", "Discussion"]
+    per_section = max(1, n_paragraphs // len(titles))
+    if layout == "imrad":
+        body = "".join(writer.section(t, per_section, method_words)
+                       for t in titles)
+    elif layout == "nested":
+        body = "".join(writer.section(t, per_section, method_words, True)
+                       for t in titles)
+    elif layout == "flat":
+        body = "".join(writer.paragraph(method_words)
+                       for _ in range(n_paragraphs))
+    elif layout == "no_body":
+        body = None
+    else:
+        raise ValueError(f"Unknown layout: {layout}")
+
+    article.non_insdc = rng.random() < non_insdc_probability
+    if article.non_insdc:
+        availability = writer._format(rng.choice(NON_INSDC_STATEMENTS))
+    else:
+        ids = ", ".join(writer.accession()
+                        for _ in range(rng.randint(1, 3)))
+        availability = (f"The sequencing data have been deposited in the "
+                        f"Sequence Read Archive under accession numbers "
+                        f"{ids}.")
+    if rng.random() < repository_probability:
+        url = writer._format(rng.choice(REPOSITORY_URLS))
+        writer.repository_urls.append(url)
+        availability += f" The code is available at {url}."
+    references = "".join(
+        f'<ref id="r{i}"><mixed-citation>Author {i}. A cited paper on '
+        f"{rng.choice(WORDS)} (doi:10.1000/{rng.randrange(10**6)}). "
+        f"See also {writer._format(rng.choice(OTHER_URLS))}."
+        "</mixed-citation></ref>"
+        for i in range(rng.randint(5, 40))
+    )
+    back = (
+        f"<back><ack>{writer.paragraph(method_words)}</ack>"
+        '<sec sec-type="data-availability"><title>Data availability</title>'
+        f"<p>{escape(availability)}</p></sec>"
+        f"<ref-list>{references}</ref-list></back>"
+    )
+    article.xml = (
+        "<pmc-articleset>"
+        '<article xmlns:xlink="http://www.w3.org/1999/xlink" '
+        'article-type="research-article">'
+        f"{front}{f'<body>{body}</body>' if body is not None else ''}"
+        f"{back}</article></pmc-articleset>"
+    )
+    article.accessions = list(dict.fromkeys(writer.accessions))
+    article.primers = writer.primers
+    article.repository_urls = writer.repository_urls
+    article.sra_counts = {
+        x: rng.randint(1, 500) for x in article.accessions
+    }
+    return article
+
+
+def generate_corpus(
+    n_articles: int,
+    seed: int = 0,
+    min_paragraphs: int = 5,
+    max_paragraphs: int = 80,
+    layouts: tuple = LAYOUTS,
+    blocked_fraction: float = 0.05,
+    **options,
+) -> List[SyntheticArticle]:
+    """Generates a corpus of articles.
+
+    Args:
+        n_articles (int): Number of articles.
+        seed (int): Seed of the generator.
+        min_paragraphs (int): Smallest number of paragraphs per article.
+        max_paragraphs (int): Largest number of paragraphs per article.
+        layouts (tuple): Body layouts to choose from (see LAYOUTS).
+        blocked_fraction (float): Fraction of articles with a blocking
+            comment.
+        **options: Passed on to `generate_article`.
+
+    Returns:
+        List[SyntheticArticle]: The articles, with PMC IDs PMC1000000,
+            PMC1000001 and so on.
+    """
+    rng = random.Random(seed)
+    return [
+        generate_article(
+            rng, f"PMC{1000000 + i}",
+            n_paragraphs=rng.randint(min_paragraphs, max_paragraphs),
+            layout=rng.choice(layouts),
+            blocked=rng.random() < blocked_fraction,
+            **options,
+        )
+        for i in range(n_articles)
+    ]
+
+
+def esearch_count_xml(count: int) -> str:
+    """Returns an ESearch response reporting the number of records."""
+    return (
+        "<eSearchResult>"
+        f"<Count>{count}</Count><RetMax>20</RetMax><RetStart>0</RetStart>"
+        "</eSearchResult>"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--articles", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output_dir", type=str, required=True)
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for article in generate_corpus(args.articles, args.seed):
+        with open(os.path.join(args.output_dir,
+                               f"{article.pmc_id}.xml"), "w") as f:
+            f.write(article.xml)
+    print(f"{args.articles} articles saved to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+Seeded generator of synthetic SRA metadata responses.
+
+Generates EXPERIMENT_PACKAGE_SET documents (EFetch `rettype=xml`) and
+the matching document summaries (EFetch `rettype=docsum`), as processed
+by `EFetchResult.add_metadata` and `EFetchResult.extract_run_ids`.
+Packages can have several runs per experiment and pooled samples; the
+number of custom attributes per level is configurable. The responses are
+generated lazily, one EFetch batch at a time, so that even corpora of
+millions of runs never have to be held in memory at once. The same seed
+always produces the same responses.
+
+Usage:
+    python benchmarks/synthetic_sra.py --runs 1000 --output sra.xml
+"""
+
+import argparse
+import random
+from dataclasses import dataclass, field
+from typing import Iterator, List, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+RUNS_PER_STUDY = 1000
+PLATFORMS = (
+    ("ILLUMINA", "Illumina MiSeq"), ("ILLUMINA", "Illumina NovaSeq 6000"),
+    ("OXFORD_NANOPORE", "MinION"), ("PACBIO_SMRT", "Sequel II"),
+)
+LIBRARIES = (
+    ("AMPLICON", "PCR", "METAGENOMIC"), ("WGS", "RANDOM", "METAGENOMIC"),
+    ("RNA-Seq", "cDNA", "METATRANSCRIPTOMIC"),
+)
+ORGANISMS = (
+    ("408170", "human gut metagenome"), ("410658", "soil metagenome"),
+    ("412755", "marine sediment metagenome"),
+)
+VALUES = ("vegan", "omnivore", "6.5", "7.2", "10 cm", "20 cm", "female",
+          "male", "2021-03-01", "2022-07-15", "not collected", "Zurich")
+
+
+@dataclass
+class Package:
+    """IDs and attributes of a single synthetic EXPERIMENT_PACKAGE."""
+
+    number: int
+    study: int
+    samples: List[int]
+    runs: List[int]
+    platform: Tuple[str, str]
+    library: Tuple[str, str, str]
+    organism: Tuple[str, str]
+    attributes: dict = field(default_factory=dict)
+
+    @property
+    def experiment_id(self) -> str:
+        return f"SRX{self.number:08d}"
+
+    @property
+    def study_id(self) -> str:
+        return f"SRP{self.study:07d}"
+
+    @property
+    def run_ids(self) -> List[str]:
+        return [f"SRR{x:09d}" for x in self.runs]
+
+
+def _attributes(rng: random.Random, level: str, width: int) -> list:
+    # a few common tags shared by all the objects and a tail of rarer ones
+    # (a single tag is occasionally duplicated, as in the real metadata)
+    tags = [f"{level}_attr_{rng.randrange(2 * width)}" if i >= width // 2
+            else f"{level}_attr_{i}" for i in range(width)]
+    if tags and rng.random() < 0.05:
+        tags.append(tags[0])
+    return [(tag, rng.choice(VALUES)) for tag in tags]
+
+
+def iter_packages(
+    n_runs: int,
+    seed: int = 0,
+    max_runs_per_experiment: int = 3,
+    pooled_fraction: float = 0.05,
+    max_pool_size: int = 4,
+    sample_width: int = 20,
+    experiment_width: int = 3,
+    run_width: int = 2,
+    study_width: int = 2,
+) -> Iterator[Package]:
+    """Generates the packages holding `n_runs` runs in total.
+
+    Args:
+        n_runs (int): Total number of runs.
+        seed (int): Seed of the generator.
+        max_runs_per_experiment (int): Experiments get between one and
+            this many runs.
+        pooled_fraction (float): Fraction of packages with pooled samples.
+        max_pool_size (int): Largest number of samples in a pool.
+        sample_width (int): Custom attributes per sample.
+        experiment_width (int): Custom attributes per experiment.
+        run_width (int): Custom attributes per run.
+        study_width (int): Custom attributes per study.
+
+    Yields:
+        Package: The packages, in the order of their runs.
+    """
+    rng = random.Random(seed)
+    run, sample, number = 0, 0, 0
+    while run < n_runs:
+        n = min(rng.randint(1, max_runs_per_experiment), n_runs - run)
+        pool = 1
+        if rng.random() < pooled_fraction:
+            pool = rng.randint(2, max_pool_size)
+        package = Package(
+            number=number, study=run // RUNS_PER_STUDY,
+            samples=list(range(sample, sample + pool)),
+            runs=list(range(run, run + n)),
+            platform=rng.choice(PLATFORMS), library=rng.choice(LIBRARIES),
+            organism=rng.choice(ORGANISMS),
+        )
+        package.attributes = {
+            "study": _attributes(rng, "study", study_width),
+            "experiment": _attributes(rng, "experiment", experiment_width),
+            "samples": [_attributes(rng, "sample", sample_width)
+                        for _ in range(pool)],
+            "runs": [_attributes(rng, "run", run_width) for _ in range(n)],
+            "spots": [rng.randrange(10**4, 10**7) for _ in range(n)],
+        }
+        run, sample, number = run + n, sample + pool, number + 1
+        yield package
+
+
+def _attributes_xml(level: str, attributes: list) -> str:
+    if not attributes:
+        return ""
+    items = "".join(
+        f"<{level}_ATTRIBUTE><TAG>{escape(tag)}</TAG>"
+        f"<VALUE>{escape(value)}</VALUE></{level}_ATTRIBUTE>"
+        for tag, value in attributes
+    )
+    return f"<{level}_ATTRIBUTES>{items}</{level}_ATTRIBUTES>"
+
+
+def package_xml(package: Package) -> str:
+    """Renders a package as an EXPERIMENT_PACKAGE element."""
+    attrs = package.attributes
+    platform, instrument = package.platform
+    strategy, selection, source = package.library
+    tax_id, organism = package.organism
+    sample_ids = [f"SRS{x:08d}" for x in package.samples]
+    biosample_ids = [f"SAMN{x:08d}" for x in package.samples]
+    layout = "PAIRED" if platform == "ILLUMINA" else "SINGLE"
+
+    samples = "".join(
+        f'<SAMPLE accession="{sid}" alias="sample_{sid}"><IDENTIFIERS>'
+        f"<PRIMARY_ID>{sid}</PRIMARY_ID>"
+        f'<EXTERNAL_ID namespace="BioSample">{bsid}</EXTERNAL_ID>'
+        f"</IDENTIFIERS><TITLE>Sample {sid}</TITLE><SAMPLE_NAME>"
+        f"<TAXON_ID>{tax_id}</TAXON_ID>"
+        f"<SCIENTIFIC_NAME>{organism}</SCIENTIFIC_NAME></SAMPLE_NAME>"
+        f'{_attributes_xml("SAMPLE", sample_attrs)}</SAMPLE>'
+        for sid, bsid, sample_attrs in zip(
+            sample_ids, biosample_ids, attrs["samples"]
+        )
+    )
+    members = "".join(
+        f'<Member member_name="" accession="{sid}" '
+        f'sample_name="sample_{sid}" sample_title="Sample {sid}" '
+        f'spots="{sum(attrs["spots"])}" bases="{150 * sum(attrs["spots"])}" '
+        f'tax_id="{tax_id}" organism={quoteattr(organism)}>'
+        f"<IDENTIFIERS><PRIMARY_ID>{sid}</PRIMARY_ID>"
+        f'<EXTERNAL_ID namespace="BioSample">{bsid}</EXTERNAL_ID>'
+        "</IDENTIFIERS></Member>"
+        for sid, bsid in zip(sample_ids, biosample_ids)
+    )
+    runs = "".join(
+        f'<RUN accession="{rid}" alias="run_{rid}" total_spots="{spots}" '
+        f'total_bases="{150 * spots}" size="{40 * spots}" load_done="true" '
+        'published="2021-05-01 10:00:00" is_public="true" '
+        'cluster_name="public" static_data_available="1">'
+        f"<IDENTIFIERS><PRIMARY_ID>{rid}</PRIMARY_ID></IDENTIFIERS>"
+        f'<EXPERIMENT_REF accession="{package.experiment_id}"/>'
+        f'{_attributes_xml("RUN", run_attrs)}'
+        f'<Statistics nreads="2" nspots="{spots}"/>'
+        f'<Bases cs_native="false" count="{150 * spots}"/></RUN>'
+        for rid, spots, run_attrs in zip(
+            package.run_ids, attrs["spots"], attrs["runs"]
+        )
+    )
+    return (
+        "<EXPERIMENT_PACKAGE>"
+        f'<EXPERIMENT accession="{package.experiment_id}">'
+        f"<IDENTIFIERS><PRIMARY_ID>{package.experiment_id}</PRIMARY_ID>"
+        f"</IDENTIFIERS><TITLE>{strategy} sequencing</TITLE>"
+        f'<STUDY_REF accession="{package.study_id}"/><DESIGN>'
+        f'<SAMPLE_DESCRIPTOR accession="{sample_ids[0]}"/>'
+        f"<LIBRARY_DESCRIPTOR><LIBRARY_NAME>lib_{package.number}"
+        f"</LIBRARY_NAME><LIBRARY_STRATEGY>{strategy}</LIBRARY_STRATEGY>"
+        f"<LIBRARY_SOURCE>{source}</LIBRARY_SOURCE>"
+        f"<LIBRARY_SELECTION>{selection}</LIBRARY_SELECTION>"
+        f"<LIBRARY_LAYOUT><{layout}/></LIBRARY_LAYOUT>"
+        "</LIBRARY_DESCRIPTOR></DESIGN>"
+        f"<PLATFORM><{platform}><INSTRUMENT_MODEL>{instrument}"
+        f"</INSTRUMENT_MODEL></{platform}></PLATFORM>"
+        f'{_attributes_xml("EXPERIMENT", attrs["experiment"])}'
+        "</EXPERIMENT>"
+        '<Organization type="center"><Name abbr="SC">Sequencing Center'
+        "</Name></Organization>"
+        f'<STUDY accession="{package.study_id}"><IDENTIFIERS>'
+        f"<PRIMARY_ID>{package.study_id}</PRIMARY_ID>"
+        '<EXTERNAL_ID namespace="BioProject" label="primary">'
+        f"PRJNA{package.study:07d}</EXTERNAL_ID></IDENTIFIERS>"
+        f'{_attributes_xml("STUDY", attrs["study"])}</STUDY>'
+        f"{samples}<Pool>{members}</Pool>"
+        f'<RUN_SET runs="{len(package.runs)}">{runs}</RUN_SET>'
+        "</EXPERIMENT_PACKAGE>"
+    )
+
+
+def docsum_xml(package: Package) -> str:
+    """Renders a package as a DocSum element (as in `rettype=docsum`)."""
+    runs = "".join(
+        f'<Run acc="{rid}" total_spots="{spots}" '
+        f'total_bases="{150 * spots}" load_done="true" is_public="true" '
+        'cluster_name="public" static_data_available="true"/>'
+        for rid, spots in zip(package.run_ids, package.attributes["spots"])
+    )
+    summary = (
+        f'<Summary><Title>{package.library[0]} sequencing</Title>'
+        f'<Platform instrument_model="{package.platform[1]}">'
+        f"{package.platform[0]}</Platform></Summary>"
+        f'<Experiment acc="{package.experiment_id}" ver="1" status="public"/>'
+        f'<Study acc="{package.study_id}"/>'
+    )
+    return (
+        f"<DocSum><Id>{package.number + 1}</Id>"
+        f'<Item Name="ExpXml" Type="String">{escape(summary)}</Item>'
+        f'<Item Name="Runs" Type="String">{escape(runs)}</Item>'
+        '<Item Name="ExtLinks" Type="String"></Item>'
+        '<Item Name="CreateDate" Type="String">2021/05/01</Item>'
+        "</DocSum>"
+    )
+
+
+def iter_responses(
+    n_runs: int, batch_runs: int = 500, docsum: bool = False, **options
+) -> Iterator[Tuple[str, List[str]]]:
+    """Generates the EFetch responses of all the runs, batch by batch.
+
+    Args:
+        n_runs (int): Total number of runs.
+        batch_runs (int): Runs per response (complete packages are kept
+            together, so responses can be slightly larger).
+        docsum (bool): Whether to generate document summaries instead of
+            the full metadata.
+        **options: Passed on to `iter_packages`.
+
+    Yields:
+        Tuple[str, List[str]]: A response and the IDs of the runs in it.
+    """
+    render, wrap = package_xml, "EXPERIMENT_PACKAGE_SET"
+    if docsum:
+        render, wrap = docsum_xml, "eSummaryResult"
+    parts, run_ids = [], []
+    for package in iter_packages(n_runs, **options):
+        parts.append(render(package))
+        run_ids += package.run_ids
+        if len(run_ids) >= batch_runs:
+            yield f"<{wrap}>{''.join(parts)}</{wrap}>", run_ids
+            parts, run_ids = [], []
+    if parts:
+        yield f"<{wrap}>{''.join(parts)}</{wrap}>", run_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--docsum", action="store_true",
+                        help="Generate document summaries instead.")
+    parser.add_argument("--output", type=str, required=True)
+    args = parser.parse_args()
+
+    # a single response with all the runs
+    with open(args.output, "w") as f:
+        for response, _ in iter_responses(
+            args.runs, batch_runs=args.runs, docsum=args.docsum,
+            seed=args.seed
+        ):
+            f.write(response)
+    print(f"{args.runs} runs saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
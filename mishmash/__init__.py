@@ -1 +1,18 @@
-from .scrape_pdf import PMCScraper, analyze_pdf
+from .errors import FetchError, InputError, MishmashError, NoDataError
+
+__all__ = ["FetchError", "InputError", "MishmashError", "NoDataError",
+           "PMCScraper", "Session", "analyze_pdf"]
+
+
+def __getattr__(name):
+    # the scraper (and its heavy dependencies) is only imported when used,
+    # keeping e.g. the startup of the CLI fast
+    if name in ("PMCScraper", "analyze_pdf"):
+        from . import scrape_pdf
+
+        return getattr(scrape_pdf, name)
+    if name == "Session":
+        from .session import Session
+
+        return Session
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
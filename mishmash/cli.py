@@ -3,30 +3,105 @@ The command-line interface for the Python scraper
 """
 
 import argparse
-import nltk
+import cProfile
 import os
 
-from .fetch_metadata import get_metadata
-from .scrape_pdf import analyze_pdf
+from .entrezpy_clients._writers import LAYOUTS
+from .errors import MishmashError
+from .telemetry import MEMORY_BUDGET, PROFILER, RUN_REPORT
 
 
-def install_nltk_punkt_dataset():
+# the subcommands (and their heavy dependencies, like pandas, NLTK or
+# entrezpy) are only imported once we know which one is going to run
+
+
+def assess_metadata(args):
+    from .fetch_metadata import get_metadata
+
+    return get_metadata(args)
+
+
+def assess_sequences(args):
+    from .scrape_pdf import analyze_pdf
+
+    return analyze_pdf(args)
+
+
+def add_profiling_arguments(parser):
+    parser.add_argument("--profile",
+                        help="If included, every stage of the run is timed "
+                             "and a summary of the timings (total, median "
+                             "and 95th percentile per call, number of "
+                             "calls) is printed at the end.",
+                        action="store_true")
+    parser.add_argument("--profile_file",
+                        help="If provided, the run is profiled with cProfile "
+                             "and the statistics are saved to this file "
+                             "(readable with pstats or e.g. snakeviz).",
+                        type=str,
+                        required=False)
+    parser.add_argument("--memory_profile",
+                        help="If included, memory allocations are traced and "
+                             "the peak and retained memory of every stage "
+                             "as well as the top allocation sites are "
+                             "printed at the end (this slows the run down).",
+                        action="store_true")
+    parser.add_argument("--memory_budget",
+                        help="Memory (in MB) the run should stay within: when "
+                             "it is approached, the streaming stages flush "
+                             "what they hold and shrink their batches.",
+                        type=float,
+                        required=False)
+
+
+def add_eutils_arguments(parser):
+    parser.add_argument("--eutils_url",
+                        help="Base URL of the E-utilities, e.g. of a mirror "
+                             "or a local stand-in (defaults to the "
+                             "MISHMASH_EUTILS_URL environment variable or "
+                             "the NCBI E-utilities).",
+                        type=str,
+                        required=False)
+    archive = parser.add_mutually_exclusive_group()
+    archive.add_argument("--record",
+                         help="Path to a (compressed) archive to record all "
+                              "the E-utilities requests and responses of "
+                              "the run to.",
+                         type=str,
+                         required=False)
+    archive.add_argument("--replay",
+                         help="Path to an archive recorded with --record to "
+                              "answer all the E-utilities requests from, "
+                              "without any network access.",
+                         type=str,
+                         required=False)
+
+
+def run_profiled(args):
+    """Runs the subcommand, timing its stages if requested."""
+    if args.profile or args.memory_profile:
+        PROFILER.enable(memory=args.memory_profile)
+    if args.memory_budget:
+        MEMORY_BUDGET.set_limit(int(args.memory_budget * 2**20))
+    if not args.profile_file:
+        return args.func(args)
+
+    profiler = cProfile.Profile()
     try:
-        nltk.data.find("tokenizers/punkt_tab")
-    except LookupError:
-        nltk.download("punkt_tab")
+        return profiler.runcall(args.func, args)
+    finally:
+        profiler.dump_stats(args.profile_file)
+        print("Profile saved to {}".format(args.profile_file))
 
 
 def main():
-    install_nltk_punkt_dataset()
-
     parser = argparse.ArgumentParser()
     subparsers = parser.add_subparsers(required=True)
 
     md_parser = subparsers.add_parser("assess_metadata",
                                       help="Retrieves metadata from INSDC "
                                            "database accession IDs.")
-    md_parser.set_defaults(func=get_metadata)
+    md_parser.set_defaults(func=assess_metadata)
     md_parser.add_argument("--email",
                            help="User email address required for database "
                                 "access.",
@@ -43,21 +118,115 @@ def main():
                            "newline-delimited, "
                            "containing one ID per line.",
                            type=str)
+    md_parser.add_argument("--query",
+                           help="Search query to retrieve metadata for "
+                                "(used instead of accession IDs), e.g.: a "
+                                "BioSample query.",
+                           type=str,
+                           required=False)
+    md_parser.add_argument("--query_db",
+                           help="Database to run the search query in.",
+                           choices=["biosample", "bioproject", "sra"],
+                           default="biosample",
+                           required=False)
+    md_parser.add_argument("--use_history",
+                           help="If included, search results are kept on "
+                                "the NCBI history server and linked and "
+                                "fetched from there instead of being "
+                                "transferred as lists of IDs. Recommended "
+                                "for queries matching very many records; "
+                                "falls back to the default mode on failure.",
+                           action="store_true")
+    md_parser.add_argument("--runinfo",
+                           help="If included, runs are found using the "
+                                "compact SRA RunInfo tables (instead of "
+                                "document summaries), which also provide "
+                                "run statistics (spots, bases, size) for "
+                                "the run report.",
+                           action="store_true")
+    md_parser.add_argument("--runinfo_only",
+                           help="If included, the RunInfo table of the runs "
+                                "is saved instead of their metadata - the "
+                                "full metadata is not fetched at all.",
+                           action="store_true")
     md_parser.add_argument("--n_jobs",
                            help="Number of jobs to run in parallel",
+                           type=int,
                            default=1,
                            required=False)
+    md_parser.add_argument("--parse_jobs",
+                           help="Number of processes to parse the fetched "
+                                "metadata in. By default (0), metadata is "
+                                "parsed by the threads fetching it.",
+                           type=int,
+                           default=0,
+                           required=False)
     md_parser.add_argument("--output_file",
                            help="File name for output.",
                            type=str,
                            default="output.csv",
                            required=False)
+    md_parser.add_argument("--layout",
+                           help="Layout of the output table: 'wide' (one "
+                                "column per metadata attribute), 'sparse' "
+                                "(wide, with attribute columns stored "
+                                "sparsely) or 'long' (one row per run and "
+                                "attribute, streamed to the output file).",
+                           choices=LAYOUTS,
+                           default="wide",
+                           required=False)
+    md_parser.add_argument("--columns",
+                           help="Comma-separated list of the output columns "
+                                "to keep, e.g.: 'Organism,Library Layout,"
+                                "Ph [sample]'. Custom attributes are only "
+                                "extracted for the levels these columns "
+                                "refer to. All the columns are kept if not "
+                                "provided.",
+                           type=str,
+                           required=False)
+    md_parser.add_argument("--levels",
+                           help="Comma-separated list of the SRA levels "
+                                "(run, experiment, sample, study) whose "
+                                "metadata should be kept. All the levels "
+                                "are kept if not provided.",
+                           type=str,
+                           required=False)
+    md_parser.add_argument("--cache_file",
+                           help="Path to an SQLite file caching the metadata "
+                                "of every run. Cached runs are not fetched "
+                                "again until they expire (see --cache_ttl).",
+                           type=str,
+                           required=False)
+    md_parser.add_argument("--cache_ttl",
+                           help="Number of days after which cached runs are "
+                                "fetched again. Cached runs never expire "
+                                "if not provided.",
+                           type=float,
+                           required=False)
+    md_parser.add_argument("--refresh",
+                           help="If included, metadata of all the runs is "
+                                "fetched (and cached) again, regardless of "
+                                "the cache contents.",
+                           action="store_true")
+    md_parser.add_argument("--report_file",
+                           help="If provided, a JSON report of the run "
+                                "(e.g., the EFetch batch sizes used) is "
+                                "saved to this file.",
+                           type=str,
+                           required=False)
+    md_parser.add_argument("--metrics_file",
+                           help="If provided, metrics of the run (requests, "
+                                "bytes, retries, parse times and rows per "
+                                "stage) are saved to this file in the "
+                                "Prometheus text format.",
+                           type=str,
+                           required=False)
 
     accession_parser = subparsers.add_parser("assess_sequences",
                                              help="From published literature, "
                                                   "retrieves accession IDs "
                                                   "for INSDC datcdabases.")
-    accession_parser.set_defaults(func=analyze_pdf)
+    accession_parser.set_defaults(func=assess_sequences)
     accession_parser.add_argument("--pmc_list",
                                   nargs="+",
                                   help="Space-separated list of PubMed Central "
@@ -78,10 +247,26 @@ def main():
                                        "columns with journal name and "
                                        "institutional affiliation.",
                                   action="store_true")
+    accession_parser.add_argument("--email",
+                                  help="User email address sent to NCBI "
+                                       "with the requests.",
+                                  type=str)
+    accession_parser.add_argument("--count_runs",
+                                  help="If included, the number of sequence "
+                                       "records is the number of distinct "
+                                       "runs listed in the SRA RunInfo "
+                                       "tables of the accession IDs found, "
+                                       "instead of the number of SRA "
+                                       "records found for each of them.",
+                                  action="store_true")
 
-    args = parser.parse_args()
-    output_df = args.func(args)
+    add_profiling_arguments(md_parser)
+    add_profiling_arguments(accession_parser)
+    add_eutils_arguments(md_parser)
+    add_eutils_arguments(accession_parser)
 
+    args = parser.parse_args()
+    # ask before anything is run (or recorded), not after the whole run
     if os.path.exists(args.output_file):
         response = input(
             f"The file '{args.output_file}' already exists. "
@@ -91,9 +276,50 @@ def main():
             print("Operation aborted by the user.")
             return
 
-    output_df.to_csv(args.output_file)
+    if args.eutils_url:
+        from .entrezpy_clients._client import set_eutils_url
+
+        set_eutils_url(args.eutils_url)
+    try:
+        if args.record or args.replay:
+            from . import replay
+
+            if args.record:
+                replay.start_recording(args.record)
+            else:
+                replay.start_replay(args.replay)
+            try:
+                output_df = run_profiled(args)
+            finally:
+                replay.stop()
+        else:
+            output_df = run_profiled(args)
+    except MishmashError as e:
+        print(e)
+        exit(1)
+    if args.record:
+        print("HTTP traffic recorded to {}".format(args.record))
+
+    with PROFILER.stage("write"):
+        output_df.to_csv(args.output_file)
     print("Results saved to {}".format(args.output_file))
 
+    if args.memory_profile:
+        RUN_REPORT.record("memory", stages=PROFILER.memory_summary(),
+                          top_allocations=PROFILER.top_allocations())
+    if args.memory_budget:
+        RUN_REPORT.record("memory_budget", **MEMORY_BUDGET.summary())
+    if getattr(args, "report_file", None):
+        RUN_REPORT.to_json(args.report_file)
+        print("Run report saved to {}".format(args.report_file))
+    if getattr(args, "metrics_file", None):
+        RUN_REPORT.metrics.write_prometheus(args.metrics_file)
+        print("Run metrics saved to {}".format(args.metrics_file))
+    if args.profile:
+        print(PROFILER.format_summary())
+    if args.memory_profile:
+        print(PROFILER.format_memory_summary())
+
 
 if __name__ == "__main__":
     print("Module is being imported.")
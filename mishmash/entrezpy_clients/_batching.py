@@ -0,0 +1,119 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Bokulich Laboratories.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import threading
+
+
+class AdaptiveBatchSizer:
+    """Tunes the number of records requested from EFetch in one batch.
+
+    After every successful batch, the response size and latency per record
+    are estimated (as exponentially weighted averages) and the next batch
+    size is chosen so that a response stays within `target_bytes` and
+    `target_seconds`. The size can grow by at most `max_growth` times at
+    once and is halved whenever a batch fails (e.g., times out) or the
+    `memory_budget` (if any) is approached. It always stays within
+    [`min_size`, `max_size`].
+
+    Attributes:
+        size (int): Number of records to request in the next batch.
+        history (list): Size, response bytes, latency and outcome
+            of every batch recorded so far.
+    """
+
+    def __init__(
+        self,
+        initial: int = 150,
+        min_size: int = 10,
+        max_size: int = 2000,
+        target_bytes: int = 16 * 2**20,
+        target_seconds: float = 20.0,
+        max_growth: float = 2.0,
+        smoothing: float = 0.5,
+        memory_budget=None,
+    ):
+        if not 0 < min_size <= initial <= max_size:
+            raise ValueError(
+                "Batch sizes need to fulfil 0 < min_size <= initial "
+                f"<= max_size (got {min_size}, {initial}, {max_size})."
+            )
+        self.initial = initial
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_bytes = target_bytes
+        self.target_seconds = target_seconds
+        self.max_growth = max_growth
+        self.smoothing = smoothing
+        self.memory_budget = memory_budget
+        self.size = initial
+        self.history = []
+        self._bytes_per_record = None
+        self._seconds_per_record = None
+        self._lock = threading.Lock()
+
+    def _clamp(self, size: float) -> int:
+        return int(max(self.min_size, min(self.max_size, size)))
+
+    def _smooth(self, previous, current):
+        if previous is None:
+            return current
+        return self.smoothing * current + (1 - self.smoothing) * previous
+
+    def record_success(self, n_records: int, n_bytes: int, seconds: float):
+        """Updates the batch size using the observations from a batch."""
+        if n_records <= 0:
+            return
+        with self._lock:
+            self.history.append({
+                "size": n_records, "bytes": n_bytes,
+                "seconds": round(seconds, 3), "ok": True
+            })
+            self._bytes_per_record = self._smooth(
+                self._bytes_per_record, n_bytes / n_records
+            )
+            self._seconds_per_record = self._smooth(
+                self._seconds_per_record, seconds / n_records
+            )
+            candidates = [self.size * self.max_growth]
+            if self._bytes_per_record > 0:
+                candidates.append(self.target_bytes / self._bytes_per_record)
+            if self._seconds_per_record > 0:
+                candidates.append(
+                    self.target_seconds / self._seconds_per_record
+                )
+            if self.memory_budget is not None \
+                    and self.memory_budget.approached():
+                # smaller responses (and parsed batches) take less memory
+                candidates.append(self.size // 2)
+                self.history[-1]["memory"] = True
+            self.size = self._clamp(min(candidates))
+
+    def record_failure(self, n_records: int):
+        """Backs off after a failed (or timed out) batch."""
+        with self._lock:
+            self.history.append({
+                "size": n_records, "bytes": None, "seconds": None, "ok": False
+            })
+            self.size = self._clamp(min(self.size, n_records) // 2)
+
+    def summary(self) -> dict:
+        """Summarizes the batch sizes chosen so far (for a run report)."""
+        with self._lock:
+            sizes = [x["size"] for x in self.history]
+            return {
+                "initial_size": self.initial,
+                "final_size": self.size,
+                "min_size_used": min(sizes) if sizes else None,
+                "max_size_used": max(sizes) if sizes else None,
+                "batches": len(self.history),
+                "failed_batches": sum(not x["ok"] for x in self.history),
+                "memory_shrinks": sum(
+                    x.get("memory", False) for x in self.history
+                ),
+                "history": list(self.history),
+            }
@@ -0,0 +1,141 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Bokulich Laboratories.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import json
+import sqlite3
+import time
+from typing import Iterable, Tuple, Union
+
+from ._sra_meta import LEVELS
+from ._utils import _chunker
+
+# keys linking the fields of every level to its parent level
+PARENT_KEYS = {"run": "experiment_id", "experiment": "sample_id",
+               "sample": "study_id"}
+
+# maximum number of parameters in a single SQLite query
+_QUERY_CHUNK = 500
+
+
+class MetadataCache:
+    """A persistent SQLite cache of the SRA metadata, keyed by run ID.
+
+    Every level of the SRA hierarchy is stored in its own table, so that
+    the experiment, sample and study records are not duplicated across all
+    of their runs. Records are stored in the same form as generated by
+    `EFetchResult.iter_run_records` (one dictionary of fields per level)
+    together with the time they were fetched at. Runs fetched longer than
+    `ttl` seconds ago are considered stale.
+
+    Attributes:
+        path (str): Path to the SQLite database.
+        ttl (float): Maximum age of a cached run (in seconds); runs never
+            expire if not provided.
+    """
+
+    def __init__(self, path: str, ttl: Union[float, None] = None):
+        self.path = path
+        self.ttl = ttl
+        # the connection may be used by other threads than the one that
+        # opened it (e.g. by a long-lived Session), one at a time
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.conn:
+            for level in LEVELS:
+                self.conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {level} ("
+                    "id TEXT PRIMARY KEY, fetched_at REAL NOT NULL, "
+                    "fields TEXT NOT NULL)"
+                )
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def store(self, records: Iterable[Tuple[str, tuple]],
+              fetched_at: float = None) -> int:
+        """Stores freshly fetched runs together with their parents.
+
+        Args:
+            records (Iterable[Tuple[str, tuple]]): Run IDs and the field
+                dictionaries of all their levels (from the run up to the
+                study), as generated by `EFetchResult.iter_run_records`.
+            fetched_at (float): Time the records were fetched at
+                (defaults to now).
+
+        Returns:
+            int: Number of stored runs.
+        """
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        rows = {level: {} for level in LEVELS}
+        for run_id, levels in records:
+            _id = run_id
+            for level, fields in zip(LEVELS, levels):
+                if _id is None:
+                    break
+                rows[level][_id] = json.dumps(fields)
+                _id = fields.get(PARENT_KEYS.get(level))
+
+        with self.conn:
+            for level, level_rows in rows.items():
+                self.conn.executemany(
+                    f"INSERT OR REPLACE INTO {level} VALUES (?, ?, ?)",
+                    ((k, fetched_at, v) for k, v in level_rows.items())
+                )
+        return len(rows["run"])
+
+    def _select(self, level: str, ids: list, min_time: float) -> dict:
+        found = {}
+        for chunk in _chunker(list(ids), _QUERY_CHUNK):
+            placeholders = ", ".join("?" * len(chunk))
+            cursor = self.conn.execute(
+                f"SELECT id, fields FROM {level} WHERE id IN "
+                f"({placeholders}) AND fetched_at >= ?",
+                (*chunk, min_time)
+            )
+            found.update((k, json.loads(v)) for k, v in cursor)
+        return found
+
+    def load(self, run_ids: list) -> dict:
+        """Loads the cached runs which did not expire yet.
+
+        Runs whose parent records are missing from the cache are treated
+        as if they were not cached at all.
+
+        Args:
+            run_ids (list): IDs of the runs to be loaded.
+
+        Returns:
+            dict: Mapping of run IDs to their field dictionaries (ordered
+                from the run up to the study level).
+        """
+        min_time = time.time() - self.ttl if self.ttl is not None else 0
+        levels = {"run": self._select("run", run_ids, min_time)}
+        for child, level in zip(LEVELS, LEVELS[1:]):
+            parent_key = PARENT_KEYS[child]
+            parent_ids = {
+                fields.get(parent_key) for fields in levels[child].values()
+            }
+            parent_ids.discard(None)
+            levels[level] = self._select(level, parent_ids, 0)
+
+        records = {}
+        for run_id, run_fields in levels["run"].items():
+            chain, fields = [run_fields], run_fields
+            for child, level in zip(LEVELS, LEVELS[1:]):
+                fields = levels[level].get(fields.get(PARENT_KEYS[child]))
+                if fields is None:
+                    break
+                chain.append(fields)
+            else:
+                records[run_id] = tuple(chain)
+        return records
@@ -0,0 +1,370 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Bokulich Laboratories.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import io
+import itertools
+import os
+import threading
+import time
+from typing import Iterator, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ..replay import ArchiveAdapter, replaying
+from ..telemetry import METRICS, PROFILER
+from ._utils import NCBI_RATE_LIMITER, RateLimiter, _chunker, set_up_logger
+
+EUTILS_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
+# environment variable overriding the E-utilities base URL
+EUTILS_URL_VAR = "MISHMASH_EUTILS_URL"
+TOOL = "mishmash"
+
+# responses worth retrying - all the others are final
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# number of UIDs ESearch returns per request when collecting all of them
+ESEARCH_REQSIZE = 10000
+# number of records EFetch returns per request if not specified otherwise
+EFETCH_REQSIZE = 500
+
+_QUERY_IDS = itertools.count(1)
+_BASE_URL = None
+
+
+def set_eutils_url(url: Union[str, None]):
+    """Sets the E-utilities base URL used by all the clients.
+
+    Meant for running against a mirror or a local stand-in (see
+    `mishmash.mock_eutils`); None restores the default.
+    """
+    global _BASE_URL
+    _BASE_URL = url.rstrip("/") if url else None
+
+
+def eutils_url() -> str:
+    """Returns the E-utilities base URL.
+
+    This is the URL set with `set_eutils_url` or, if none was set, the one
+    in the MISHMASH_EUTILS_URL environment variable or the NCBI one.
+    """
+    return _BASE_URL or os.environ.get(EUTILS_URL_VAR, EUTILS_URL).rstrip("/")
+
+
+class EUtilsError(RuntimeError):
+    pass
+
+
+class EUtilsRequest:
+    """A single request sent to one of the E-utilities.
+
+    Exposes the same attributes as the entrezpy requests do, so that the
+    entrezpy analyzers (and our subclasses thereof) can process the
+    responses unchanged.
+
+    Attributes:
+        eutil (str): Name of the E-utility endpoint, e.g. 'efetch.fcgi'.
+        query_id (str): ID of the query this request belongs to.
+        id (int): Number of the request within its query.
+        params (dict): Parameters sent with the request.
+        uids (list): UIDs requested (empty if fetched from the history
+            server).
+    """
+
+    def __init__(self, eutil: str, query_id: str, request_id: int,
+                 params: dict, uids: Union[list, None] = None):
+        self.eutil = f"{eutil}.fcgi"
+        self.query_id = query_id
+        self.id = request_id
+        self.params = params
+        self.db = params.get("db")
+        self.retmode = params.get("retmode", "xml")
+        self.rettype = params.get("rettype")
+        self.cmd = params.get("cmd")
+        self.uids = list(uids or [])
+        self.tool = TOOL
+
+    def dump_internals(self) -> dict:
+        return {"eutil": self.eutil, "query_id": self.query_id, "id": self.id,
+                "params": {k: v for k, v in self.params.items()
+                           if k not in ("id", "email", "api_key")},
+                "uids": len(self.uids)}
+
+
+class EUtilsQuery:
+    """A query against one of the E-utilities, run by the shared client.
+
+    Can be used in place of the entrezpy queries (e.g. an Efetcher):
+    `inquire` accepts the same parameters and analyzers, but all of the
+    requests go through the connection pool of the client.
+
+    Attributes:
+        id (str): Unique ID of the query.
+    """
+
+    def __init__(self, client: "EUtilsClient", eutil: str):
+        self.client = client
+        self.eutil = eutil
+        self.id = f"{eutil}-{next(_QUERY_IDS)}"
+
+    def inquire(self, parameters: dict, analyzer):
+        return self.client.inquire(self.eutil, parameters, analyzer, self.id)
+
+
+class EUtilsClient:
+    """A lightweight E-utilities client sharing connections between queries.
+
+    All the requests are sent through a single `requests.Session`, keeping
+    the connections to NCBI alive from one request (and query) to the next,
+    and spaced out by a shared rate limiter. Responses are passed on to the
+    entrezpy analyzers, just like entrezpy would do. Requests failing with
+    a transient error (HTTP 429, 5xx, connection errors or timeouts) are
+    retried with an exponential backoff, as are the responses cut off
+    mid-transfer. When replaying recorded traffic (see `mishmash.replay`),
+    requests are neither rate-limited nor delayed. Requests, retries,
+    failures, response sizes and durations are recorded in the run metrics.
+
+    Attributes:
+        email (str): User email sent with every request.
+        api_key (str): NCBI API key (raises the allowed request rate).
+        base_url (str): Base URL of the E-utilities (see `eutils_url`).
+        limiter (RateLimiter): Limiter shared by all the requests.
+        timeout (float): Timeout of a single request (in seconds).
+        max_retries (int): Number of times a failed request is retried.
+        backoff (float): Delay before the first retry (in seconds);
+            doubled with every further retry.
+    """
+
+    def __init__(
+        self,
+        email: str,
+        api_key: Union[str, None] = None,
+        base_url: Union[str, None] = None,
+        limiter: Union[RateLimiter, None] = None,
+        timeout: float = 60.0,
+        max_retries: int = 3,
+        backoff: float = 1.0,
+        pool_size: int = 10,
+        log_level: str = "ERROR",
+    ):
+        self.email = email
+        self.api_key = api_key
+        self.base_url = (base_url or eutils_url()).rstrip("/")
+        # NCBI allows up to 10 requests per second with an API key
+        self.limiter = limiter or (
+            RateLimiter(10) if api_key else NCBI_RATE_LIMITER
+        )
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.logger = set_up_logger(log_level, self)
+        self._parse_lock = threading.Lock()
+
+        # the traffic can be recorded or replayed (see `mishmash.replay`)
+        self.session = requests.Session()
+        adapter = ArchiveAdapter(
+            HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def close(self):
+        self.session.close()
+
+    def query(self, eutil: str) -> EUtilsQuery:
+        """Creates a new query against the given E-utility."""
+        return EUtilsQuery(self, eutil)
+
+    def _retry_delay(self, attempt: int, response=None) -> float:
+        retry_after = None
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return self.backoff * 2 ** (attempt - 1)
+
+    def post(self, eutil: str, params: dict) -> bytes:
+        """Sends a single request, retrying it on transient errors.
+
+        Args:
+            eutil (str): Name of the E-utility, e.g. 'efetch'.
+            params (dict): Parameters of the request.
+
+        Returns:
+            bytes: Body of the response.
+        Raises:
+            EUtilsError: When the request did not succeed.
+        """
+        url = f"{self.base_url}/{eutil}.fcgi"
+        data = {**params, "tool": TOOL, "email": self.email}
+        if self.api_key:
+            data["api_key"] = self.api_key
+
+        # replayed responses are neither rate-limited nor waited for
+        replay = replaying()
+        for attempt in range(1, self.max_retries + 2):
+            if not replay:
+                self.limiter.wait()
+            response = None
+            METRICS.inc("mishmash_requests_total", eutil=eutil)
+            start = time.perf_counter()
+            try:
+                response = self.session.post(url, data=data,
+                                             timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout,
+                    requests.exceptions.ChunkedEncodingError) as e:
+                error = f"{type(e).__name__}: {e}"
+            else:
+                METRICS.observe("mishmash_request_seconds",
+                                time.perf_counter() - start, eutil=eutil)
+                if response.status_code == 200:
+                    METRICS.inc("mishmash_response_bytes_total",
+                                len(response.content), eutil=eutil)
+                    return response.content
+                error = f"HTTP {response.status_code}"
+                if response.status_code not in RETRY_STATUS:
+                    break
+            if attempt > self.max_retries:
+                break
+            delay = self._retry_delay(attempt, response)
+            self.logger.warning(
+                f"{eutil} request failed ({error}); retrying in {delay:.1f} s."
+            )
+            METRICS.inc("mishmash_retries_total", eutil=eutil)
+            if not replay:
+                time.sleep(delay)
+        METRICS.inc("mishmash_request_failures_total", eutil=eutil)
+        raise EUtilsError(f"{eutil} request failed ({error})")
+
+    @staticmethod
+    def _prepare(eutil: str, parameters: dict) -> Tuple[dict, int, list]:
+        params = {k: v for k, v in parameters.items() if v is not None}
+        # we always send all the UIDs in a single 'id' parameter
+        params.pop("link", None)
+        reqsize = params.pop("reqsize", None)
+        uids = [str(x) for x in params.pop("id", None) or []]
+
+        usehistory = params.pop("usehistory", False)
+        if usehistory:
+            params["usehistory"] = "y"
+        if eutil == "elink":
+            params.setdefault("cmd", "neighbor")
+        if eutil in ("esearch", "elink"):
+            # the entrezpy analyzers of those expect JSON
+            params.pop("rettype", None)
+            params["retmode"] = "json"
+        return params, reqsize, uids
+
+    def _pages(self, eutil: str, params: dict, reqsize: int,
+               uids: list) -> Iterator[Tuple[dict, list]]:
+        # EFetch requests are split into pages of `reqsize` records:
+        # by UIDs if those were provided, by retstart otherwise
+        if eutil != "efetch":
+            yield ({**params, "id": ",".join(uids)} if uids else params), uids
+        elif uids:
+            params.pop("retmax", None)
+            for chunk in _chunker(uids, reqsize or len(uids)):
+                yield {**params, "id": ",".join(chunk)}, chunk
+        else:
+            count = int(params.pop("retmax", 0))
+            reqsize = reqsize or EFETCH_REQSIZE
+            for start in range(0, count, reqsize):
+                yield {**params, "retstart": start,
+                       "retmax": min(reqsize, count - start)}, []
+
+    def _send(self, eutil: str, params: dict, uids: list, analyzer,
+              query_id: str, request_id: int):
+        # document summaries are profiled apart from the metadata
+        stage = "docsum" if params.get("rettype") == "docsum" else eutil
+        with PROFILER.stage(stage):
+            raw = self.post(eutil, params)
+        request = EUtilsRequest(eutil, query_id, request_id, params, uids)
+        # entrezpy never clears the error flag of an analyzer, which may
+        # be shared by several queries - it is checked for every response
+        with self._parse_lock, PROFILER.stage("parse"):
+            analyzer.hasErrorResponse = False
+            analyzer.parse(io.BytesIO(raw), request)
+            error = analyzer.hasErrorResponse
+        if error:
+            raise EUtilsError(f"{eutil} returned an error response")
+
+    def inquire(self, eutil: str, parameters: dict, analyzer,
+                query_id: Union[str, None] = None):
+        """Runs a query, processing all of its responses with the analyzer.
+
+        Takes the same parameters as the entrezpy queries do. EFetch
+        queries are split into pages of `reqsize` records; ESearch queries
+        without `retmax` collect all of the UIDs found, ESEARCH_REQSIZE at
+        a time.
+
+        Args:
+            eutil (str): Name of the E-utility ('esearch', 'elink' or
+                'efetch').
+            parameters (dict): Parameters of the query.
+            analyzer (EutilsAnalyzer): Analyzer processing the responses.
+            query_id (str): ID of the query (generated if not provided).
+
+        Returns:
+            EutilsAnalyzer: The analyzer.
+        Raises:
+            EUtilsError: When any of the requests did not succeed.
+        """
+        query_id = query_id or f"{eutil}-{next(_QUERY_IDS)}"
+        params, reqsize, uids = self._prepare(eutil, parameters)
+
+        if eutil == "esearch" and "retmax" not in params:
+            start, request_id = 0, 0
+            while True:
+                page = {**params, "retstart": start,
+                        "retmax": ESEARCH_REQSIZE}
+                self._send(eutil, page, uids, analyzer, query_id, request_id)
+                start, request_id = start + ESEARCH_REQSIZE, request_id + 1
+                if start >= analyzer.query_size():
+                    break
+            return analyzer
+
+        pages = self._pages(eutil, params, reqsize, uids)
+        for request_id, (page, page_uids) in enumerate(pages):
+            self._send(eutil, page, page_uids, analyzer, query_id, request_id)
+        return analyzer
+
+
+_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_client(email: Union[str, EUtilsClient],
+               log_level: str = "ERROR") -> EUtilsClient:
+    """Returns the process-wide E-utilities client.
+
+    The client (and its connection pool) is created once and reused by all
+    the queries. It is only replaced when a different email is provided or
+    the E-utilities base URL has changed.
+
+    Callers owning a client of their own (e.g. `mishmash.Session`) pass it
+    instead of the email wherever the pipelines take one: it is then used
+    as it is, leaving the process-wide client alone.
+
+    Args:
+        email (Union[str, EUtilsClient]): User email (or the client to use).
+        log_level (str): The log level to set.
+
+    Returns:
+        EUtilsClient: The shared client (or the provided one).
+    """
+    if isinstance(email, EUtilsClient):
+        return email
+    global _CLIENT
+    with _CLIENT_LOCK:
+        base_url = eutils_url()
+        if _CLIENT is None or _CLIENT.email != email \
+                or _CLIENT.base_url != base_url:
+            if _CLIENT is not None:
+                _CLIENT.close()
+            _CLIENT = EUtilsClient(email, base_url=base_url,
+                                   log_level=log_level)
+        return _CLIENT
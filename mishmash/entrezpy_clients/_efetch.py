@@ -6,36 +6,76 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 
+import io
 import json
+import threading
+import time
+from types import SimpleNamespace
 from typing import List, Union
+from xml.parsers.expat import ExpatError
 
+import numpy as np
 import pandas as pd
 from entrezpy.base.result import EutilsResult
 from entrezpy.efetch.efetch_analyzer import EfetchAnalyzer
 from xmltodict import parse as parsexml
 
-from ._utils import rename_columns, set_up_logger
+from ..telemetry import METRICS, PROFILER
+from ._projection import MetadataProjection
+from ._utils import set_dtypes, set_up_logger
+from ._sra_compact import COMPACT_MODELS, TagVocabulary
 from ._sra_meta import (
+    LEVELS,
     LibraryMetadata,
-    SRARun,
-    SRAExperiment,
-    SRASample,
-    SRAStudy,
+    META_DTYPES,
     META_REQUIRED_COLUMNS,
+    MODELS,
 )
 
+# errors raised when parsing a truncated, malformed or otherwise unexpected
+# metadata response
+PARSE_ERRORS = (ExpatError, KeyError, TypeError, AttributeError)
+
+
+# constructor arguments (apart from the ID and custom metadata) stored in the
+# plain records used to move SRA objects between processes
+RECORD_FIELDS = {
+    "study": ("bioproject_id", "center_name"),
+    "sample": ("name", "title", "biosample_id", "organism", "tax_id",
+               "study_id"),
+    "experiment": ("instrument", "platform", "sample_id"),
+    "run": ("public", "bytes", "bases", "spots", "experiment_id"),
+}
+LIBRARY_FIELDS = ("name", "layout", "selection", "source")
+
 
 class EFetchResult(EutilsResult):
-    """Entrezpy client for EFetch utility used to fetch SRA metadata."""
+    """Entrezpy client for EFetch utility used to fetch SRA metadata.
 
-    def __init__(self, response, request, log_level):
+    With `compact` set to True, the slotted classes from `_sra_compact`
+    are used to store the SRA objects, which considerably reduces
+    the memory footprint for projects with very many runs. With
+    a `projection`, only the requested levels and columns are extracted
+    (see `MetadataProjection`).
+    """
+
+    def __init__(self, response, request, log_level, compact=False,
+                 projection: Union[MetadataProjection, None] = None):
         super().__init__(request.eutil, request.query_id, request.db)
+        self.models = COMPACT_MODELS if compact else MODELS
+        self.projection = projection
+        # normalised attribute keys and column names shared by all the
+        # objects of this result (compact objects also store their keys
+        # as indices into it)
+        self.vocabulary = TagVocabulary()
+        self._model_kwargs = {"vocabulary": self.vocabulary} if compact else {}
         self.metadata_raw = None
         self.metadata = []
         self.studies = {}
         self.samples = {}
         self.experiments = {}
         self.runs = {}
+        self.cached_records = {}
         self.logger = set_up_logger(log_level, self)
 
     def size(self):
@@ -59,33 +99,248 @@ class EFetchResult(EutilsResult):
     def get_link_parameter(self, reqnum=0):
         return {}
 
-    def metadata_to_df(self) -> pd.DataFrame:
-        """Converts collected metadata into a DataFrame.
+    @classmethod
+    def empty(cls, log_level="ERROR", compact=False, projection=None):
+        """Creates a result without any fetched records.
+
+        Useful when all the records can be added from a cache
+        (see `add_cached_records`).
+        """
+        request = SimpleNamespace(eutil="efetch.fcgi", query_id=None, db="sra")
+        return cls(None, request, log_level, compact, projection)
+
+    def add_cached_records(self, records: dict):
+        """Adds previously fetched runs (e.g., from `MetadataCache`).
+
+        Cached runs are included in all the outputs, unless the same run
+        was also fetched - then, the fetched record takes precedence.
+
+        Args:
+            records (dict): Mapping of run IDs to their field dictionaries
+                (as generated by `iter_run_records`).
+        """
+        self.cached_records.update(records)
+
+    def to_records(self) -> dict:
+        """Exports the SRA objects as plain (picklable) records.
+
+        Every object becomes a dictionary of its constructor arguments,
+        including the ID of its parent; children are not included.
 
         Returns:
-            pd.DataFrame: Metadata in a form of a DataFrame with an index
-                corresponding to the run IDs.
+            dict: Records of all the objects per level (ordered from the
+                study down to the run level) and the processed run IDs
+                ('metadata').
+        """
+        records = {"metadata": list(self.metadata)}
+        for level, objects in (
+            ("study", self.studies), ("sample", self.samples),
+            ("experiment", self.experiments), ("run", self.runs)
+        ):
+            records[level] = level_records = []
+            for obj in objects.values():
+                record = {k: getattr(obj, k) for k in RECORD_FIELDS[level]}
+                record["id"] = obj.id
+                record["custom_meta"] = obj.get_custom_meta() or None
+                if level == "experiment":
+                    record["library"] = {
+                        k: getattr(obj.library, k) for k in LIBRARY_FIELDS
+                    }
+                level_records.append(record)
+        return records
+
+    def merge_records(self, records: dict):
+        """Merges records exported by `to_records` into this result.
+
+        Objects which already exist are not re-created and new objects are
+        attached to their parents, exactly as if they were parsed here.
+
+        Args:
+            records (dict): Records as generated by `to_records`.
         """
-        df = pd.concat([v.generate_meta() for v in self.studies.values()])
-        df.index.name = "ID"
+        for record in records["study"]:
+            if record["id"] not in self.studies:
+                self.studies[record["id"]] = self.models["study"](
+                    **record, **self._model_kwargs
+                )
+        for record in records["sample"]:
+            if record["id"] not in self.samples:
+                sample = self.models["sample"](**record, **self._model_kwargs)
+                self.samples[sample.id] = sample
+                self.studies[sample.study_id].samples.append(sample)
+        for record in records["experiment"]:
+            if record["id"] not in self.experiments:
+                record = dict(record)
+                record["library"] = self.models["library"](**record["library"])
+                exp = self.models["experiment"](**record, **self._model_kwargs)
+                self.experiments[exp.id] = exp
+                self.samples[exp.sample_id].experiments.append(exp)
+        for record in records["run"]:
+            if record["id"] not in self.runs:
+                run = self.models["run"](**record, **self._model_kwargs)
+                self.runs[run.id] = run
+                self.experiments[run.experiment_id].runs.append(run)
+        self.metadata += records["metadata"]
+
+    def iter_run_records(self, include_cached=True):
+        """Walks the study -> sample -> experiment -> run hierarchy once.
+
+        Every run inherits the fields of its experiment, sample and study.
+        Parents' fields are collected only once per object and shared
+        between all of their runs. Only the runs requested in EFetch are
+        included, followed by the cached runs (if any).
+
+        Args:
+            include_cached (bool): Whether to include the cached runs.
 
-        # remove empty columns, if any
-        df.dropna(axis=1, inplace=True, how="all")
+        Yields:
+            Tuple[str, tuple]: Run ID and a tuple of field dictionaries
+                ordered from the run up to the study level.
+        """
+        for study in self.studies.values():
+            study_fields = study.get_fields()
+            for sample in study.samples:
+                sample_fields = sample.get_fields()
+                for exp in sample.experiments:
+                    exp_fields = exp.get_fields()
+                    for run in exp.runs:
+                        if run.id not in self.runs:
+                            continue
+                        yield run.id, (
+                            run.get_fields(), exp_fields,
+                            sample_fields, study_fields
+                        )
+        if include_cached:
+            for run_id, levels in self.cached_records.items():
+                if run_id not in self.runs:
+                    yield run_id, levels
+
+    def _column_name(self, key: str) -> str:
+        """Translates a metadata key into its output column name."""
+        return self.vocabulary.column(key)
+
+    def _keeps_column(self, col: str) -> bool:
+        return self.projection is None or self.projection.keeps_column(col)
+
+    def _project(self, levels: tuple):
+        """Pairs the field dictionaries of a run with their (kept) levels."""
+        for level, fields in zip(LEVELS, levels):
+            if self.projection is None or self.projection.keeps_level(level):
+                yield level, fields
+
+    def _iter_run_rows(self):
+        """Assembles one flat row per run.
+
+        Keys are translated into column names as they are encountered;
+        where two keys map onto the same column, the first non-empty value
+        (in run -> study order) is retained. Empty values are skipped so
+        that columns with no values at all never get created.
+
+        Yields:
+            Tuple[str, dict]: Run ID and its row.
+        """
+        for run_id, levels in self.iter_run_records():
+            row = {}
+            for _, fields in self._project(levels):
+                for k, v in fields.items():
+                    if v is None:
+                        continue
+                    col = self._column_name(k)
+                    if col not in row and self._keeps_column(col):
+                        row[col] = v
+            yield run_id, row
+
+    def iter_long_records(self):
+        """Generates metadata in a long (tidy) format.
+
+        Every non-empty value becomes a single record, which makes this
+        format independent of how many distinct attributes were found
+        across all the runs. Attribute names are the same as the column
+        names in the output of `metadata_to_df`.
+
+        Yields:
+            Tuple[str, str, str, object]: Run ID, SRA level the attribute
+                belongs to, attribute name and its value.
+        """
+        for run_id, levels in self.iter_run_records():
+            seen = set()
+            for level, fields in self._project(levels):
+                for k, v in fields.items():
+                    if v is None:
+                        continue
+                    col = self._column_name(k)
+                    if col not in seen and self._keeps_column(col):
+                        seen.add(col)
+                        yield run_id, level, col, v
+
+    @PROFILER.timed("metadata_to_df")
+    def metadata_to_df(self, sparse: bool = False) -> pd.DataFrame:
+        """Converts collected metadata into a DataFrame.
 
-        # clean up column names
-        df = rename_columns(df)
+        One flat row is assembled per run and a single DataFrame is
+        created at the end. Columns listed in META_DTYPES are cast to
+        the corresponding (nullable or categorical) dtypes. With
+        a projection, only its columns are included (in its order).
 
-        # remove potential column duplicates
-        df = df.groupby(level=0, axis=1).first()
+        Args:
+            sparse (bool): If True, all the columns apart from
+                META_REQUIRED_COLUMNS (custom attributes, typically very
+                many of them and mostly empty) are stored as sparse arrays
+                instead of dense object columns.
 
-        # remove rows which are not indexed by run IDs
-        df = df.loc[df.index.isin(self.runs.keys())]
+        Returns:
+            pd.DataFrame: Metadata in a form of a DataFrame with an index
+                corresponding to the run IDs.
+        """
+        if sparse:
+            df = self._rows_to_sparse_df()
+        else:
+            run_ids, rows = [], []
+            for run_id, row in self._iter_run_rows():
+                run_ids.append(run_id)
+                rows.append(row)
+            df = pd.DataFrame.from_records(
+                rows, index=pd.Index(run_ids, name="ID")
+            )
 
         # reorder columns in a more sensible fashion
-        cols = META_REQUIRED_COLUMNS.copy()
-        cols.extend([c for c in df.columns if c not in cols])
+        if self.projection is not None and self.projection.columns:
+            cols = list(self.projection.columns)
+        else:
+            cols = [
+                c for c in META_REQUIRED_COLUMNS
+                if self.projection is None or c in df.columns
+            ]
+            cols.extend(sorted(c for c in df.columns if c not in cols))
+
+        return set_dtypes(df.reindex(columns=cols), META_DTYPES)
+
+    def _rows_to_sparse_df(self) -> pd.DataFrame:
+        """Builds a DataFrame column by column from the run rows.
 
-        return df[cols]
+        Values are first collected per column together with their row
+        positions, so only one column at a time is ever densified.
+        """
+        run_ids, columns = [], {}
+        for i, (run_id, row) in enumerate(self._iter_run_rows()):
+            run_ids.append(run_id)
+            for col, v in row.items():
+                positions, values = columns.setdefault(col, ([], []))
+                positions.append(i)
+                values.append(v)
+
+        data = {}
+        for col, (positions, values) in columns.items():
+            if col in META_REQUIRED_COLUMNS:
+                dense = pd.Series(values, index=positions)
+                data[col] = dense.reindex(range(len(run_ids))).values
+                continue
+            dense = np.full(len(run_ids), np.nan, dtype=object)
+            dense[positions] = values
+            data[col] = pd.arrays.SparseArray(
+                dense, fill_value=np.nan, dtype=pd.SparseDtype(object, np.nan)
+            )
+        return pd.DataFrame(data, index=pd.Index(run_ids, name="ID"))
 
     def extract_run_ids(self, response):
         """Extracts run IDs from an EFetch response.
@@ -98,11 +353,11 @@ class EFetchResult(EutilsResult):
             response (io.StringIO): Response received from Efetch.
         """
         response = json.loads(json.dumps(parsexml(response.read())))
-        result = response["eSummaryResult"].get("DocSum")
+        result = (response["eSummaryResult"] or {}).get("DocSum")
         if result:
             result = [result] if not isinstance(result, list) else result
             for content in result:
-                content = content.get("Item")
+                content = self._as_list(content.get("Item"))
                 for item in content:
                     for k, v in item.items():
                         if "Run acc" in v:
@@ -166,15 +421,18 @@ class EFetchResult(EutilsResult):
             custom_meta = self._extract_custom_attributes(
                 attributes["STUDY"], "study")
 
-            self.studies[study_id] = SRAStudy(
+            self.studies[study_id] = self.models["study"](
                 id=study_id,
                 bioproject_id=bioproject_id,
                 center_name=org,
                 custom_meta=custom_meta,
+                **self._model_kwargs,
             )
         return study_id
 
-    def _create_samples(self, attributes: dict, study_id: str) -> List[str]:
+    def _create_samples(
+        self, attributes: dict, study_id: str, sample_index: dict
+    ) -> List[str]:
         """Creates SRASample objects.
 
         Information like BioSample ID, organism, name as well as custom
@@ -184,17 +442,16 @@ class EFetchResult(EutilsResult):
             attributes (dict): Dictionary with all the metadata from
                 the XML response.
             study_id (str): ID of the study which the sample belongs to.
+            sample_index (dict): Mapping of sample IDs to their SAMPLE nodes
+                (see `_index_package`).
         Returns:
-            sample_id (str): ID of the processed sample.
+            sample_ids (List[str]): IDs of the processed samples.
         """
         if "Pool" in attributes.keys():
             pool_meta = attributes["Pool"].get("Member")
         else:
             pool_meta = attributes["SAMPLE"]
-        sample_attributes = attributes["SAMPLE"]
-        if not isinstance(pool_meta, list):
-            # we have one sample
-            pool_meta = [pool_meta]
+        pool_meta = self._as_list(pool_meta)
         sample_ids = []
         for sample in pool_meta:
             sample_id = sample.get("@accession")
@@ -204,14 +461,15 @@ class EFetchResult(EutilsResult):
                     biosample_id = next(
                         (x for x in biosample_id if x["@namespace"] == "BioSample")
                     )
-                if isinstance(sample_attributes, list):
-                    sample_attributes = next(
-                        (x for x in sample_attributes if x["@accession"] == sample_id)
-                    )
+                # every pool member has its own SAMPLE node; a package with
+                # a single SAMPLE node describes that one sample only
+                sample_attributes = sample_index.get(sample_id)
+                if sample_attributes is None and len(sample_index) == 1:
+                    sample_attributes = next(iter(sample_index.values()))
                 custom_meta = self._extract_custom_attributes(
-                    sample_attributes, "sample"
+                    sample_attributes or {}, "sample"
                 )
-                self.samples[sample_id] = SRASample(
+                self.samples[sample_id] = self.models["sample"](
                     id=sample_id,
                     name=sample.get("@sample_name"),
                     title=sample.get("@sample_title"),
@@ -220,6 +478,7 @@ class EFetchResult(EutilsResult):
                     tax_id=sample.get("@tax_id", ""),
                     study_id=study_id,
                     custom_meta=custom_meta,
+                    **self._model_kwargs,
                 )
 
                 # append sample to study
@@ -227,8 +486,7 @@ class EFetchResult(EutilsResult):
             sample_ids.append(sample_id)
         return sample_ids
 
-    @staticmethod
-    def _extract_library_info(attributes: dict) -> LibraryMetadata:
+    def _extract_library_info(self, attributes: dict) -> LibraryMetadata:
         """Extracts library-specific information.
 
         Args:
@@ -243,7 +501,7 @@ class EFetchResult(EutilsResult):
         lib = {k: lib_meta.get(f"LIBRARY_{k.upper()}") for k in keys}
         lib["layout"] = list(lib_meta.get("LIBRARY_LAYOUT").keys())[0]
 
-        return LibraryMetadata(**lib)
+        return self.models["library"](**lib)
 
     def _create_experiment(self, attributes: dict, sample_id: str) -> str:
         """Creates an SRAExperiment object.
@@ -264,56 +522,53 @@ class EFetchResult(EutilsResult):
             platform = list(exp_meta["PLATFORM"].keys())[0]
             instrument = exp_meta["PLATFORM"][platform].get("INSTRUMENT_MODEL")
             custom_meta = self._extract_custom_attributes(exp_meta, "experiment")
-            self.experiments[exp_id] = SRAExperiment(
+            self.experiments[exp_id] = self.models["experiment"](
                 id=exp_id,
                 instrument=instrument,
                 platform=platform,
                 sample_id=sample_id,
                 library=self._extract_library_info(attributes),
                 custom_meta=custom_meta,
+                **self._model_kwargs,
             )
             # append experiment to sample
             self.samples[sample_id].experiments.append(self.experiments[exp_id])
         return exp_id
 
-    def _create_single_run(self, attributes: dict, exp_id: str, desired_id: str) -> str:
-        """Creates a single SRARun object.
+    def _create_runs(
+        self, exp_id: str, run_ids: List[str], run_index: dict
+    ) -> List[str]:
+        """Creates SRARun objects for all the requested runs of an experiment.
 
         Information like Run ID, count of bases as well as other custom
         metadata are added here.
 
         Args:
-            attributes (dict): Dictionary with all the metadata from
-                the XML response.
-            exp_id (str): ID of the experiment which the run belongs to.
-            desired_id (str): ID of the desired run.
+            exp_id (str): ID of the experiment which the runs belong to.
+            run_ids (List[str]): IDs of the desired runs.
+            run_index (dict): Mapping of run IDs to their RUN nodes
+                (see `_index_package`).
         Returns:
-            run_id (str): ID of the processed run.
+            run_ids (List[str]): IDs of the processed runs.
         """
-        runset = attributes["RUN_SET"]["RUN"]
-        if not isinstance(runset, list):
-            runset = [runset]
-
-        run = next((x for x in runset if x["@accession"] == desired_id))
-        pool_meta = self._get_pool_meta_from_run(run)
-
-        run_id = run.get("@accession")
-        is_public = True if run.get("@is_public") == "true" else False
-        custom_meta = self._extract_custom_attributes(run, "run")
-
-        if run_id not in self.runs.keys():
-            self.runs[run_id] = SRARun(
+        for run_id in run_ids:
+            if run_id in self.runs.keys():
+                continue
+            run = run_index[run_id]
+            pool_meta = self._get_pool_meta_from_run(run)
+            self.runs[run_id] = self.models["run"](
                 id=run_id,
-                public=is_public,
+                public=run.get("@is_public") == "true",
                 bytes=int(pool_meta.get("size")),
                 bases=int(pool_meta.get("bases")),
                 spots=int(pool_meta.get("spots")),
                 experiment_id=exp_id,
-                custom_meta=custom_meta,
+                custom_meta=self._extract_custom_attributes(run, "run"),
+                **self._model_kwargs,
             )
             # append run to experiment
             self.experiments[exp_id].runs.append(self.runs[run_id])
-        return run_id
+        return list(run_ids)
 
     @staticmethod
     def _get_pool_meta_from_run(run: dict) -> dict:
@@ -332,38 +587,48 @@ class EFetchResult(EutilsResult):
 
         return {"bases": bases, "spots": spots, "size": size}
 
-    def _process_single_id(self, attributes: dict, desired_id: str) -> List[str]:
-        """Processes metadata obtained for a single accession ID.
+    def _process_package(
+        self, attributes: dict, run_ids: List[str]
+    ) -> List[str]:
+        """Processes metadata of all the requested runs of a single package.
+
+        The package is indexed once, so that every run and sample node
+        is found in constant time, and all the requested runs of its
+        experiment are extracted in one pass.
 
         Args:
             attributes (dict): Dictionary with all the metadata
-                from the XML response.
-            desired_id (str): ID of the run/sample for which metadata
-                should be extracted. If None, all the runs from any given
-                run set will be extracted (not implemented).
+                of an Experiment Package from the XML response.
+            run_ids (List[str]): IDs of the runs for which metadata
+                should be extracted.
         Returns:
             run_ids (List[str]): List of all processed run IDs.
         """
+        index = self._index_package(attributes)
+
         # create study, if required
         study_id = self._create_study(attributes)
 
-        # create sample, if required
-        sample_ids = self._create_samples(attributes, study_id)
+        # create samples, if required
+        sample_ids = self._create_samples(
+            attributes, study_id, index["samples"]
+        )
 
-        run_ids = []
+        # create the experiment, if required - it is attached to the first
+        # sample of a pool; all of its runs are attached to the experiment
+        exp_id = None
         for sample_id in sample_ids:
-            # create experiment, if required
             exp_id = self._create_experiment(attributes, sample_id)
 
-            # create run
-            run_id = self._create_single_run(attributes, exp_id, desired_id)
-            run_ids.append(run_id)
-
-        return run_ids
+        return self._create_runs(exp_id, run_ids, index["runs"])
 
     def _custom_attributes_to_dict(self, attributes: List[dict], level: str):
         """Converts attributes list into a dictionary
 
+        Attributes are grouped by their tags in a single pass; only the
+        values of duplicated tags are sorted, to number them consistently.
+        Normalised keys come from the result's shared `TagVocabulary`.
+
         Args:
             attributes (List[dict]): List of attribute dictionaries, e.g.:
                 [{'TAG': 'tag1', 'VALUE': 'value1'},
@@ -376,25 +641,30 @@ class EFetchResult(EutilsResult):
         """
         if isinstance(attributes, dict):
             attributes = [attributes]
-        attributes = [attr for attr in attributes if "VALUE" in attr.keys()]
-        attrs_sorted = sorted(attributes, key=lambda x: (x["TAG"], x["VALUE"]))
-        tags = [x["TAG"] for x in attrs_sorted]
-        values = [x["VALUE"] for x in attrs_sorted]
-
-        # de-duplicate tags
-        tags_dedupl = []
-        for i, tag in enumerate(tags):
-            total, count = tags.count(tag), tags[:i].count(tag)
-            if total > 1:
-                self.logger.debug(
-                    f"One of the metadata keys ({tag}) is duplicated. "
-                    f"It will be retained with a numeric suffix."
-                ) if count == 0 else False
-                tags_dedupl.append(f"{tag}_{count + 1} [{level}]")
-            else:
-                tags_dedupl.append(f"{tag} [{level}]")
-
-        return {t: v for t, v in zip(tags_dedupl, values)}
+        grouped = {}
+        for attr in attributes:
+            if "VALUE" in attr:
+                grouped.setdefault(attr["TAG"], []).append(attr["VALUE"])
+
+        attr_key = self.vocabulary.attribute_key
+        attr_dict = {}
+        for tag, values in grouped.items():
+            if len(values) == 1:
+                attr_dict[attr_key(tag, level)] = values[0]
+                continue
+            self.logger.debug(
+                f"One of the metadata keys ({tag}) is duplicated. "
+                f"It will be retained with a numeric suffix."
+            )
+            values.sort(key=lambda x: "" if x is None else str(x))
+            for i, value in enumerate(values, 1):
+                attr_dict[attr_key(tag, level, i)] = value
+        if self.projection is not None and self.projection.columns:
+            attr_dict = {
+                k: v for k, v in attr_dict.items()
+                if self.projection.keeps_column(self._column_name(k))
+            }
+        return attr_dict
 
     def _extract_custom_attributes(self, attributes: dict, level: str) -> dict:
         """Extracts custom attributes from the metadata dictionary.
@@ -408,6 +678,9 @@ class EFetchResult(EutilsResult):
             processed_meta (dict): All metadata extracted for the given level.
         """
         processed_meta = {}
+        if self.projection is not None and \
+                not self.projection.keeps_attributes(level):
+            return processed_meta
         level = level.upper()
         level_items = attributes.get(f"{level}_ATTRIBUTES")
         if level_items:
@@ -425,14 +698,45 @@ class EFetchResult(EutilsResult):
         return processed_meta
 
     @staticmethod
-    def _find_all_run_ids(parsed_results: list) -> dict:
-        """Finds all run IDs and maps them to Experiment Package positions
+    def _as_list(value) -> list:
+        if value is None:
+            return []
+        return value if isinstance(value, list) else [value]
+
+    @classmethod
+    def _iter_run_nodes(cls, package: dict):
+        """Iterates over all the RUN nodes of an Experiment Package.
 
-        This looks very nested as we need to go through every level of a
-        run_set, which can have many runs, which in turn can be a list of run
-        entries. So, for an EXPERIMENT_PACKAGE we can have:
+        Both levels can either be a single entry or a list of entries:
             EXPERIMENT_PACKAGE -> RUN_SET [list or dict] ->
                 RUN (list or dict)
+        """
+        for runset in cls._as_list(package.get("RUN_SET")):
+            for run in cls._as_list(runset.get("RUN")):
+                yield run
+
+    @classmethod
+    def _index_package(cls, package: dict) -> dict:
+        """Indexes the run and sample nodes of an Experiment Package.
+
+        Returns:
+            dict: Mappings of run IDs to their RUN nodes ('runs') and of
+                sample IDs to their SAMPLE nodes ('samples').
+        """
+        return {
+            "runs": {
+                run.get("@accession"): run
+                for run in cls._iter_run_nodes(package)
+            },
+            "samples": {
+                sample.get("@accession"): sample
+                for sample in cls._as_list(package.get("SAMPLE"))
+            },
+        }
+
+    @classmethod
+    def _find_all_run_ids(cls, parsed_results: list) -> dict:
+        """Finds all run IDs and maps them to Experiment Package positions
 
         This will provide a map in a form of:
             {run_id: position in experiment package}
@@ -446,29 +750,11 @@ class EFetchResult(EutilsResult):
             new_map (dict): Mapping between run IDs and their positions in
                 the Experiment Package.
         """
-        run_id_map = {}
-        for i, res in enumerate(parsed_results):
-            runset = res.get("RUN_SET")
-            runset = [runset] if not isinstance(runset, list) else runset
-
-            run_id_map[i] = []
-            for run in runset:
-                run = [run] if not isinstance(run, list) else run
-                run_ids = []
-                for r in run:
-                    r = [r] if not isinstance(r, list) else r
-                    for _r in r:
-                        _r = _r.get("RUN")
-                        _r = [_r] if not isinstance(_r, list) else _r
-                        run_ids.extend([__r.get("@accession") for __r in _r])
-                run_id_map[i].extend(run_ids)
-
-        new_map = {}
-        for k, v in run_id_map.items():
-            for _v in v:
-                new_map[_v] = k
-
-        return new_map
+        return {
+            run.get("@accession"): i
+            for i, res in enumerate(parsed_results)
+            for run in cls._iter_run_nodes(res)
+        }
 
     def add_metadata(self, response, uids: List[str]):
         """Processes response received from Efetch into metadata dictionary.
@@ -479,41 +765,105 @@ class EFetchResult(EutilsResult):
         Args:
             response (io.StringIO): Response received from Efetch.
             uids (List[str]): List of accession IDs for which
-                the data was fetched.
+                the data was fetched. If empty (e.g., when the records
+                were fetched from the history server), all the runs found
+                in the response are processed.
 
         """
+        # custom attributes of the skipped levels are dropped while parsing
+        postprocessor = None
+        if self.projection is not None:
+            postprocessor = self.projection.postprocessor
         # use json to quickly get rid of OrderedDicts
-        self.metadata_raw = json.loads(json.dumps(parsexml(response.read())))
+        self.metadata_raw = json.loads(json.dumps(
+            parsexml(response.read(), postprocessor=postprocessor)
+        ))
         parsed_results = self.metadata_raw["EXPERIMENT_PACKAGE_SET"][
             "EXPERIMENT_PACKAGE"
         ]
 
-        # TODO: we should also handle extracting multiple runs
-        #  from the same experiment
         if not isinstance(parsed_results, list):
             parsed_results = [parsed_results]
         run_ids_map = self._find_all_run_ids(parsed_results)
+        if not uids:
+            uids = list(run_ids_map.keys())
+
+        # group the requested runs by their packages, so that every package
+        # is processed only once, no matter how many of its runs we need
+        package_runs = {}
+        for uid in uids:
+            position = run_ids_map.get(uid)
+            if position is not None:
+                package_runs.setdefault(position, []).append(uid)
+        for position, run_ids in package_runs.items():
+            self.metadata += self._process_package(
+                parsed_results[position], run_ids
+            )
 
-        found_uids = set(run_ids_map.keys())
-        for i, uid in enumerate(uids):
-            if uid in found_uids:
-                current_run = run_ids_map[uid]
-                self.metadata += self._process_single_id(
-                    parsed_results[current_run], desired_id=uid
-                )
+
+def parse_metadata_response(
+    response: str, uids: List[str], compact: bool,
+    projection: Union[MetadataProjection, None] = None,
+):
+    """Parses an EFetch metadata response into plain records.
+
+    Meant to be run in a worker process (see `EFetchAnalyzer`).
+
+    Args:
+        response (str): XML response received from EFetch.
+        uids (List[str]): List of the requested run IDs.
+        compact (bool): Whether to use the compact SRA models.
+        projection (MetadataProjection): Subset of the metadata to extract.
+
+    Returns:
+        dict: Records as generated by `EFetchResult.to_records`.
+    """
+    result = EFetchResult.empty("ERROR", compact, projection)
+    result.add_metadata(io.StringIO(response), uids)
+    return result.to_records()
+
+
+def _parse_metadata_timed(*args) -> tuple:
+    # the metrics of the worker processes are not shared with the main
+    # one - return the parsing time together with the records
+    start = time.perf_counter()
+    records = parse_metadata_response(*args)
+    return records, time.perf_counter() - start
 
 
 class EFetchAnalyzer(EfetchAnalyzer):
-    def __init__(self, log_level):
+    """Analyzer of the EFetch responses.
+
+    With a `process_pool`, metadata responses are not parsed on the request
+    threads: the response text is handed over to the pool, which returns
+    plain records to be merged into the result in this process (see
+    `merge_parsed`). A `projection` restricts the metadata extracted from
+    the responses (see `MetadataProjection`).
+    """
+
+    def __init__(self, log_level, compact=False, process_pool=None,
+                 projection=None):
         super().__init__()
         self.log_level = log_level
+        self.compact = compact
+        self.process_pool = process_pool
+        self.projection = projection
+        self._pending = []
         self.response_type = None
         self.error_msg = None
+        # size of the raw responses received by every query (by its ID)
+        self.response_bytes = {}
+        self._lock = threading.Lock()
 
     def init_result(self, response, request):
         self.response_type = request.rettype
-        if not self.result:
-            self.result = EFetchResult(response, request, self.log_level)
+        # several queries may share the analyzer (see `fetch_run_metadata`)
+        with self._lock:
+            if not self.result:
+                self.result = EFetchResult(
+                    response, request, self.log_level, self.compact,
+                    self.projection
+                )
 
     def analyze_error(self, response, request):
         super().analyze_error(response, request)
@@ -524,14 +874,69 @@ class EFetchAnalyzer(EfetchAnalyzer):
         if self.response_type == "docsum":
             # we asked for IDs
             self.result.extract_run_ids(response)
+        elif self.process_pool is not None:
+            # we asked for metadata - parse it in a worker process
+            future = self.process_pool.submit(
+                _parse_metadata_timed, response.getvalue(),
+                list(request.uids), self.compact, self.projection
+            )
+            with self._lock:
+                self._pending.append((request.query_id, future))
         else:
             # we asked for metadata
+            start = time.perf_counter()
             self.result.add_metadata(response, request.uids)
+            METRICS.observe("mishmash_parse_seconds",
+                            time.perf_counter() - start, stage="efetch")
+
+    def merge_parsed(self, block: bool = True):
+        """Merges the records parsed by the process pool into the result.
+
+        Args:
+            block (bool): Whether to wait for all the pending responses to
+                be parsed; otherwise, only the already parsed ones are merged.
+        """
+        with self._lock:
+            if block:
+                pending, self._pending = self._pending, []
+            else:
+                pending = [x for x in self._pending if x[1].done()]
+                self._pending = [x for x in self._pending if not x[1].done()]
+        for _, future in pending:
+            self.merge_future(future)
+
+    def pop_pending(self, query_id: str) -> list:
+        """Takes over the responses of a query still parsed by the pool.
+
+        They are no longer merged by `merge_parsed` - the caller merges
+        them (see `merge_future`) or drops them, e.g. to retry the query.
+
+        Returns:
+            list: Futures of the records parsed from the responses.
+        """
+        with self._lock:
+            popped = [x for q, x in self._pending if q == query_id]
+            self._pending = [x for x in self._pending if x[0] != query_id]
+        return popped
+
+    def merge_future(self, future):
+        """Merges the records parsed by the process pool into the result.
+
+        Raises:
+            Any of PARSE_ERRORS: When the response could not be parsed.
+        """
+        records, seconds = future.result()
+        METRICS.observe("mishmash_parse_seconds", seconds, stage="efetch")
+        with self._lock:
+            self.result.merge_records(records)
 
     # override the base method to enable continuation even if
     # self.result is None
     def parse(self, raw_response, request):
-        response = self.convert_response(raw_response.read().decode("utf-8"), request)
+        raw = raw_response.read()
+        self.response_bytes[request.query_id] = \
+            self.response_bytes.get(request.query_id, 0) + len(raw)
+        response = self.convert_response(raw.decode("utf-8"), request)
         if self.isErrorResponse(response, request):
             self.hasErrorResponse = True
             self.analyze_error(response, request)
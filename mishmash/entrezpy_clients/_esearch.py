@@ -22,6 +22,14 @@ class ESearchResult(EsearchResult):
         super().__init__(response, request)
         self.result = None
 
+    # override the base method to also accept the responses of searches
+    # which did not store their results on the history server
+    def add_response(self, response):
+        if response.get("webenv"):
+            super().add_response(response)
+        else:
+            self.uids += response.pop("idlist", [])
+
     def validate_result(self) -> dict:
         """Validates hit counts obtained for all the provided UIDs.
 
@@ -69,7 +77,7 @@ class ESearchResult(EsearchResult):
         """
         translation_stack = response["esearchresult"].get("translationstack")
         if not translation_stack:
-            self.result = pd.Series({x: 0 for x in uids}, name="count")
+            self.result = pd.Series({x: 0 for x in uids or []}, name="count")
             return
 
         # filter out only positive hits
@@ -99,7 +107,11 @@ class ESearchAnalyzer(EsearchAnalyzer):
             return True
         return False
 
-    # override the base method to additionally parse the result
+    # override the base method to additionally parse the result; the
+    # translation stack is the same in every page of the results (and the
+    # base method removes the 'esearchresult' from all but the first one)
     def analyze_result(self, response, request):
+        first_page = self.result is None
         super().analyze_result(response, request)
-        self.result.parse_search_results(response, self.uids)
+        if first_page:
+            self.result.parse_search_results(response, self.uids)
@@ -5,21 +5,446 @@
 #
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
-from typing import Union
-
-from entrezpy import conduit as ec
+import logging
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+from functools import partial
+from typing import List, Tuple, Union
 
 from entrezpy.elink.elink_analyzer import ElinkAnalyzer
 
-from ._efetch import EFetchAnalyzer
+from ._batching import AdaptiveBatchSizer
+from ._client import EUtilsError, EUtilsQuery, get_client
+from ._efetch import PARSE_ERRORS, EFetchAnalyzer
 from ._esearch import ESearchAnalyzer
-from ._utils import set_up_entrezpy_logging
+from ._runinfo import RunInfoAnalyzer, RunInfoResult
+from ._utils import (
+    _chunker,
+    classify_accessions,
+    get_executor,
+    set_up_logger,
+)
+
+BATCH_SIZE = 500
+# number of accession IDs OR-ed together in a single ESearch term
+ESEARCH_BATCH_SIZE = 200
+# number of times a batch of runs is tried before its metadata is given up
+EFETCH_MAX_ATTEMPTS = 3
 
-import entrezpy.esearch.esearcher as searcher
+# all the queries are run by the process-wide E-utilities client, which
+# shares its connection pool (and rate limiter) between them
 
-from ._utils import _chunker
 
-BATCH_SIZE = 500
+def _new_esearcher(email: str) -> EUtilsQuery:
+    return get_client(email).query("esearch")
+
+
+def _new_elinker(email: str, log_level: str) -> EUtilsQuery:
+    return get_client(email, log_level).query("elink")
+
+
+def _new_efetcher(email: str, log_level: str) -> EUtilsQuery:
+    return get_client(email, log_level).query("efetch")
+
+
+def _parse_error(error: Exception) -> EUtilsError:
+    return EUtilsError(
+        f"invalid response ({type(error).__name__}: {error})"
+    )
+
+
+def _run_query(query, parameters: dict, analyzer):
+    """Runs a single E-utilities query, turning its failures into exceptions.
+
+    Raises:
+        RuntimeError: When the query did not complete successfully.
+    """
+    try:
+        response = query.inquire(parameters, analyzer=analyzer)
+    except SystemExit as e:
+        # entrezpy analyzers exit on some of the responses they cannot handle
+        raise RuntimeError(f"request was aborted ({e})") from None
+    if response is None:
+        raise RuntimeError("request failed")
+    return response
+
+
+def _esearch_chunk(
+    esearcher: EUtilsQuery,
+    db: str,
+    ids: Union[list, None],
+    query: Union[str, None],
+) -> list:
+    """Runs a single ESearch for a chunk of IDs (or a query).
+
+    Returns:
+        list: UIDs found for the provided IDs.
+    Raises:
+        RuntimeError: When ESearch did not complete successfully.
+    """
+    term = " OR ".join(ids) if ids else query
+    esearch_response = _run_query(
+        esearcher,
+        {"db": db, "term": term, "usehistory": False, "rettype": "json"},
+        ESearchAnalyzer(ids),
+    )
+    return esearch_response.result.uids
+
+
+def _search_history(
+    esearcher: EUtilsQuery,
+    db: str,
+    term: str,
+    webenv: Union[str, None] = None,
+) -> Union[dict, None]:
+    """Runs ESearch storing the records found on the history server.
+
+    Args:
+        esearcher (EUtilsQuery): ESearch query to run.
+        db (str): Database to be searched.
+        term (str): Search term.
+        webenv (str): WebEnv to store the results in (a new one is
+            created if not provided).
+
+    Returns:
+        dict: WebEnv, query_key and count of the records found or None,
+            if no records were found.
+    Raises:
+        RuntimeError: When ESearch did not complete successfully.
+    """
+    params = {"db": db, "term": term, "usehistory": True, "retmax": 0}
+    if webenv:
+        params["WebEnv"] = webenv
+    result = _run_query(esearcher, params, ESearchAnalyzer(None)).result
+    if not result.count:
+        return None
+    link_params = result.get_link_parameter()
+    return {
+        "WebEnv": link_params["WebEnv"],
+        "query_key": link_params["query_key"],
+        "count": result.count,
+    }
+
+
+def _search_history_chunks(
+    esearcher: EUtilsQuery,
+    db: str,
+    ids: list,
+) -> Union[dict, None]:
+    """Stores the records of many IDs on the history server.
+
+    The IDs are searched for in chunks of ESEARCH_BATCH_SIZE (keeping the
+    search terms short), all of them into the same WebEnv. The query keys
+    of the chunks are then combined into a single one by ESearch.
+
+    Returns:
+        dict: WebEnv, query_key and count of the records found or None,
+            if no records were found.
+    Raises:
+        RuntimeError: When ESearch did not complete successfully.
+    """
+    webenv, histories = None, []
+    for chunk in _chunker(ids, ESEARCH_BATCH_SIZE):
+        history = _search_history(
+            esearcher, db, " OR ".join(chunk), webenv=webenv
+        )
+        if history:
+            webenv = history["WebEnv"]
+            histories.append(history)
+    if len(histories) < 2:
+        return histories[0] if histories else None
+    term = " OR ".join(f"#{x['query_key']}" for x in histories)
+    return _search_history(esearcher, db, term, webenv=webenv)
+
+
+def _link_history(
+    elinker: EUtilsQuery,
+    esearcher: EUtilsQuery,
+    db: str,
+    history: dict,
+) -> Union[dict, None]:
+    """Links records stored on the history server to SRA.
+
+    Linked records are stored on the history server as well; ELink may
+    spread them over several query keys, so they are combined into a single
+    one by ESearch (which also provides their count).
+
+    Returns:
+        dict: WebEnv, query_key and count of the linked SRA records or None,
+            if nothing could be linked.
+    Raises:
+        RuntimeError: When ELink or ESearch did not complete successfully.
+    """
+    link_response = _run_query(
+        elinker,
+        {"db": "sra", "dbfrom": db, "cmd": "neighbor_history",
+         "WebEnv": history["WebEnv"], "query_key": history["query_key"],
+         "link": False},
+        ElinkAnalyzer(),
+    )
+    params = link_response.result.get_link_parameter()
+    if not params:
+        return None
+    term = params.get("term") or f"#{params['query_key']}"
+    return _search_history(esearcher, "sra", term, params["WebEnv"])
+
+
+def _run_batches(
+    func, batches: list, queries: list, n_jobs: int, logger, stage: str
+) -> Tuple[list, List[Tuple[list, str]]]:
+    """Runs `func(*query, batch)` for all batches using the shared pool.
+
+    A failing batch does not affect any of the other batches - its IDs
+    are reported together with the error.
+
+    Returns:
+        Tuple[list, List[Tuple[list, str]]]: De-duplicated results of all
+            the successful batches and a list of failed batches together
+            with the respective error messages.
+    """
+    executor = get_executor(n_jobs)
+    futures = [
+        executor.submit(func, *query, batch)
+        for query, batch in zip(queries, batches)
+    ]
+
+    results, failed = {}, []
+    for batch, future in zip(batches, futures):
+        try:
+            results.update(dict.fromkeys(future.result()))
+        except Exception as e:
+            failed.append((batch, str(e)))
+            logger.error(
+                f"{stage} failed ({e}) for the following IDs: "
+                f"{', '.join(batch)}."
+            )
+    return list(results), failed
+
+
+def _search_uids(
+    email: str,
+    db: str,
+    ids: Union[list, None],
+    query: Union[str, None],
+    n_jobs: int = 1,
+    log_level: str = "ERROR",
+) -> Tuple[list, List[Tuple[list, str]]]:
+    """Finds UIDs of the provided IDs or of records matching the query.
+
+    IDs are searched for in chunks of ESEARCH_BATCH_SIZE, up to `n_jobs`
+    of them at the same time (the request rate is limited globally).
+    A failing chunk does not affect any of the other chunks.
+
+    Args:
+        email (str): User email.
+        db (str): Database to be searched.
+        ids (list): List of IDs to search for.
+        query (str): Search query to find UIDs by (used if no `ids`).
+        n_jobs (int): Number of chunks to be searched concurrently.
+        log_level (str): The log level to set.
+
+    Returns:
+        Tuple[list, List[Tuple[list, str]]]: De-duplicated UIDs from all
+            the successful chunks and a list of failed chunks together
+            with the respective error messages.
+    """
+    logger = set_up_logger(log_level, logger_name=__name__)
+    chunks = list(_chunker(ids, ESEARCH_BATCH_SIZE)) if ids else [[query]]
+
+    def search(esearcher, chunk):
+        return _esearch_chunk(
+            esearcher, db, None if not ids else chunk, query
+        )
+
+    queries = [(_new_esearcher(email),) for _ in chunks]
+    return _run_batches(
+        search, chunks, queries, n_jobs, logger,
+        f"ESearch in the {db} database"
+    )
+
+
+def _link_and_fetch_run_ids(
+    elinker: Union[EUtilsQuery, None],
+    efetcher: EUtilsQuery,
+    db: str,
+    log_level: str,
+    uids: list,
+    runinfo: Union[RunInfoAnalyzer, None] = None,
+) -> list:
+    """Finds run IDs of a single batch of UIDs.
+
+    UIDs from databases other than SRA are first linked to SRA; then,
+    document summaries (or RunInfo tables, if `runinfo` is provided) of the
+    SRA records are fetched and run IDs are extracted from those.
+
+    Returns:
+        list: Run IDs associated with the UIDs.
+    """
+    if elinker:
+        link_response = _run_query(
+            elinker,
+            {"db": "sra", "dbfrom": db, "id": uids, "link": False},
+            ElinkAnalyzer(),
+        )
+        params = link_response.result.get_link_parameter()
+        if not params:
+            # nothing could be linked to SRA
+            return []
+    else:
+        params = {"id": uids, "db": db}
+
+    # fetch as many records as there are SRA UIDs,
+    # which may be many more than the UIDs we started from
+    params.update({"reqsize": BATCH_SIZE, "retmax": len(params["id"])})
+    if runinfo is not None:
+        # the RunInfo rows are collected by the (shared) analyzer
+        params.update({"rettype": "runinfo", "retmode": "text"})
+        _run_query(efetcher, params, runinfo)
+        return runinfo.result.query_runs.get(efetcher.id, [])
+
+    params.update({"rettype": "docsum", "retmode": "xml"})
+    fetch_response = _run_query(efetcher, params, EFetchAnalyzer(log_level))
+    return fetch_response.result.metadata
+
+
+def _get_source_db(source: str) -> Tuple[str, bool]:
+    """Finds the database to search for the IDs of the given type in.
+
+    Returns:
+        Tuple[str, bool]: Name of the database and whether its records
+            need to be linked to SRA.
+    """
+    if source in ("bioproject", "biosample"):
+        return source, True
+    return "sra", False
+
+
+def _report_not_found(
+    ids: Union[list, None], query: Union[str, None], logger: logging.Logger
+):
+    logger.warning(
+        f"None of the following accession IDs could be found! Please "
+        f"double-check your input and try again: {ids if ids else query}"
+    )
+
+
+def get_sra_history(
+    email: str,
+    ids: Union[list, None],
+    query: Union[str, None],
+    source: str,
+    log_level: str = "ERROR",
+) -> Union[dict, None]:
+    """Stores SRA records matching the IDs or the query on the history server.
+
+    Contrary to `_get_run_ids`, none of the UIDs are transferred to the
+    client: the records are searched for with `usehistory=y` and (if
+    required) linked to SRA by their WebEnv and query_key. The IDs are
+    searched for in chunks, all stored in the same WebEnv and combined
+    into a single query_key (see `_search_history_chunks`).
+
+    Args:
+        email (str): User email.
+        ids (list): List of study, bioproject, sample or experiment IDs.
+        query (str): Search query to find IDs by (used if no `ids`).
+        source (str): Type of IDs provided ('bioproject', 'biosample' or
+                      anything else for IDs to be searched for in SRA).
+        log_level (str): The log level to set.
+
+    Returns:
+        dict: WebEnv, query_key and count of the SRA records or None,
+            if no records were found.
+    Raises:
+        RuntimeError: When any of the requests did not complete successfully.
+    """
+    db, elink = _get_source_db(source)
+    if ids:
+        history = _search_history_chunks(_new_esearcher(email), db, ids)
+    else:
+        history = _search_history(_new_esearcher(email), db, query)
+    if history and elink:
+        history = _link_history(
+            _new_elinker(email, log_level), _new_esearcher(email), db, history
+        )
+    return history
+
+
+def fetch_history(
+    email: str,
+    history: dict,
+    rettype: str,
+    analyzer,
+    log_level: str = "ERROR",
+    reqsize: int = BATCH_SIZE,
+):
+    """Fetches SRA records stored on the history server.
+
+    The records are fetched by their WebEnv and query_key in pages of
+    `reqsize` records, `retstart` being advanced from one page to the next.
+
+    Args:
+        email (str): User email.
+        history (dict): WebEnv, query_key and count of the records,
+            as returned by `get_sra_history`.
+        rettype (str): Type of the records to fetch ('docsum', 'runinfo'
+            or 'xml').
+        analyzer (EFetchAnalyzer): Analyzer to process the records with
+            (a RunInfoAnalyzer for 'runinfo').
+        log_level (str): The log level to set.
+        reqsize (int): Number of records to fetch per request.
+
+    Returns:
+        EFetchResult: Result of the analyzer (RunInfoResult for 'runinfo').
+    Raises:
+        RuntimeError: When any of the pages could not be fetched (or
+            parsed).
+    """
+    params = {
+        "db": "sra",
+        "WebEnv": history["WebEnv"],
+        "query_key": history["query_key"],
+        "rettype": rettype,
+        "retmode": "text" if rettype == "runinfo" else "xml",
+        "retmax": history["count"],
+        "reqsize": reqsize,
+    }
+    try:
+        _run_query(_new_efetcher(email, log_level), params, analyzer)
+        if isinstance(analyzer, EFetchAnalyzer):
+            analyzer.merge_parsed()
+    except PARSE_ERRORS as e:
+        raise _parse_error(e) from e
+    return analyzer.result
+
+
+def _get_history_run_ids(
+    email: str,
+    ids: Union[list, None],
+    query: Union[str, None],
+    source: str,
+    log_level: str = "ERROR",
+    runinfo: Union[RunInfoAnalyzer, None] = None,
+) -> list:
+    """Finds run IDs of the SRA records stored on the history server.
+
+    Returns:
+        list: Run IDs associated with provided ids.
+    Raises:
+        RuntimeError: When any of the requests did not complete successfully.
+    """
+    history = get_sra_history(email, ids, query, source, log_level)
+    if not history:
+        return []
+    if runinfo is not None:
+        result = fetch_history(
+            email, history, "runinfo", RunInfoAnalyzer(log_level), log_level
+        )
+        runinfo.result.merge(result)
+        return result.run_ids
+    return fetch_history(
+        email, history, "docsum", EFetchAnalyzer(log_level), log_level
+    ).metadata
 
 
 def _get_run_ids(
@@ -29,6 +454,8 @@ def _get_run_ids(
     source: str,
     n_jobs: int = 1,
     log_level: str = "ERROR",
+    use_history: bool = False,
+    runinfo: Union[RunInfoAnalyzer, None] = None,
 ) -> list:
     """Pipeline to retrieve run IDs associated with BioSample query
     (provided in `query`) or other aggregate IDs like studies
@@ -44,21 +471,34 @@ def _get_run_ids(
         source (str): Type of IDs provided ('study', 'bioproject',
                       'sample' or 'experiment').
         log_level (str): The log level to set.
+        use_history (bool): Whether to keep the UIDs on the history server
+            (see `get_sra_history`). Falls back to searching for the UIDs
+            client-side if that fails.
+        runinfo (RunInfoAnalyzer): If provided, runs are found using the
+            SRA RunInfo tables, whose rows (and failed batches) are
+            collected by this analyzer.
 
     Returns:
         list: Run IDs associated with provided ids.
     """
-    term = " OR ".join(ids) if ids else query
+    logger = set_up_logger(log_level, logger_name=__name__)
+    if use_history:
+        try:
+            run_ids = _get_history_run_ids(
+                email, ids, query, source, log_level, runinfo
+            )
+        except RuntimeError as e:
+            logger.warning(
+                f"Fetching run IDs using the history server failed ({e}); "
+                f"falling back to fetching them by their UIDs."
+            )
+        else:
+            if not run_ids:
+                _report_not_found(ids, query, logger)
+            return sorted(set(run_ids))
 
     # create pipeline to fetch all run IDs
-    elink = True
-    if source == "bioproject":
-        db = "bioproject"
-    elif source == "biosample":
-        db = "biosample"
-    else:
-        db = "sra"
-        elink = False
+    db, elink = _get_source_db(source)
 
     # find UIDS based on a query;
     # instead of saving the result on the history server
@@ -68,63 +508,330 @@ def _get_run_ids(
     # who knows how many IDs and erroring out if we provide too
     # many (which could be the case e.g.: when we ask for more
     # than 10000 BioProject IDs or the text query returns more
-    # than 10000 IDs presumably)
-    esearcher = searcher.Esearcher(
-        "esearcher", email, apikey=None, apikey_var=None, threads=n_jobs, qid=None
-    )
-    esearch_response = esearcher.inquire(
-        {"db": db, "term": term, "usehistory": False, "rettype": "json"},
-        analyzer=ESearchAnalyzer(ids),
-    )
+    # than 10000 IDs presumably); the IDs are searched for in
+    # smaller chunks to keep the search terms short
+    uids, failed = _search_uids(email, db, ids, query, n_jobs, log_level)
+    if runinfo is not None:
+        runinfo.result.add_failed(failed)
+    if not uids:
+        _report_not_found(ids, query, logger)
+        return []
 
     # use the UIDs to link to other DBs and fetch related records;
-    # we won't be using multi-threading here as this shouldn't take
-    # long (we're only fetching IDs) and we don't want those dead
-    # threads afterwards
-    econduit = ec.Conduit(email=email, threads=0)
-    set_up_entrezpy_logging(econduit, log_level)
-    run_ids_pipeline = econduit.new_pipeline()
-
-    # create a pipeline to link and fetch the run IDs;
     # we process the IDs obtained from the previous step in batches
     # as ELink cannot handle more than a certain amount of IDs
-    # at the same time (recommended by NCBI)
-    for _ids in _chunker(esearch_response.result.uids, BATCH_SIZE):
-        if elink:
-            el = run_ids_pipeline.add_link(
-                {"db": "sra", "dbfrom": db, "id": _ids, "link": False},
-                analyzer=ElinkAnalyzer(),
+    # at the same time (recommended by NCBI); every batch is linked and
+    # fetched independently, so that the batches can run concurrently
+    # on the shared worker pool
+    batches = list(_chunker(uids, BATCH_SIZE))
+    queries = [
+        (_new_elinker(email, log_level) if elink else None,
+         _new_efetcher(email, log_level), db, log_level)
+        for _ in batches
+    ]
+    link_and_fetch = _link_and_fetch_run_ids
+    if runinfo is not None:
+        link_and_fetch = partial(_link_and_fetch_run_ids, runinfo=runinfo)
+    all_run_ids, failed = _run_batches(
+        link_and_fetch, batches, queries, n_jobs, logger, "Fetching run IDs"
+    )
+    if runinfo is not None:
+        runinfo.result.add_failed(failed)
+
+    return sorted(all_run_ids)
+
+
+def _fetch_runinfo(
+    email: str,
+    run_ids: list,
+    runinfo: RunInfoAnalyzer,
+    n_jobs: int = 1,
+    log_level: str = "ERROR",
+):
+    """Fetches RunInfo rows of runs which need no further resolution."""
+    logger = set_up_logger(log_level, logger_name=__name__)
+    batches = list(_chunker(run_ids, BATCH_SIZE))
+    queries = [
+        (None, _new_efetcher(email, log_level), "sra", log_level)
+        for _ in batches
+    ]
+    _, failed = _run_batches(
+        partial(_link_and_fetch_run_ids, runinfo=runinfo), batches, queries,
+        n_jobs, logger, "Fetching RunInfo"
+    )
+    runinfo.result.add_failed(failed)
+
+
+def get_run_ids_by_type(
+    email: str,
+    ids: list,
+    n_jobs: int = 1,
+    log_level: str = "ERROR",
+    use_history: bool = False,
+    runinfo: Union[RunInfoAnalyzer, None] = None,
+) -> list:
+    """Resolves a mixed list of accession IDs into run IDs.
+
+    IDs are classified by their prefix and every group is resolved in the
+    cheapest way possible:
+        - run IDs need no resolution and are used as they are,
+        - BioProject and BioSample IDs are searched for in their own
+          databases and linked to SRA,
+        - all the other IDs (studies, experiments, samples and any
+          unrecognized IDs) are searched for directly in SRA.
+
+    Args:
+        email (str): User email.
+        ids (list): List of accession IDs of any (supported) type.
+        n_jobs (int): Number of jobs.
+        log_level (str): The log level to set.
+        use_history (bool): Whether to use the history server to
+            resolve the IDs (see `_get_run_ids`).
+        runinfo (RunInfoAnalyzer): If provided, runs are found using the
+            SRA RunInfo tables, whose rows (also those of the run IDs
+            provided directly) are collected by this analyzer.
+
+    Returns:
+        list: Run IDs associated with provided ids.
+    """
+    groups = classify_accessions(ids)
+
+    run_ids = set(groups.pop("run", []))
+    if run_ids and runinfo is not None:
+        _fetch_runinfo(email, sorted(run_ids), runinfo, n_jobs, log_level)
+    for source in ("bioproject", "biosample"):
+        source_ids = groups.pop(source, [])
+        if source_ids:
+            run_ids.update(
+                _get_run_ids(
+                    email, source_ids, None, source, n_jobs, log_level,
+                    use_history, runinfo
+                )
+            )
+
+    sra_ids = [_id for group in groups.values() for _id in group]
+    if sra_ids:
+        run_ids.update(
+            _get_run_ids(
+                email, sra_ids, None, "", n_jobs, log_level, use_history,
+                runinfo
             )
-        else:
-            el = None
-
-        # given SRA run IDs, fetch all metadata
-        efetch_params = {
-            "rettype": "docsum",
-            "retmode": "xml",
-            "reqsize": BATCH_SIZE,
-            "retmax": len(_ids),
-        }
-        if not elink:
-            # we need to specify these manually as in this scenario
-            # EFetch is not linked to anything
-            efetch_params.update({"id": _ids, "db": db})
-
-        run_ids_pipeline.add_fetch(
-            efetch_params, analyzer=EFetchAnalyzer(log_level), dependency=el
         )
+
+    return sorted(run_ids)
+
+
+def get_run_ids_by_query(
+    email: str,
+    query: str,
+    source: str = "biosample",
+    n_jobs: int = 1,
+    log_level: str = "ERROR",
+    use_history: bool = False,
+    runinfo: Union[RunInfoAnalyzer, None] = None,
+) -> list:
+    """Finds run IDs of the records matching a search query.
+
+    Args:
+        email (str): User email.
+        query (str): Search query, e.g.: a BioSample query.
+        source (str): Database to run the query in ('bioproject',
+                      'biosample' or 'sra').
+        n_jobs (int): Number of jobs.
+        log_level (str): The log level to set.
+        use_history (bool): Whether to keep the UIDs on the history server
+            (see `_get_run_ids`).
+        runinfo (RunInfoAnalyzer): If provided, runs are found using the
+            SRA RunInfo tables, whose rows are collected by this analyzer.
+
+    Returns:
+        list: Run IDs associated with the records matching the query.
+    """
+    return _get_run_ids(
+        email, None, query, source, n_jobs, log_level, use_history, runinfo
+    )
+
+
+def get_runinfo_by_type(
+    email: str,
+    ids: list,
+    n_jobs: int = 1,
+    log_level: str = "ERROR",
+    use_history: bool = False,
+) -> RunInfoResult:
+    """Finds runs of a mixed list of accession IDs using SRA RunInfo.
+
+    A lightweight alternative to fetching the full metadata: the RunInfo
+    table lists the runs together with their basic statistics (spots,
+    bases, size). See `get_run_ids_by_type` for the arguments.
+
+    Returns:
+        RunInfoResult: RunInfo of all the runs found; batches of IDs which
+            could not be resolved are listed in its `failed` attribute.
+    """
+    runinfo = RunInfoAnalyzer(log_level)
+    get_run_ids_by_type(email, ids, n_jobs, log_level, use_history, runinfo)
+    return runinfo.result
+
+
+def get_runinfo_by_query(
+    email: str,
+    query: str,
+    source: str = "biosample",
+    n_jobs: int = 1,
+    log_level: str = "ERROR",
+    use_history: bool = False,
+) -> RunInfoResult:
+    """Finds runs of the records matching a search query using SRA RunInfo.
+
+    See `get_run_ids_by_query` for the arguments.
+
+    Returns:
+        RunInfoResult: RunInfo of all the runs found.
+    """
+    runinfo = RunInfoAnalyzer(log_level)
+    get_run_ids_by_query(
+        email, query, source, n_jobs, log_level, use_history, runinfo
+    )
+    return runinfo.result
+
+
+def _fetch_metadata_batch(
+    efetcher: EUtilsQuery, analyzer: EFetchAnalyzer, run_ids: list
+) -> Tuple[int, float, list]:
+    """Fetches metadata of a single batch of runs into the analyzer.
+
+    Returns:
+        Tuple[int, float, list]: Size of the response (in bytes), the time
+            it took to fetch and process it (in seconds) and the futures
+            of its records, if the analyzer parses the responses in a
+            process pool (see `EFetchAnalyzer.merge_future`).
+    Raises:
+        RuntimeError: When the batch could not be fetched or its response
+            could not be parsed (EUtilsError).
+    """
+    start = time.perf_counter()
     try:
-        econduit.run(run_ids_pipeline)
-    except UnboundLocalError:
-        print("One or more of the following accession IDs is invalid! Please "
-              "double-check your input and try again.")
-        print(ids)
-        exit(1)
-
-    # recover run IDs from all instances of EFetchAnalyzer
-    all_run_ids = []
-    for x in econduit.analyzers.values():
-        if isinstance(x, EFetchAnalyzer):
-            all_run_ids.extend(x.result.metadata)
+        _run_query(
+            efetcher,
+            {"db": "sra", "id": run_ids, "rettype": "xml", "retmode": "xml",
+             "retmax": len(run_ids), "reqsize": len(run_ids)},
+            analyzer,
+        )
+    except (RuntimeError, *PARSE_ERRORS) as e:
+        # nothing of a failed batch is merged - it is fetched again
+        for future in analyzer.pop_pending(efetcher.id):
+            future.cancel()
+        if isinstance(e, PARSE_ERRORS):
+            raise _parse_error(e) from e
+        raise
+    elapsed = time.perf_counter() - start
+    return (analyzer.response_bytes.get(efetcher.id, 0), elapsed,
+            analyzer.pop_pending(efetcher.id))
 
-    return sorted(all_run_ids)
+
+def fetch_run_metadata(
+    email: str,
+    run_ids: list,
+    analyzer: EFetchAnalyzer,
+    n_jobs: int = 1,
+    log_level: str = "ERROR",
+    sizer: AdaptiveBatchSizer = None,
+) -> Tuple[object, List[Tuple[list, str]]]:
+    """Fetches metadata of the runs in adaptively sized batches.
+
+    Up to `n_jobs` batches are fetched at the same time. The size of every
+    next batch is chosen by the `sizer`, based on the size and latency of
+    the responses received so far. A failed batch is split according to
+    the (reduced) size and retried, up to EFETCH_MAX_ATTEMPTS times.
+    When the memory budget of the sizer is approached, the responses
+    parsed so far are merged (releasing them from the process pool queue)
+    and only a single batch is fetched at a time, until memory is freed.
+
+    Args:
+        email (str): User email.
+        run_ids (list): Run IDs to fetch the metadata for.
+        analyzer (EFetchAnalyzer): Analyzer collecting the metadata.
+        n_jobs (int): Number of batches to be fetched concurrently.
+        log_level (str): The log level to set.
+        sizer (AdaptiveBatchSizer): Batch sizer to be used (a new one is
+            created, if not provided).
+
+    Returns:
+        Tuple[EFetchResult, List[Tuple[list, str]]]: Result of the analyzer
+            and a list of batches which could not be fetched together with
+            the respective error messages.
+    """
+    logger = set_up_logger(log_level, logger_name=__name__)
+    sizer = sizer or AdaptiveBatchSizer()
+    executor = get_executor(n_jobs)
+
+    budget = sizer.memory_budget
+    position, retries, in_flight, failed = 0, deque(), {}, []
+    # responses of the fetched batches still parsed by the process pool
+    parsing = {}
+
+    def retry_or_fail(batch: list, attempt: int, e: Exception):
+        sizer.record_failure(len(batch))
+        if attempt >= EFETCH_MAX_ATTEMPTS:
+            failed.append((batch, str(e)))
+            logger.error(
+                f"Fetching metadata failed ({e}) for the following "
+                f"IDs: {', '.join(batch)}."
+            )
+            return
+        logger.warning(
+            f"Fetching metadata of {len(batch)} runs failed ({e}); "
+            f"retrying in batches of {sizer.size}."
+        )
+        retries.extend(
+            (chunk, attempt + 1) for chunk in _chunker(batch, sizer.size)
+        )
+
+    def merge(futures):
+        for future in futures:
+            batch, attempt = parsing.pop(future)
+            try:
+                analyzer.merge_future(future)
+            except PARSE_ERRORS as e:
+                retry_or_fail(batch, attempt, _parse_error(e))
+
+    while position < len(run_ids) or retries or in_flight or parsing:
+        max_in_flight = n_jobs
+        if budget is not None and budget.approached():
+            merge(list(parsing))
+            analyzer.merge_parsed()
+            max_in_flight = 1
+        while len(in_flight) < max_in_flight and (
+                retries or position < len(run_ids)):
+            if retries:
+                batch, attempt = retries.popleft()
+            else:
+                batch = run_ids[position:position + sizer.size]
+                position += len(batch)
+                attempt = 1
+            future = executor.submit(
+                _fetch_metadata_batch, _new_efetcher(email, log_level),
+                analyzer, batch
+            )
+            in_flight[future] = (batch, attempt)
+        if not in_flight and not parsing:
+            # everything merged above has failed and is being retried
+            continue
+
+        done, _ = wait(
+            list(in_flight) + list(parsing), return_when=FIRST_COMPLETED
+        )
+        merge([x for x in done if x in parsing])
+        for future in (x for x in done if x in in_flight):
+            batch, attempt = in_flight.pop(future)
+            try:
+                n_bytes, elapsed, futures = future.result()
+            except RuntimeError as e:
+                retry_or_fail(batch, attempt, e)
+            else:
+                sizer.record_success(len(batch), n_bytes, elapsed)
+                parsing.update((x, (batch, attempt)) for x in futures)
+
+    analyzer.merge_parsed()
+    return analyzer.result, failed
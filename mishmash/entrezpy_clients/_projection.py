@@ -0,0 +1,150 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Bokulich Laboratories.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import re
+from dataclasses import dataclass, field, fields
+from typing import FrozenSet, Tuple, Union
+
+from ._sra_meta import LEVELS, MODELS
+from ._utils import rename_column
+
+# custom attribute columns are suffixed with their level, e.g. 'Ph [sample]'
+_LEVEL_SUFFIX = re.compile(r" \[(run|experiment|sample|study)\]$", re.I)
+
+# attributes of the SRA objects which are not output as columns of their own
+_NON_FIELDS = (
+    "id", "custom_meta", "child", "library", "runs", "experiments", "samples"
+)
+
+
+def _field_columns() -> FrozenSet[str]:
+    """Output columns of the SRA object fields (custom attributes aside)."""
+    keys = [f"library_{x.name}" for x in fields(MODELS["library"])]
+    for level in LEVELS:
+        keys.extend(
+            x.name for x in fields(MODELS[level]) if x.name not in _NON_FIELDS
+        )
+    return frozenset(map(rename_column, keys))
+
+
+FIELD_COLUMNS = _field_columns()
+
+
+def _is_known_column(column: str) -> bool:
+    if column in FIELD_COLUMNS:
+        return True
+    # output columns of custom attributes have lowercase level suffixes
+    m = _LEVEL_SUFFIX.search(column)
+    return m is not None and m.group(1) in LEVELS
+
+
+def _split(values: Union[str, list, tuple, None]) -> Union[list, None]:
+    if values is None:
+        return None
+    if isinstance(values, str):
+        values = values.split(",")
+    values = [x.strip() for x in values if x.strip()]
+    return values or None
+
+
+@dataclass(frozen=True)
+class MetadataProjection:
+    """Subset of the SRA metadata to be extracted.
+
+    Custom attributes are, by far, the largest part of the metadata. Only
+    those of the `attribute_levels` are extracted from the EFetch responses
+    (the other ones are dropped while the XML is being parsed) and, if
+    `columns` are provided, only those among them which end up in one of the
+    columns are kept. The outputs are restricted in the same way.
+
+    Attributes:
+        columns (Tuple[str]): Output columns to keep, in the output order;
+            all of them are kept if None.
+        levels (FrozenSet[str]): Levels whose fields are kept.
+        attribute_levels (FrozenSet[str]): Levels whose custom attributes
+            are extracted.
+    """
+
+    columns: Union[Tuple[str, ...], None] = None
+    levels: FrozenSet[str] = frozenset(LEVELS)
+    attribute_levels: FrozenSet[str] = frozenset(LEVELS)
+    _column_set: FrozenSet[str] = field(
+        init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self):
+        # the dataclass is frozen - set the lookup set directly
+        object.__setattr__(self, "_column_set", frozenset(self.columns or ()))
+
+    @classmethod
+    def from_options(
+        cls,
+        columns: Union[str, list, None] = None,
+        levels: Union[str, list, None] = None,
+    ) -> Union["MetadataProjection", None]:
+        """Creates a projection from the (comma-separated) CLI options.
+
+        If columns are given, custom attributes are extracted only from
+        the levels those columns refer to (e.g., 'Ph [sample]').
+
+        Returns:
+            MetadataProjection: The projection or None, if neither the
+                columns nor the levels were provided.
+        Raises:
+            ValueError: When an unknown level or column was requested.
+        """
+        columns, levels = _split(columns), _split(levels)
+        if columns is None and levels is None:
+            return None
+        unknown = [x for x in columns or () if not _is_known_column(x)]
+        if unknown:
+            raise ValueError(
+                f'Unknown column(s): {", ".join(unknown)} - use any of: '
+                f'{", ".join(sorted(FIELD_COLUMNS))} or custom attributes '
+                f'suffixed with their level (e.g. \'Ph [sample]\').'
+            )
+        levels = {x.lower() for x in levels or LEVELS}
+        unknown = levels.difference(LEVELS)
+        if unknown:
+            raise ValueError(
+                f'Unknown level(s): {", ".join(sorted(unknown))} - use any '
+                f'of: {", ".join(LEVELS)}.'
+            )
+        attribute_levels = levels
+        if columns:
+            attribute_levels = levels.intersection(
+                m.group(1).lower() for m in map(_LEVEL_SUFFIX.search, columns)
+                if m
+            )
+        return cls(
+            columns=tuple(dict.fromkeys(columns)) if columns else None,
+            levels=frozenset(levels),
+            attribute_levels=frozenset(attribute_levels),
+        )
+
+    def keeps_level(self, level: str) -> bool:
+        return level.lower() in self.levels
+
+    def keeps_attributes(self, level: str) -> bool:
+        return level.lower() in self.attribute_levels
+
+    def keeps_column(self, column: str) -> bool:
+        return self.columns is None or column in self._column_set
+
+    def postprocessor(self, path, key, value):
+        """Drops custom attributes of the skipped levels during parsing.
+
+        Meant to be passed to `xmltodict.parse`: the attribute nodes of the
+        levels which are not requested are discarded as soon as they were
+        read, instead of being kept for the whole response.
+        """
+        if key.endswith("_ATTRIBUTES"):
+            level = key[:-len("_ATTRIBUTES")].lower()
+            if level in LEVELS and level not in self.attribute_levels:
+                return None
+        return key, value
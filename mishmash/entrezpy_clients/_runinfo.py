@@ -0,0 +1,194 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Bokulich Laboratories.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import csv
+import json
+import threading
+import time
+
+import pandas as pd
+from entrezpy.base.analyzer import EutilsAnalyzer
+from entrezpy.base.result import EutilsResult
+
+from ..telemetry import METRICS
+from ._utils import set_up_logger
+
+# RunInfo columns which are not kept as plain strings
+RUNINFO_INT_COLUMNS = [
+    "spots", "bases", "spots_with_mates", "avgLength", "size_MB", "TaxID"
+]
+RUNINFO_FLOAT_COLUMNS = ["InsertSize", "InsertDev"]
+RUNINFO_DATE_COLUMNS = ["ReleaseDate", "LoadDate"]
+RUNINFO_CATEGORY_COLUMNS = [
+    "LibraryStrategy", "LibrarySelection", "LibrarySource", "LibraryLayout",
+    "Platform", "Model",
+]
+
+
+class RunInfoResult(EutilsResult):
+    """Runs described by the SRA RunInfo tables.
+
+    RunInfo (`rettype=runinfo`) is a compact CSV table with a single row
+    per run - much smaller than the full EXPERIMENT_PACKAGE records and
+    sufficient to discover runs and summarize their size. Rows are
+    collected column by column as the responses are read; every run is
+    kept only once.
+
+    Attributes:
+        columns (dict): Values of every column, in the order of the runs.
+        query_runs (dict): IDs of the runs received by every query.
+        failed (list): Batches of IDs whose runs could not be found,
+            together with the respective error messages.
+    """
+
+    def __init__(self, query_id: str = None):
+        super().__init__("efetch", query_id, "sra")
+        self.columns = {}
+        self.query_runs = {}
+        self.failed = []
+        self._runs = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._runs)
+
+    def size(self):
+        return len(self._runs)
+
+    def isEmpty(self):
+        return not self._runs
+
+    def dump(self):
+        return {"db": self.db, "size": self.size(), "function": self.function}
+
+    def get_link_parameter(self, reqnum=0):
+        return {}
+
+    @property
+    def run_ids(self) -> list:
+        return list(self._runs)
+
+    def add_rows(self, response, query_id: str = None):
+        """Reads the runs from a RunInfo response.
+
+        NCBI repeats the header (and adds empty lines) whenever a response
+        combines several internal batches - those lines are skipped.
+
+        Args:
+            response (io.StringIO): RunInfo CSV response.
+            query_id (str): ID of the query the response belongs to.
+        """
+        header, rows = None, []
+        for row in csv.reader(response):
+            if not row or not any(row):
+                continue
+            if row[0] == "Run":
+                header = row
+                continue
+            if header is not None:
+                rows.append(dict(zip(header, row)))
+        self._add_rows(rows, query_id)
+
+    def add_failed(self, failed: list):
+        """Records batches of IDs whose runs could not be found."""
+        with self._lock:
+            self.failed.extend(failed)
+
+    def merge(self, other: "RunInfoResult"):
+        """Adds all the runs of another result to this one."""
+        with other._lock:
+            rows = [dict(zip(other.columns, values))
+                    for values in zip(*other.columns.values())]
+        self._add_rows(rows, other.query_id)
+
+    def _add_rows(self, rows: list, query_id: str):
+        with self._lock:
+            received = self.query_runs.setdefault(query_id, [])
+            for row in rows:
+                run_id = row.get("Run")
+                if not run_id:
+                    continue
+                received.append(run_id)
+                if run_id in self._runs:
+                    continue
+                self._runs[run_id] = len(self._runs)
+                for col in row.keys() - self.columns.keys():
+                    self.columns[col] = [None] * (len(self._runs) - 1)
+                for col, values in self.columns.items():
+                    values.append(row.get(col) or None)
+
+    def to_df(self) -> pd.DataFrame:
+        """Converts the runs into a DataFrame with typed columns.
+
+        Returns:
+            pd.DataFrame: One row per run, indexed by the run ID.
+        """
+        with self._lock:
+            df = pd.DataFrame(
+                {col: list(values) for col, values in self.columns.items()}
+            )
+        if df.empty:
+            return pd.DataFrame(index=pd.Index([], name="Run"))
+
+        for col in df.columns.intersection(RUNINFO_INT_COLUMNS):
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("Int64")
+        for col in df.columns.intersection(RUNINFO_FLOAT_COLUMNS):
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+        for col in df.columns.intersection(RUNINFO_DATE_COLUMNS):
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+        for col in df.columns.intersection(RUNINFO_CATEGORY_COLUMNS):
+            df[col] = df[col].astype("category")
+        return df.set_index("Run").sort_index()
+
+    def stats(self) -> dict:
+        """Summarizes the size of all the runs.
+
+        Returns:
+            dict: Number of runs together with their total number of spots,
+                bases and bytes (approximated from the sizes in MB).
+        """
+        df = self.to_df()
+
+        def total(col):
+            return int(df[col].sum()) if col in df.columns else 0
+
+        return {
+            "runs": len(df),
+            "spots": total("spots"),
+            "bases": total("bases"),
+            "bytes": total("size_MB") * 2**20,
+        }
+
+
+class RunInfoAnalyzer(EutilsAnalyzer):
+    """Analyzer collecting the SRA RunInfo responses.
+
+    A single analyzer (and its result) can be shared by several queries
+    running concurrently.
+    """
+
+    def __init__(self, log_level: str = "ERROR"):
+        super().__init__()
+        self.result = RunInfoResult()
+        self.logger = set_up_logger(log_level, self)
+
+    def init_result(self, response, request):
+        # the result is shared by all the queries, see __init__
+        return False
+
+    def analyze_error(self, response, request):
+        self.logger.error(json.dumps({
+            "tool": request.tool, "request": request.id,
+            "query": request.query_id, "error": response.getvalue(),
+        }))
+
+    def analyze_result(self, response, request):
+        start = time.perf_counter()
+        self.result.add_rows(response, request.query_id)
+        METRICS.observe("mishmash_parse_seconds",
+                        time.perf_counter() - start, stage="runinfo")
@@ -0,0 +1,317 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Bokulich Laboratories.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import sys
+import threading
+from abc import ABCMeta, abstractmethod
+from array import array
+from dataclasses import InitVar, dataclass, field, fields
+from typing import Iterator, List, Tuple, Union
+
+from ._utils import rename_column
+
+
+def _add_slots(cls):
+    """Re-creates a dataclass with `__slots__` instead of a `__dict__`.
+
+    Equivalent to `dataclass(slots=True)`, which is only available
+    from Python 3.10 on. Only the fields which are not already slotted
+    in one of the base classes are added.
+    """
+    inherited = set()
+    for base in cls.__mro__[1:]:
+        inherited.update(getattr(base, "__slots__", ()))
+    cls_dict = dict(cls.__dict__)
+    field_names = tuple(
+        f.name for f in fields(cls) if f.name not in inherited
+    )
+    cls_dict["__slots__"] = field_names
+    for name in field_names:
+        cls_dict.pop(name, None)
+    cls_dict.pop("__dict__", None)
+    cls_dict.pop("__weakref__", None)
+    return type(cls)(cls.__name__, cls.__bases__, cls_dict)
+
+
+def slotted_dataclass(cls=None, /, **kwargs):
+    """A `dataclass` decorator producing slotted classes."""
+    def wrap(cls):
+        return _add_slots(dataclass(cls, **kwargs))
+    return wrap if cls is None else wrap(cls)
+
+
+class KeyVocabulary:
+    """Interns attribute keys and maps them onto integer indices.
+
+    All the objects sharing a vocabulary store only the indices of
+    their attribute keys - every distinct key string exists once.
+    """
+
+    __slots__ = ("keys", "_index", "_lock")
+
+    def __init__(self):
+        self.keys = []
+        self._index = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def index(self, key: str) -> int:
+        """Returns the index of the key, adding it if not yet known."""
+        idx = self._index.get(key)
+        if idx is None:
+            with self._lock:
+                idx = self._index.get(key)
+                if idx is None:
+                    key = sys.intern(key)
+                    self.keys.append(key)
+                    idx = self._index[key] = len(self.keys) - 1
+        return idx
+
+    def key(self, idx: int) -> str:
+        return self.keys[idx]
+
+
+class TagVocabulary(KeyVocabulary):
+    """A `KeyVocabulary` of normalised custom attribute keys.
+
+    Normalised keys (e.g., 'tag_2 [SAMPLE]') are built only once per
+    distinct tag, level and duplicate number; the same goes for the output
+    column names derived from them (e.g., 'Tag_2 [sample]'). All of them
+    are interned, so every object sharing the vocabulary refers to the same
+    strings.
+    """
+
+    __slots__ = ("_attribute_keys", "_columns")
+
+    def __init__(self):
+        super().__init__()
+        self._attribute_keys = {}
+        self._columns = {}
+
+    def attribute_key(
+        self, tag: str, level: str, number: Union[int, None] = None
+    ) -> str:
+        """Returns the normalised key of a custom attribute.
+
+        Args:
+            tag (str): Attribute's tag.
+            level (str): SRA hierarchy level of the attribute (e.g. 'SAMPLE').
+            number (int): Number of a duplicated tag, if any.
+        """
+        key = self._attribute_keys.get((tag, level, number))
+        if key is None:
+            suffix = "" if number is None else f"_{number}"
+            key = self.key(self.index(f"{tag}{suffix} [{level}]"))
+            self._attribute_keys[(tag, level, number)] = key
+        return key
+
+    def column(self, key: str) -> str:
+        """Returns the output column name of a metadata key."""
+        col = self._columns.get(key)
+        if col is None:
+            col = self._columns[key] = sys.intern(rename_column(key))
+        return col
+
+
+def _intern(value):
+    """Interns low-cardinality string values (platforms, organisms etc.)."""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+@slotted_dataclass
+class CompactLibraryMetadata:
+    """A slotted counterpart of `LibraryMetadata`."""
+
+    name: str
+    layout: str
+    selection: str
+    source: str
+
+    def __post_init__(self):
+        self.layout = _intern(self.layout)
+        self.selection = _intern(self.selection)
+        self.source = _intern(self.source)
+
+    def get_fields(self) -> dict:
+        """Collects library metadata into a flat dictionary."""
+        return {
+            "library_name": self.name,
+            "library_layout": self.layout,
+            "library_selection": self.selection,
+            "library_source": self.source,
+        }
+
+
+@slotted_dataclass(eq=False)
+class CompactSRABaseMeta(metaclass=ABCMeta):
+    """A base class for compact SRA metadata objects.
+
+    Custom attributes are not kept in a per-object dictionary. Instead,
+    they are stored as two parallel arrays: indices of the keys in a shared
+    `KeyVocabulary` and the corresponding values.
+
+    Attributes:
+        id (str): Unique ID of the metadata object.
+        attr_keys (array): Vocabulary indices of custom attribute keys.
+        attr_values (tuple): Values of custom attributes.
+        vocabulary (KeyVocabulary): Vocabulary of the attribute keys,
+            normally the one of the `EFetchResult` holding the object (so
+            that it lives only as long as the result); objects created
+            without one get their own.
+    """
+
+    id: str
+    custom_meta: InitVar[Union[dict, None]] = None
+    attr_keys: array = None
+    attr_values: tuple = None
+    vocabulary: KeyVocabulary = field(default=None, repr=False)
+
+    def __post_init__(self, custom_meta):
+        if self.vocabulary is None:
+            self.vocabulary = KeyVocabulary()
+        if custom_meta:
+            self.attr_keys = array(
+                "I", [self.vocabulary.index(k) for k in custom_meta.keys()]
+            )
+            self.attr_values = tuple(custom_meta.values())
+
+    def iter_custom_meta(self) -> Iterator[Tuple[str, str]]:
+        """Iterates over (key, value) pairs of the custom attributes."""
+        if self.attr_keys is None:
+            return iter(())
+        keys = self.vocabulary.keys
+        return ((keys[i], v) for i, v in zip(self.attr_keys, self.attr_values))
+
+    def get_custom_meta(self) -> dict:
+        """Returns custom attributes as a dictionary."""
+        return dict(self.iter_custom_meta())
+
+    def _with_custom_meta(self, meta: dict) -> dict:
+        meta.update(self.iter_custom_meta())
+        return meta
+
+    @abstractmethod
+    def get_fields(self) -> dict:
+        """Collects object's own metadata into a flat dictionary.
+
+        Keys and their order are identical to the ones produced by
+        the `get_fields` method of the corresponding `SRABaseMeta` class.
+        """
+
+
+@slotted_dataclass(eq=False)
+class CompactSRARun(CompactSRABaseMeta):
+    """A slotted counterpart of `SRARun`."""
+
+    public: bool = True
+    bytes: int = None
+    bases: int = None
+    spots: int = None
+    avg_spot_len: int = None
+    experiment_id: str = None
+
+    def __post_init__(self, custom_meta):
+        CompactSRABaseMeta.__post_init__(self, custom_meta)
+        if self.spots > 0:
+            self.avg_spot_len = int(self.bases / self.spots)
+        else:
+            self.avg_spot_len = 0
+
+    def get_fields(self) -> dict:
+        return self._with_custom_meta({
+            "public": self.public,
+            "bytes": self.bytes,
+            "bases": self.bases,
+            "spots": self.spots,
+            "avg_spot_len": self.avg_spot_len,
+            "experiment_id": self.experiment_id,
+        })
+
+
+@slotted_dataclass(eq=False)
+class CompactSRAExperiment(CompactSRABaseMeta):
+    """A slotted counterpart of `SRAExperiment`."""
+
+    instrument: str = None
+    platform: str = None
+    library: CompactLibraryMetadata = None
+    runs: List[CompactSRARun] = field(default_factory=list)
+    sample_id: str = None
+
+    def __post_init__(self, custom_meta):
+        CompactSRABaseMeta.__post_init__(self, custom_meta)
+        self.instrument = _intern(self.instrument)
+        self.platform = _intern(self.platform)
+
+    def get_fields(self) -> dict:
+        meta = self._with_custom_meta({
+            "instrument": self.instrument,
+            "platform": self.platform,
+            "sample_id": self.sample_id,
+        })
+        meta.update(self.library.get_fields())
+        return meta
+
+
+@slotted_dataclass(eq=False)
+class CompactSRASample(CompactSRABaseMeta):
+    """A slotted counterpart of `SRASample`."""
+
+    name: str = None
+    title: str = None
+    biosample_id: str = None
+    organism: str = None
+    tax_id: str = None
+    study_id: str = None
+    experiments: List[CompactSRAExperiment] = field(default_factory=list)
+
+    def __post_init__(self, custom_meta):
+        CompactSRABaseMeta.__post_init__(self, custom_meta)
+        self.organism = _intern(self.organism)
+        self.tax_id = _intern(self.tax_id)
+        self.study_id = _intern(self.study_id)
+
+    def get_fields(self) -> dict:
+        return self._with_custom_meta({
+            "name": self.name,
+            "title": self.title,
+            "biosample_id": self.biosample_id,
+            "organism": self.organism,
+            "tax_id": self.tax_id,
+            "study_id": self.study_id,
+        })
+
+
+@slotted_dataclass(eq=False)
+class CompactSRAStudy(CompactSRABaseMeta):
+    """A slotted counterpart of `SRAStudy`."""
+
+    bioproject_id: str = None
+    center_name: str = None
+    samples: List[CompactSRASample] = field(default_factory=list)
+
+    def get_fields(self) -> dict:
+        return self._with_custom_meta({
+            "bioproject_id": self.bioproject_id,
+            "center_name": self.center_name,
+        })
+
+
+# compact counterparts of `_sra_meta.MODELS`
+COMPACT_MODELS = {
+    "library": CompactLibraryMetadata,
+    "study": CompactSRAStudy,
+    "sample": CompactSRASample,
+    "experiment": CompactSRAExperiment,
+    "run": CompactSRARun,
+}
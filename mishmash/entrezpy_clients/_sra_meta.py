@@ -34,6 +34,26 @@ META_REQUIRED_COLUMNS = [
     "Public",
 ]
 
+# dtypes enforced on the metadata output; counts are nullable integers
+# and the highly repetitive fields are stored as categories
+META_DTYPES = {
+    "Bases": "Int64",
+    "Spots": "Int64",
+    "Bytes": "Int64",
+    "Avg Spot Len": "Int64",
+    "Public": "boolean",
+    "Organism": "category",
+    "Library Source": "category",
+    "Library Layout": "category",
+    "Library Selection": "category",
+    "Instrument": "category",
+    "Platform": "category",
+    "Center Name": "category",
+}
+
+# SRA hierarchy levels, ordered from a run up to its study
+LEVELS = ("run", "experiment", "sample", "study")
+
 
 @dataclass
 class LibraryMetadata:
@@ -51,6 +71,10 @@ class LibraryMetadata:
             index=[f"library_{x}" for x in index],
         ).T
 
+    def get_fields(self) -> dict:
+        """Collects library metadata into a flat dictionary."""
+        return {f"library_{k}": getattr(self, k) for k in get_attrs(self)}
+
 
 @dataclass
 class SRABaseMeta(metaclass=ABCMeta):
@@ -68,12 +92,16 @@ class SRABaseMeta(metaclass=ABCMeta):
     custom_meta: Union[dict, None]
     child: str = None
 
-    def __post_init__(self):
-        """Initializes custom metadata DataFrame."""
+    @property
+    def custom_meta_df(self) -> Union[pd.DataFrame, None]:
+        """Custom metadata as a one-row DataFrame, built on demand."""
         if self.custom_meta:
-            self.custom_meta_df = pd.DataFrame(self.custom_meta, index=[self.id])
-        else:
-            self.custom_meta_df = None
+            return pd.DataFrame(self.custom_meta, index=[self.id])
+        return None
+
+    def get_custom_meta(self) -> dict:
+        """Returns custom attributes as a dictionary."""
+        return dict(self.custom_meta) if self.custom_meta else {}
 
     def __eq__(self, other):
         """Compares all attributes. To be used on subclasses that contain
@@ -110,6 +138,24 @@ class SRABaseMeta(metaclass=ABCMeta):
 
         return base_meta
 
+    def get_base_fields(self, excluded: tuple) -> dict:
+        """Collects basic metadata of the SRA object into a flat dictionary.
+
+        This is the DataFrame-free counterpart of `get_base_metadata`: the
+        keys are the same as the columns generated by that method.
+
+        Args:
+            excluded (tuple): attributes to be excluded from the dictionary
+        Returns:
+            fields (dict): Requested base metadata.
+        """
+        excluded = ("child", "custom_meta", "custom_meta_df") + excluded
+        index = get_attrs(self, excluded=excluded)
+        fields = {k: getattr(self, k) for k in index}
+        if self.custom_meta:
+            fields.update(self.custom_meta)
+        return fields
+
     def get_child_metadata(self) -> pd.DataFrame:
         """Generates a DataFrame containing metadata of all the
             children SRA objects.
@@ -139,6 +185,18 @@ class SRABaseMeta(metaclass=ABCMeta):
         """
         pass
 
+    @abstractmethod
+    def get_fields(self) -> dict:
+        """Collects object's own metadata into a flat dictionary.
+
+        Metadata of the object's children are not included - those are
+        combined with their parents' fields by the caller.
+
+        Returns:
+            dict: Object's metadata.
+        """
+        pass
+
 
 @dataclass(eq=False)
 class SRARun(SRABaseMeta):
@@ -164,7 +222,6 @@ class SRARun(SRABaseMeta):
 
     def __post_init__(self):
         """Calculates an average spot length."""
-        super().__post_init__()
         if self.spots > 0:
             self.avg_spot_len = int(self.bases / self.spots)
         else:
@@ -178,6 +235,9 @@ class SRARun(SRABaseMeta):
         """
         return self.get_base_metadata(excluded=("id",))
 
+    def get_fields(self) -> dict:
+        return self.get_base_fields(excluded=("id",))
+
 
 @dataclass
 class SRAExperiment(SRABaseMeta):
@@ -222,6 +282,11 @@ class SRAExperiment(SRABaseMeta):
         else:
             return exp_meta
 
+    def get_fields(self) -> dict:
+        fields = self.get_base_fields(excluded=("id", "runs", "library"))
+        fields.update(self.library.get_fields())
+        return fields
+
 
 @dataclass(eq=False)
 class SRASample(SRABaseMeta):
@@ -267,6 +332,9 @@ class SRASample(SRABaseMeta):
         else:
             return sample_meta
 
+    def get_fields(self) -> dict:
+        return self.get_base_fields(excluded=("id", "experiments"))
+
 
 @dataclass
 class SRAStudy(SRABaseMeta):
@@ -304,3 +372,16 @@ class SRAStudy(SRABaseMeta):
             return samples_merged
         else:
             return study_meta
+
+    def get_fields(self) -> dict:
+        return self.get_base_fields(excluded=("id", "samples"))
+
+
+# SRA object classes to be used at each level of the hierarchy
+MODELS = {
+    "library": LibraryMetadata,
+    "study": SRAStudy,
+    "sample": SRASample,
+    "experiment": SRAExperiment,
+    "run": SRARun,
+}
@@ -8,6 +8,9 @@
 
 import logging
 import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 import pandas as pd
 
@@ -17,9 +20,33 @@ PREFIX = {
     "sample": ("SRS", "ERS", "DRS"),
     "study": ("SRP", "ERP", "DRP"),
     "bioproject": ("PRJ",),
+    "biosample": ("SAM",),
 }
 
 
+def classify_accessions(ids: list) -> dict:
+    """Groups accession IDs by their type.
+
+    The type is deduced from the ID prefix (see PREFIX). IDs which do not
+    match any of the known prefixes are grouped under 'other'. Duplicated
+    IDs are removed; the order of the remaining IDs is preserved.
+
+    Args:
+        ids (list): Accession IDs to be classified.
+
+    Returns:
+        dict: Mapping of ID type to a list of IDs of that type.
+    """
+    groups = {}
+    for _id in dict.fromkeys(str(x).strip() for x in ids):
+        id_type = next(
+            (k for k, v in PREFIX.items() if _id.upper().startswith(v)),
+            "other"
+        )
+        groups.setdefault(id_type, []).append(_id)
+    return groups
+
+
 def _chunker(seq, size):
     # source: https://stackoverflow.com/a/434328/579416
     return (seq[pos : pos + size] for pos in range(0, len(seq), size))
@@ -29,12 +56,115 @@ class InvalidIDs(Exception):
     pass
 
 
+class RateLimiter:
+    """Spaces out requests to respect a maximum request rate.
+
+    A single instance is meant to be shared by all the threads sending
+    requests to the same service, so that the combined rate stays within
+    the limit no matter how many of them run concurrently.
+
+    Args:
+        requests_per_sec (float): Maximum number of requests per second.
+    """
+
+    def __init__(self, requests_per_sec: float):
+        self.interval = 1 / requests_per_sec
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Blocks until the next request is allowed to be sent."""
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+# NCBI allows up to 3 requests per second without an API key
+NCBI_RATE_LIMITER = RateLimiter(3)
+
+
+# worker pools by their number of workers; a pool is never shut down
+# (nor replaced), as other queries may still be submitting to it
+_EXECUTORS = {}
+_PROCESS_EXECUTORS = {}
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def get_executor(max_workers: int) -> ThreadPoolExecutor:
+    """Returns the process-wide pool of worker threads of the given size.
+
+    The pool is created once and reused by all the pipeline stages instead
+    of starting (and abandoning) new threads for every query. Requesting
+    a different number of workers creates another pool; the existing ones
+    are kept, as queries running concurrently (e.g. in different
+    `Session`s) may still be using them. Idle threads cost next to nothing.
+
+    Args:
+        max_workers (int): Number of worker threads.
+
+    Returns:
+        ThreadPoolExecutor: The shared worker pool.
+    """
+    max_workers = max(1, int(max_workers))
+    with _EXECUTOR_LOCK:
+        executor = _EXECUTORS.get(max_workers)
+        if executor is None:
+            executor = _EXECUTORS[max_workers] = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="mishmash"
+            )
+        return executor
+
+
+def get_process_executor(max_workers: int) -> ProcessPoolExecutor:
+    """Returns the process-wide pool of worker processes of the given size.
+
+    Used for CPU-bound work (like parsing of the EFetch responses) which
+    would otherwise be serialised by the GIL. Like the pools returned by
+    `get_executor`, a pool is kept for every number of workers requested,
+    since analyzers hold on to the pool they were created with.
+
+    Args:
+        max_workers (int): Number of worker processes.
+
+    Returns:
+        ProcessPoolExecutor: The shared process pool.
+    """
+    max_workers = max(1, int(max_workers))
+    with _EXECUTOR_LOCK:
+        executor = _PROCESS_EXECUTORS.get(max_workers)
+        if executor is None:
+            executor = _PROCESS_EXECUTORS[max_workers] = \
+                ProcessPoolExecutor(max_workers=max_workers)
+        return executor
+
+
 def get_attrs(obj, excluded=()):
     return [
         k for k, v in vars(obj).items() if k not in excluded and not k.startswith("__")
     ]
 
 
+def rename_column(col: str) -> str:
+    """Translates a single metadata key into its output column name.
+
+    Follows the same rules as `rename_columns` so that flat metadata
+    records can be named without materialising a DataFrame first.
+    """
+    if col.endswith("_id"):
+        col_split = col.split("_")
+        new_col = f"{col_split[0].capitalize()} {col_split[1].upper()}"
+    elif "_" in col:
+        new_col = " ".join([x.capitalize() for x in col.split("_")])
+    else:
+        new_col = col.capitalize()
+
+    # rename Sample ID to Sample Accession (incompatible with qiime naming)
+    return "Sample Accession" if new_col == "Sample ID" else new_col
+
+
 def rename_columns(df: pd.DataFrame):
     # clean up ID columns
     col_map = {}
@@ -63,40 +193,79 @@ def rename_columns(df: pd.DataFrame):
     return df
 
 
-def set_up_entrezpy_logging(entrezpy_obj, log_level):
-    """Sets up logging for the given Entrezpy object.
+def set_dtypes(df: pd.DataFrame, dtypes: dict) -> pd.DataFrame:
+    """Casts columns of the DataFrame to the requested dtypes.
+
+    Columns missing from the DataFrame are ignored.
+    """
+    dtypes = {col: dtype for col, dtype in dtypes.items() if col in df.columns}
+    return df.astype(dtypes)
+
+
+# all the mishmash loggers are children of this one - it is the only logger
+# which gets a handler; the others merely propagate their records to it
+PACKAGE_LOGGER = "mishmash"
+_LOGGING_LOCK = threading.Lock()
+
+
+def _level_number(log_level) -> int:
+    if isinstance(log_level, int):
+        return log_level
+    return logging.getLevelName(str(log_level).upper())
+
+
+def configure_logging(log_level=None) -> logging.Logger:
+    """Configures logging of the whole package.
+
+    The handler (see `set_up_logging_handler`) is attached only once, to
+    the package logger; calling this function again merely updates the
+    log level.
 
     Args:
-        entrezpy_obj (object): An Entrezpy object that has a logger attribute.
-        log_level (str): The log level to set.
+        log_level (str): The log level to set; unchanged if None.
+
+    Returns:
+        logging.Logger: The package logger.
     """
-    handler = set_up_logging_handler()
+    logger = logging.getLogger(PACKAGE_LOGGER)
+    with _LOGGING_LOCK:
+        if not any(getattr(h, "_mishmash", False) for h in logger.handlers):
+            handler = set_up_logging_handler()
+            handler._mishmash = True
+            logger.addHandler(handler)
+        if log_level is not None:
+            _set_level(logger, log_level)
+    return logger
 
-    entrezpy_obj.logger.addHandler(handler)
-    entrezpy_obj.logger.setLevel(log_level)
 
-    if hasattr(entrezpy_obj, "request_pool"):
-        entrezpy_obj.request_pool.logger.addHandler(handler)
-        entrezpy_obj.request_pool.logger.setLevel(log_level)
+def _set_level(logger: logging.Logger, log_level):
+    # setting a level invalidates the caches of all the loggers - only do
+    # it if the level actually changes
+    if logger.level != _level_number(log_level):
+        logger.setLevel(log_level)
 
 
 def set_up_logger(log_level, cls_obj=None, logger_name=None) -> logging.Logger:
     """Sets up the module/class logger.
 
+    Only sets the level of the logger: its records are handled by the
+    package logger (see `configure_logging`), so that repeated calls do not
+    add any handlers.
+
     Args:
         log_level (str): The log level to set.
         cls_obj: Class instance for which the logger should be created.
+        logger_name (str): Name of the logger, if no `cls_obj` is given.
 
     Returns:
         logging.Logger: The module logger.
     """
+    configure_logging()
     if cls_obj:
         logger = logging.getLogger(f"{cls_obj.__module__}")
     else:
         logger = logging.getLogger(logger_name)
-    logger.setLevel(log_level)
-    handler = set_up_logging_handler()
-    logger.addHandler(handler)
+    _set_level(logger, log_level)
     return logger
 
 
@@ -0,0 +1,82 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Bokulich Laboratories.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+
+import csv
+
+LAYOUTS = ("wide", "sparse", "long")
+
+LONG_COLUMNS = ["ID", "Level", "Attribute", "Value"]
+
+
+class LongMetadata:
+    """Metadata in a long (tidy) layout.
+
+    Records are generated directly from the SRA objects held by
+    an `EFetchResult` - no wide DataFrame is ever created. The object
+    mimics the part of the DataFrame interface used by the CLI, so it can
+    be returned in place of one.
+
+    Args:
+        result (EFetchResult): Result containing the fetched metadata.
+    """
+
+    def __init__(self, result):
+        self.result = result
+
+    def __iter__(self):
+        return self.result.iter_long_records()
+
+    def to_csv(self, path_or_buf):
+        """Streams all the records into a CSV file, one row at a time."""
+        if hasattr(path_or_buf, "write"):
+            self._write(path_or_buf)
+        else:
+            with open(path_or_buf, "w", newline="") as fh:
+                self._write(fh)
+
+    def _write(self, fh):
+        writer = csv.writer(fh)
+        writer.writerow(LONG_COLUMNS)
+        writer.writerows(self)
+
+    def to_df(self):
+        """Collects all the records into a DataFrame.
+
+        All the columns apart from the values are highly repetitive and
+        are, therefore, stored as categories.
+
+        Returns:
+            pd.DataFrame: The records.
+        """
+        # pandas is not needed to stream the records (nor by the CLI
+        # importing LAYOUTS) - only import it here
+        import pandas as pd
+
+        df = pd.DataFrame.from_records(list(self), columns=LONG_COLUMNS)
+        return df.astype({col: "category" for col in LONG_COLUMNS[:-1]})
+
+
+def format_metadata(result, layout: str = "wide"):
+    """Converts metadata from an EFetchResult into the requested layout.
+
+    Args:
+        result (EFetchResult): Result containing the fetched metadata.
+        layout (str): One of 'wide' (one column per attribute), 'sparse'
+            (like 'wide' but with sparse attribute columns) or 'long'
+            (one row per run and attribute).
+
+    Returns:
+        Union[pd.DataFrame, LongMetadata]: Formatted metadata.
+    """
+    if layout == "long":
+        return LongMetadata(result)
+    elif layout in ("wide", "sparse"):
+        return result.metadata_to_df(sparse=layout == "sparse")
+    raise ValueError(
+        f'Unknown layout "{layout}" - use one of: {", ".join(LAYOUTS)}.'
+    )
@@ -0,0 +1,23 @@
+"""
+Errors of the mishmash analyses
+"""
+
+
+class MishmashError(Exception):
+    """Base class of the errors raised by the mishmash analyses.
+
+    The command-line interface prints them and exits; programmatic
+    users (see `mishmash.Session`) can catch them instead.
+    """
+
+
+class InputError(MishmashError, ValueError):
+    """Raised when the input IDs (or the options) are missing or invalid."""
+
+
+class NoDataError(MishmashError):
+    """Raised when no data could be found or fetched for the input."""
+
+
+class FetchError(MishmashError):
+    """Raised when a record could not be downloaded."""
@@ -1,56 +1,358 @@
-from .entrezpy_clients._pipelines import _get_run_ids
-from .entrezpy_clients._efetch import EFetchAnalyzer
+from .entrezpy_clients._batching import AdaptiveBatchSizer
+from .entrezpy_clients._pipelines import (
+    fetch_history,
+    fetch_run_metadata,
+    get_run_ids_by_query,
+    get_run_ids_by_type,
+    get_runinfo_by_query,
+    get_runinfo_by_type,
+    get_sra_history,
+)
+from .entrezpy_clients._cache import MetadataCache
+from .entrezpy_clients._efetch import EFetchAnalyzer, EFetchResult
+from .entrezpy_clients._projection import MetadataProjection
+from .entrezpy_clients._utils import get_process_executor, set_up_logger
+from .entrezpy_clients._writers import format_metadata
+from .errors import InputError, NoDataError
 from .scrape_pdf import _check_input_file
-import entrezpy.efetch.efetcher as ef
+from .telemetry import MEMORY_BUDGET, METRICS, RUN_REPORT
 
 test_ids = ["ERROR"]
 
+# number of experiment packages fetched per EFetch request (initially,
+# when the batch size is adapted to the responses)
+EFETCH_REQSIZE = 150
 
-def get_metadata(args) -> object:
+
+def _count_rows(stage: str, rows: int):
     """
-    Fetch the metadata of corresponding IDs.
-    
+    Record the number of rows (IDs, runs or records) a stage produced.
+    """
+    METRICS.inc("mishmash_rows_total", rows, stage=stage)
+
+
+def _new_analyzer(parse_jobs: int = 0,
+                  projection: MetadataProjection = None) -> EFetchAnalyzer:
+    """
+    Create an analyzer for the metadata responses.
+
     Args
     ------
-    args : pass
-    
+    parse_jobs : number of processes to parse the responses in; if 0,
+        responses are parsed by the threads fetching them
+    projection : subset of the metadata to extract (all of it if None)
+
     Returns
     -------
-    df : dataframe of the metadata collection
+    analyzer : EFetchAnalyzer
+    """
+    pool = get_process_executor(parse_jobs) if parse_jobs else None
+    return EFetchAnalyzer(
+        "ERROR", compact=True, process_pool=pool, projection=projection
+    )
+
 
+def _fetch_query_metadata_from_history(email: str, query: str, source: str,
+                                       parse_jobs: int = 0,
+                                       projection: MetadataProjection = None):
     """
-    email = args.email
-    n_jobs = args.n_jobs
+    Fetch the metadata of runs matching a query, keeping the matching
+    records on the NCBI history server.
 
-    if args.accession_list:
-        accession_list = args.accession_list
-    elif args.accession_input_file:
-        accession_list = _check_input_file(args.accession_input_file)
-    else:
-        print("Input accession ID file must be provided via either the "
-              "--accession_list or --accession_input_file flag! Please check "
-              "your command and try again.")
-        exit(1)
+    Args
+    ------
+    email : user email
+    query : search query
+    source : database to run the query in
+    parse_jobs : number of processes to parse the responses in
+    projection : subset of the metadata to extract
 
-    assert isinstance(n_jobs, int)
+    Returns
+    -------
+    result : EFetchResult with the metadata or None, if nothing was found
+    """
+    history = get_sra_history(email, None, query, source)
+    if not history:
+        return None
+    RUN_REPORT.record(
+        "efetch", mode="history", records=history["count"],
+        reqsize=EFETCH_REQSIZE
+    )
+    result = fetch_history(
+        email, history, "xml", _new_analyzer(parse_jobs, projection),
+        reqsize=EFETCH_REQSIZE
+    )
+    if result is not None:
+        _count_rows("efetch", len(result.runs))
+    return result
 
-    run_ids = _get_run_ids(email, accession_list, None, "", n_jobs, "ERROR")
 
-    efetcher = ef.Efetcher(
-        "efetcher", email, apikey=None,
-        apikey_var=None, threads=n_jobs, qid=None
+def _open_cache(args):
+    """
+    Open the metadata cache, if requested.
+
+    Returns
+    -------
+    cache : MetadataCache or None
+    """
+    if not args.cache_file:
+        return None
+    ttl = args.cache_ttl * 24 * 3600 if args.cache_ttl is not None else None
+    return MetadataCache(args.cache_file, ttl=ttl)
+
+
+def _fetch_run_metadata(email: str, run_ids: list, n_jobs: int,
+                        cache=None, refresh: bool = False,
+                        parse_jobs: int = 0,
+                        projection: MetadataProjection = None):
+    """
+    Fetch the metadata of runs, reusing the cached runs where possible.
+
+    Runs fetched with a projection are incomplete - they are read from
+    the cache, but never stored there.
+
+    Args
+    ------
+    email : user email
+    run_ids : IDs of the runs to fetch the metadata for
+    n_jobs : number of batches to fetch concurrently
+    cache : MetadataCache to read the runs from and store them to
+    refresh : if True, all the runs are fetched (and re-cached)
+    parse_jobs : number of processes to parse the responses in
+    projection : subset of the metadata to extract
+
+    Returns
+    -------
+    result : EFetchResult with the metadata of all the runs
+
+    Raises
+    ------
+    NoDataError : if the metadata of none of the runs could be obtained
+    """
+    cached = {}
+    if cache is not None and not refresh:
+        cached = cache.load(run_ids)
+    to_fetch = [x for x in run_ids if x not in cached]
+    RUN_REPORT.record(
+        "cache", enabled=cache is not None, refresh=refresh,
+        hits=len(cached), misses=len(to_fetch)
     )
+    _count_rows("cache", len(cached))
+
+    result = None
+    if to_fetch:
+        sizer = AdaptiveBatchSizer(
+            initial=EFETCH_REQSIZE, memory_budget=MEMORY_BUDGET
+        )
+        result, failed = fetch_run_metadata(
+            email, to_fetch, _new_analyzer(parse_jobs, projection), n_jobs,
+            "ERROR", sizer
+        )
+        RUN_REPORT.record(
+            "efetch", mode="adaptive", runs=len(to_fetch),
+            failed_runs=sum(len(batch) for batch, _ in failed),
+            **sizer.summary()
+        )
+        _count_rows("efetch", len(result.runs) if result is not None else 0)
+        if result is None and not cached:
+            raise NoDataError("Metadata of none of the runs could be fetched.")
+        if result is not None and cache is not None and projection is None:
+            cache.store(result.iter_run_records(include_cached=False))
+
+    if result is None:
+        result = EFetchResult.empty("ERROR", compact=True,
+                                    projection=projection)
+    result.add_cached_records(cached)
+    return result
+
+
+def _get_runinfo(email: str, accession_list, query: str, source: str,
+                 n_jobs: int, use_history: bool):
+    """
+    Find runs of the accession IDs (or of the query) using SRA RunInfo.
 
-    metadata_response = efetcher.inquire(
-        {
-            "db": "sra",
-            "id": run_ids,
-            "rettype": "xml",
-            "retmode": "xml",
-            "retmax": len(run_ids),
-            "reqsize": 150,
-        },
-        analyzer=EFetchAnalyzer("ERROR"),
+    Args
+    ------
+    email : user email
+    accession_list : accession IDs to find the runs of (or None)
+    query : search query to find the runs by (used if no accession_list)
+    source : database to run the query in
+    n_jobs : number of batches to fetch concurrently
+    use_history : whether to keep the search results on the history server
+
+    Returns
+    -------
+    result : RunInfoResult with a row per run found
+    """
+    if accession_list is None:
+        result = get_runinfo_by_query(
+            email, query, source, n_jobs, "ERROR", use_history
+        )
+    else:
+        result = get_runinfo_by_type(
+            email, accession_list, n_jobs, "ERROR", use_history
+        )
+    RUN_REPORT.record("runinfo", **result.stats())
+    _count_rows("runinfo", len(result))
+    return result
+
+
+def retrieve_metadata(email: str, accession_list: list = None,
+                      query: str = None, query_db: str = "biosample",
+                      n_jobs: int = 1, parse_jobs: int = 0,
+                      layout: str = "wide", use_history: bool = False,
+                      runinfo: bool = False, runinfo_only: bool = False,
+                      columns=None, levels=None, cache=None,
+                      refresh: bool = False) -> object:
+    """
+    Fetch the metadata of the runs of accession IDs (or of a query).
+
+    Args
+    ------
+    email : user email (or an E-utilities client of the caller's own, see
+        `get_client`)
+    accession_list : accession IDs to fetch the metadata of the runs of
+    query : search query to find the runs by (used if no accession_list)
+    query_db : database to run the query in
+    n_jobs : number of batches to fetch concurrently
+    parse_jobs : number of processes to parse the responses in
+    layout : layout of the output table ('wide', 'sparse' or 'long')
+    use_history : whether to keep the search results on the history server
+    runinfo : whether to find the runs using SRA RunInfo
+    runinfo_only : whether to return the RunInfo table of the runs instead
+        of their metadata
+    columns : output columns to keep (list or comma-separated string)
+    levels : SRA levels to keep the metadata of (list or comma-separated
+        string)
+    cache : open MetadataCache to read the runs from and store them to
+    refresh : if True, all the runs are fetched (and re-cached)
+
+    Returns
+    -------
+    df : dataframe of the metadata collection (or a LongMetadata object,
+        if the long layout was requested; or the RunInfo table, if only
+        that was requested)
+
+    Raises
+    ------
+    InputError : if neither accession IDs nor a query were provided or
+        the number of jobs, the columns or the levels are invalid
+    NoDataError : if no runs (or no metadata) could be found
+    """
+    if not accession_list and not query:
+        raise InputError("Input accession IDs (or a search query) must be "
+                         "provided!")
+    if not accession_list:
+        accession_list = None
+    runinfo = runinfo or runinfo_only
+
+    if not isinstance(n_jobs, int) or n_jobs < 1:
+        raise InputError(f"The number of jobs must be a positive integer, "
+                         f"not {n_jobs!r}!")
+    logger = set_up_logger("WARNING", logger_name=__name__)
+
+    try:
+        projection = MetadataProjection.from_options(columns, levels)
+    except ValueError as e:
+        raise InputError(str(e)) from e
+
+    if runinfo:
+        runinfo_result = _get_runinfo(
+            email, accession_list, query, query_db, n_jobs, use_history
+        )
+        run_ids = sorted(runinfo_result.run_ids)
+        if run_ids and runinfo_only:
+            df = runinfo_result.to_df()
+            _count_rows("output", len(df))
+            return df
+    elif accession_list is None:
+        if use_history:
+            # the matching records never leave the history server
+            try:
+                result = _fetch_query_metadata_from_history(
+                    email, query, query_db, parse_jobs, projection
+                )
+            except RuntimeError as e:
+                logger.warning(
+                    f"Fetching metadata using the history server failed "
+                    f"({e}); falling back to fetching it by run IDs."
+                )
+            else:
+                if result is None:
+                    raise NoDataError(f"No records matching the query could "
+                                      f"be found: {query}")
+                if cache is not None and projection is None:
+                    cache.store(result.iter_run_records())
+                df = format_metadata(result, layout)
+                if layout != "long":
+                    _count_rows("output", len(df))
+                return df
+        run_ids = get_run_ids_by_query(
+            email, query, query_db, n_jobs, "ERROR"
+        )
+    else:
+        run_ids = get_run_ids_by_type(
+            email, accession_list, n_jobs, "ERROR", use_history
+        )
+
+    if not run_ids:
+        raise NoDataError("No runs could be found for the provided input.")
+    _count_rows("run_ids", len(run_ids))
+
+    result = _fetch_run_metadata(
+        email, run_ids, n_jobs, cache, refresh, parse_jobs, projection
     )
-    df = metadata_response.result.metadata_to_df()
+    df = format_metadata(result, layout)
+    # long records are only generated while being written out
+    if layout != "long":
+        _count_rows("output", len(df))
     return df
+
+
+def get_metadata(args) -> object:
+    """
+    Fetch the metadata of corresponding IDs.
+
+    Args
+    ------
+    args : parsed command-line arguments of assess_metadata
+
+    Returns
+    -------
+    df : dataframe of the metadata collection (or a LongMetadata object,
+        if the long layout was requested; or the RunInfo table, if only
+        that was requested)
+
+    Raises
+    ------
+    InputError : if no input was provided (see `retrieve_metadata`)
+    NoDataError : if no runs (or no metadata) could be found
+
+    """
+    if args.accession_list:
+        accession_list = args.accession_list
+    elif args.accession_input_file:
+        accession_list = _check_input_file(args.accession_input_file)
+    elif args.query:
+        accession_list = None
+    else:
+        raise InputError(
+            "Input accession IDs must be provided via either the "
+            "--accession_list or --accession_input_file flag (or a search "
+            "query via the --query flag)! Please check your command and "
+            "try again."
+        )
+
+    cache = _open_cache(args)
+    try:
+        return retrieve_metadata(
+            args.email, accession_list, args.query, args.query_db,
+            n_jobs=args.n_jobs, parse_jobs=args.parse_jobs,
+            layout=args.layout, use_history=args.use_history,
+            runinfo=args.runinfo, runinfo_only=args.runinfo_only,
+            columns=args.columns, levels=args.levels, cache=cache,
+            refresh=args.refresh,
+        )
+    finally:
+        if cache is not None:
+            cache.close()
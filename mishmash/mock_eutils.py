@@ -0,0 +1,483 @@
+"""
+Local stand-in for the NCBI E-utilities, for tests and load testing
+"""
+
+import argparse
+import collections
+import glob
+import itertools
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+_PACKAGE = re.compile(r"<EXPERIMENT_PACKAGE>.*?</EXPERIMENT_PACKAGE>", re.S)
+_PACKAGE_RUN = re.compile(r'<RUN\b[^>]*?\baccession="([^"]+)"')
+_RUN_TAG = re.compile(r"<RUN\b[^>]*>")
+_RUN_ATTR = re.compile(r'(\w+)="([^"]*)"')
+_DOCSUM = re.compile(r"<DocSum>.*?</DocSum>", re.S)
+_DOCSUM_ID = re.compile(r"<Id>\s*(\d+)\s*</Id>")
+# accessions are found in the (escaped) XML strings of the summaries
+_DOCSUM_ACC = re.compile(r'(\w+) acc=(?:"|&quot;)([^"&]+)')
+_FIELD_TAG = re.compile(r"\[[^\]]*\]$")
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8" ?>\n'
+RUNINFO_HEADER = "Run,spots,bases,size_MB\n"
+
+
+class MockEUtilsData:
+    """Records served by `MockEUtilsServer`.
+
+    SRA records are added as EFetch responses (package sets and document
+    summaries), which are split into single records. Every accession found
+    in a document summary (run, experiment, study, ...) can be searched for
+    in the 'sra' database; other searches and links have to be added
+    explicitly.
+
+    Attributes:
+        articles (dict): PMC articles (full EFetch responses) by their IDs.
+        packages (dict): EXPERIMENT_PACKAGE elements by run accessions.
+        docsums (dict): DocSum elements by SRA UIDs.
+        runs (dict): Run accessions by SRA UIDs.
+        terms (dict): UIDs found by (database, search term).
+        links (dict): SRA UIDs linked to (source database, UID).
+    """
+
+    def __init__(self):
+        self.articles = {}
+        self.packages = {}
+        self.docsums = {}
+        self.runs = {}
+        self.terms = collections.defaultdict(list)
+        self.links = collections.defaultdict(list)
+
+    @classmethod
+    def from_directory(cls, path: str) -> "MockEUtilsData":
+        """Loads the records from a directory of EFetch responses.
+
+        Articles are read from 'pmc/<PMC ID>.xml', package sets from
+        'sra/*.xml' and document summaries from 'docsum/*.xml'.
+        """
+        data = cls()
+        for fp in sorted(glob.glob(os.path.join(path, "pmc", "*.xml"))):
+            with open(fp) as f:
+                data.add_article(os.path.basename(fp)[:-4], f.read())
+        for fp in sorted(glob.glob(os.path.join(path, "sra", "*.xml"))):
+            with open(fp) as f:
+                data.add_package_set(f.read())
+        for fp in sorted(glob.glob(os.path.join(path, "docsum", "*.xml"))):
+            with open(fp) as f:
+                data.add_docsums(f.read())
+        return data
+
+    def add_article(self, pmc_id: str, xml: str):
+        self.articles[str(pmc_id)] = xml
+
+    def add_package_set(self, xml: str):
+        for package in _PACKAGE.findall(xml):
+            for run_id in _PACKAGE_RUN.findall(package):
+                self.packages[run_id] = package
+
+    def add_docsums(self, xml: str):
+        for docsum in _DOCSUM.findall(xml):
+            uid = _DOCSUM_ID.search(docsum).group(1)
+            self.docsums[uid] = docsum
+            self.runs[uid] = []
+            for kind, acc in _DOCSUM_ACC.findall(docsum):
+                if kind == "Run":
+                    self.runs[uid].append(acc)
+                self.add_search("sra", acc, [uid])
+
+    def add_search(self, db: str, term: str, uids: list):
+        found = self.terms[(db, term)]
+        found.extend(str(x) for x in uids if str(x) not in found)
+
+    def add_link(self, dbfrom: str, uid: str, sra_uids: list):
+        self.links[(dbfrom, str(uid))].extend(str(x) for x in sra_uids)
+
+    def article(self, pmc_id: str):
+        pmc_id = str(pmc_id)
+        for key in (pmc_id, f"PMC{pmc_id}", pmc_id.replace("PMC", "")):
+            if key in self.articles:
+                return self.articles[key]
+        return None
+
+    def search(self, db: str, term: str) -> list:
+        return self.terms.get((db, _FIELD_TAG.sub("", term.strip())), [])
+
+    def packages_of(self, ids: list) -> list:
+        """Finds the packages of runs (or of SRA UIDs), each one once."""
+        packages = {}
+        for x in ids:
+            for run_id in self.runs.get(x, [x]):
+                if run_id in self.packages:
+                    packages.setdefault(id(self.packages[run_id]),
+                                        self.packages[run_id])
+        return list(packages.values())
+
+
+class MockEUtilsServer:
+    """HTTP server answering EFetch, ESearch and ELink requests locally.
+
+    Serves PMC articles and SRA metadata (package sets, document summaries
+    and RunInfo tables of the packaged runs) from `data`, supports the
+    history server (WebEnv and query keys) and can inject the failures
+    seen when talking to NCBI: latency, rate limiting (HTTP 429),
+    responses truncated mid-transfer (chunked-encoding failures) and
+    requests stalling until the clients time out. Failures are drawn from
+    a seeded generator.
+
+    Use as a context manager; `url` is the E-utilities base URL to point
+    the clients to (see `set_eutils_url`).
+
+    Attributes:
+        data (MockEUtilsData): Records to serve.
+        latency (float): Delay added to every response (in seconds).
+        jitter (float): Maximum random delay added on top of `latency`.
+        rate_limit (float): Requests per second served; any further ones
+            are rejected with HTTP 429. Unlimited if None.
+        truncate_rate (float): Fraction of responses cut off mid-transfer.
+        timeout_rate (float): Fraction of requests stalled for `stall`
+            seconds before being answered.
+        stall (float): Duration of a stall (in seconds).
+        stats (collections.Counter): Requests received by E-utility and
+            failures injected by type.
+    """
+
+    def __init__(
+        self,
+        data: MockEUtilsData = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        rate_limit: float = None,
+        truncate_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        stall: float = 5.0,
+        seed: int = 0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.data = data or MockEUtilsData()
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.truncate_rate = truncate_rate
+        self.timeout_rate = timeout_rate
+        self.stall = stall
+        self.stats = collections.Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._served = collections.deque()
+        self._history = {}
+        self._webenvs = itertools.count(1)
+        self._httpd = _HTTPServer((host, port), _Handler)
+        self._httpd.eutils = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/entrez/eutils"
+
+    def start(self) -> "MockEUtilsServer":
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _draw(self) -> float:
+        with self._lock:
+            return self._rng.random()
+
+    def _rate_limited(self) -> bool:
+        if self.rate_limit is None:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            while self._served and self._served[0] <= now - 1:
+                self._served.popleft()
+            if len(self._served) >= self.rate_limit:
+                return True
+            self._served.append(now)
+        return False
+
+    def fault(self) -> str:
+        """Decides which failure (if any) to inject into a request."""
+        if self._rate_limited():
+            return "rate_limited"
+        if self.timeout_rate and self._draw() < self.timeout_rate:
+            return "timeout"
+        if self.truncate_rate and self._draw() < self.truncate_rate:
+            return "truncated"
+        return None
+
+    def delay(self):
+        delay = self.latency
+        if self.jitter:
+            delay += self.jitter * self._draw()
+        if delay:
+            time.sleep(delay)
+
+    # history server
+
+    def _store(self, uids: list, webenv: str = None) -> tuple:
+        with self._lock:
+            webenv = webenv or f"MCID_{next(self._webenvs)}"
+            query_key = str(
+                sum(1 for w, _ in self._history if w == webenv) + 1
+            )
+            self._history[(webenv, query_key)] = list(uids)
+        return webenv, query_key
+
+    def _recall(self, params: dict) -> list:
+        return self._history.get(
+            (params.get("WebEnv"), str(params.get("query_key"))), []
+        )
+
+    def _uids(self, params: dict) -> list:
+        if params.get("id"):
+            return [x for x in params["id"].split(",") if x]
+        uids = self._recall(params)
+        start = int(params.get("retstart", 0))
+        return uids[start:start + int(params.get("retmax", len(uids)))]
+
+    # E-utilities
+
+    def efetch(self, params: dict) -> tuple:
+        db, rettype = params.get("db"), params.get("rettype", "xml")
+        if db == "pmc":
+            article = self.data.article(params.get("id", ""))
+            if article is None:
+                return 400, "text/xml", (
+                    "<pmc-articleset><error>The following PMCID is not "
+                    "available: {}</error></pmc-articleset>".format(
+                        params.get("id"))
+                )
+            return 200, "text/xml", article
+        if db != "sra" or \
+                rettype not in ("xml", "full", "docsum", "runinfo"):
+            return 400, "text/plain", f"Unsupported request: {params}"
+
+        uids = self._uids(params)
+        if rettype == "runinfo":
+            return 200, "text/plain", RUNINFO_HEADER + "".join(
+                self._runinfo_row(dict(_RUN_ATTR.findall(run)))
+                for package in self.data.packages_of(uids)
+                for run in _RUN_TAG.findall(package)
+            )
+        if rettype == "docsum":
+            docsums = "".join(
+                self.data.docsums[x] for x in uids if x in self.data.docsums
+            )
+            return 200, "text/xml", (
+                f"{XML_HEADER}<eSummaryResult>{docsums}</eSummaryResult>"
+            )
+        packages = "".join(self.data.packages_of(uids))
+        return 200, "text/xml", (
+            f"{XML_HEADER}<EXPERIMENT_PACKAGE_SET>{packages}"
+            "</EXPERIMENT_PACKAGE_SET>"
+        )
+
+    @staticmethod
+    def _runinfo_row(run: dict) -> str:
+        size_mb = int(run.get("size", 0)) // 2**20
+        return (f"{run['accession']},{run.get('total_spots', '')},"
+                f"{run.get('total_bases', '')},{size_mb}\n")
+
+    def esearch(self, params: dict) -> tuple:
+        db, term = params.get("db", "pubmed"), params.get("term", "")
+        stack, uids = [], []
+        for i, part in enumerate(term.split(" OR ")):
+            if part.startswith("#"):
+                found = self._history.get(
+                    (params.get("WebEnv"), part[1:]), []
+                )
+            else:
+                found = self.data.search(db, part)
+            uids.extend(x for x in found if x not in uids)
+            if found:
+                stack.append({"term": f"{part}[All Fields]",
+                              "field": "All Fields",
+                              "count": str(len(found)), "explode": "N"})
+                if len(stack) > 1:
+                    stack.append("OR")
+
+        start = int(params.get("retstart", 0))
+        idlist = uids[start:start + int(params.get("retmax", 20))]
+        result = {
+            "count": str(len(uids)), "retmax": str(len(idlist)),
+            "retstart": str(start), "idlist": idlist,
+            "translationset": [], "translationstack": stack,
+            "querytranslation": term,
+        }
+        if params.get("usehistory") == "y":
+            result["webenv"], result["querykey"] = self._store(
+                uids, params.get("WebEnv")
+            )
+
+        if params.get("retmode") == "json":
+            return 200, "application/json", json.dumps(
+                {"header": {"type": "esearch", "version": "0.3"},
+                 "esearchresult": result}
+            )
+        ids = "".join(f"<Id>{x}</Id>" for x in result["idlist"])
+        return 200, "text/xml", (
+            f"{XML_HEADER}<eSearchResult><Count>{result['count']}</Count>"
+            f"<RetMax>{result['retmax']}</RetMax>"
+            f"<RetStart>{start}</RetStart><IdList>{ids}</IdList>"
+            "</eSearchResult>"
+        )
+
+    def elink(self, params: dict) -> tuple:
+        dbfrom = params.get("dbfrom")
+        uids = self._uids(params)
+        links = []
+        for uid in uids:
+            links.extend(x for x in self.data.links.get((dbfrom, uid), [])
+                         if x not in links)
+        linkset = {"dbfrom": dbfrom, "ids": uids}
+        if params.get("cmd") == "neighbor_history":
+            if links:
+                webenv, query_key = self._store(links, params.get("WebEnv"))
+                linkset["webenv"] = webenv
+                linkset["linksetdbhistories"] = [{
+                    "dbto": "sra", "linkname": f"{dbfrom}_sra",
+                    "querykey": query_key,
+                }]
+        elif links:
+            linkset["linksetdbs"] = [
+                {"dbto": "sra", "linkname": f"{dbfrom}_sra", "links": links}
+            ]
+        return 200, "application/json", json.dumps(
+            {"header": {"type": "elink", "version": "0.3"},
+             "linksets": [linkset]}
+        )
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    block_on_close = False
+
+    def handle_error(self, request, client_address):
+        # clients which timed out have closed their connections already
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        self._answer(url.path, parse_qs(url.query))
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length).decode()
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        params.update(parse_qs(body))
+        self._answer(url.path, params)
+
+    def _answer(self, path: str, params: dict):
+        server = self.server.eutils
+        params = {k: v[0] for k, v in params.items()}
+        eutil = path.rstrip("/").rsplit("/", 1)[-1].replace(".fcgi", "")
+        server.stats[eutil] += 1
+
+        fault = server.fault()
+        if fault:
+            server.stats[fault] += 1
+        if fault == "rate_limited":
+            return self._send(
+                429, "application/json",
+                '{"error":"API rate limit exceeded"}', {"Retry-After": "1"}
+            )
+        if fault == "timeout":
+            time.sleep(server.stall)
+        server.delay()
+
+        if eutil in ("efetch", "esearch", "elink"):
+            status, ctype, body = getattr(server, eutil)(params)
+        else:
+            status, ctype, body = 404, "text/plain", f"Unknown: {path}"
+        if fault == "truncated":
+            return self._send_truncated(ctype, body)
+        self._send(status, ctype, body)
+
+    def _send(self, status: int, ctype: str, body: str, headers=None):
+        body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", f"{ctype}; charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_truncated(self, ctype: str, body: str):
+        # announce the full chunk, but close the connection halfway through
+        body = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", f"{ctype}; charset=UTF-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self.wfile.write(f"{len(body):x}\r\n".encode())
+        self.wfile.write(body[:len(body) // 2])
+        self.wfile.flush()
+        self.close_connection = True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serves E-utilities responses from a directory of "
+                    "fixtures (see MockEUtilsData.from_directory)."
+    )
+    parser.add_argument("--fixtures", type=str, required=True)
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--rate_limit", type=float)
+    parser.add_argument("--truncate_rate", type=float, default=0.0)
+    parser.add_argument("--timeout_rate", type=float, default=0.0)
+    parser.add_argument("--stall", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = MockEUtilsServer(
+        MockEUtilsData.from_directory(args.fixtures), latency=args.latency,
+        jitter=args.jitter, rate_limit=args.rate_limit,
+        truncate_rate=args.truncate_rate, timeout_rate=args.timeout_rate,
+        stall=args.stall, seed=args.seed, port=args.port,
+    )
+    with server:
+        print(f"Serving the E-utilities at {server.url} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Recording and replaying of the HTTP traffic of a mishmash run
+"""
+
+import hashlib
+import json
+import threading
+import zipfile
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+ARCHIVE_VERSION = 1
+INDEX = "index.json"
+# parameters identifying the user rather than the request
+IGNORED_PARAMS = {"email", "tool", "api_key"}
+# response headers worth keeping
+KEPT_HEADERS = ("Content-Type", "Retry-After")
+
+_LOCK = threading.Lock()
+_ARCHIVE = None
+
+
+class ReplayMissError(requests.ConnectionError):
+    """Raised when replaying a request which was never recorded."""
+
+
+def request_key(request: requests.PreparedRequest) -> str:
+    """Identifies a request independently of its host and of the user.
+
+    The key consists of the method, the endpoint (last part of the URL
+    path) and the sorted parameters, both from the URL and the
+    (form-encoded) body.
+    """
+    url = urlsplit(request.url)
+    params = parse_qsl(url.query, keep_blank_values=True)
+    body = request.body
+    if isinstance(body, bytes):
+        body = body.decode()
+    if body:
+        params += parse_qsl(body, keep_blank_values=True)
+    params = sorted((k, v) for k, v in params if k not in IGNORED_PARAMS)
+    query = "&".join(f"{k}={v}" for k, v in params)
+    return f"{request.method} {url.path.rsplit('/', 1)[-1]}?{query}"
+
+
+class HTTPArchive:
+    """Compressed archive of HTTP responses, keyed by their requests.
+
+    The archive is a zip file (LZMA-compressed) holding an index of the
+    requests and one member per distinct response body. Responses to
+    a repeated request are kept in the order they were received and are
+    replayed in the same order; the last one is repeated once they run
+    out.
+
+    When recording, bodies are written to the archive as they are
+    received and the index is written on `close`. When replaying, the
+    whole archive is read into memory up front.
+
+    Attributes:
+        path (str): Location of the archive.
+        mode (str): 'record' or 'replay'.
+        entries (dict): Responses (status, reason, headers, body digest)
+            by request keys.
+    """
+
+    def __init__(self, path: str, mode: str):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown archive mode: {mode}.")
+        self.path = path
+        self.mode = mode
+        self.entries = {}
+        self._bodies = {}
+        self._cursors = {}
+        self._lock = threading.Lock()
+        self._zip = None
+        if mode == "record":
+            self._zip = zipfile.ZipFile(path, "w", zipfile.ZIP_LZMA)
+        else:
+            self._load()
+
+    def _load(self):
+        with zipfile.ZipFile(self.path) as zf:
+            index = json.loads(zf.read(INDEX))
+            if index.get("version") != ARCHIVE_VERSION:
+                raise ValueError(
+                    f"Unsupported archive version: {index.get('version')}."
+                )
+            self.entries = index["entries"]
+            for name in zf.namelist():
+                if name != INDEX:
+                    self._bodies[name] = zf.read(name)
+
+    def record(self, request: requests.PreparedRequest,
+               response: requests.Response):
+        body = response.content
+        digest = hashlib.sha1(body).hexdigest()
+        headers = {k: response.headers[k] for k in KEPT_HEADERS
+                   if k in response.headers}
+        with self._lock:
+            if digest not in self._bodies:
+                self._zip.writestr(digest, body)
+                self._bodies[digest] = None
+            self.entries.setdefault(request_key(request), []).append(
+                [response.status_code, response.reason, headers, digest]
+            )
+
+    def replay(self, request: requests.PreparedRequest) -> requests.Response:
+        key = request_key(request)
+        with self._lock:
+            responses = self.entries.get(key)
+            if not responses:
+                raise ReplayMissError(
+                    f"Request was not recorded in {self.path}: {key}",
+                    request=request,
+                )
+            position = self._cursors.get(key, 0)
+            self._cursors[key] = position + 1
+        status, reason, headers, digest = \
+            responses[min(position, len(responses) - 1)]
+
+        response = requests.Response()
+        response.status_code = status
+        response.reason = reason
+        response.headers = CaseInsensitiveDict(headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = self._bodies[digest]
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        if self._zip is None:
+            return
+        with self._lock:
+            self._zip.writestr(INDEX, json.dumps(
+                {"version": ARCHIVE_VERSION, "entries": self.entries}
+            ))
+            self._zip.close()
+            self._zip = None
+
+
+class ArchiveAdapter(BaseAdapter):
+    """Transport adapter recording or replaying the requests it sends.
+
+    Mounted on all the sessions mishmash talks to the E-utilities with.
+    Requests go through the wrapped adapter unless an archive is active
+    (see `start_recording` and `start_replay`): then, they are recorded
+    into it or answered from it without touching the network.
+    """
+
+    def __init__(self, adapter: BaseAdapter = None):
+        super().__init__()
+        self.adapter = adapter or HTTPAdapter()
+
+    def send(self, request, **kwargs):
+        archive = _ARCHIVE
+        if archive is not None and archive.mode == "replay":
+            return archive.replay(request)
+        response = self.adapter.send(request, **kwargs)
+        if archive is not None:
+            archive.record(request, response)
+        return response
+
+    def close(self):
+        self.adapter.close()
+
+
+def mount(session: requests.Session) -> requests.Session:
+    """Wraps the HTTP(S) adapters of the session in ArchiveAdapters."""
+    for prefix in ("https://", "http://"):
+        adapter = session.adapters.get(prefix)
+        if not isinstance(adapter, ArchiveAdapter):
+            session.mount(prefix, ArchiveAdapter(adapter))
+    return session
+
+
+def _start(path: str, mode: str) -> HTTPArchive:
+    global _ARCHIVE
+    with _LOCK:
+        if _ARCHIVE is not None:
+            raise RuntimeError(
+                f"HTTP archive {_ARCHIVE.path} is already in use."
+            )
+        _ARCHIVE = HTTPArchive(path, mode)
+        return _ARCHIVE
+
+
+def start_recording(path: str) -> HTTPArchive:
+    """Records all the responses received from now on into `path`."""
+    return _start(path, "record")
+
+
+def start_replay(path: str) -> HTTPArchive:
+    """Answers all the requests sent from now on from the archive."""
+    return _start(path, "replay")
+
+
+def replaying() -> bool:
+    """Checks whether the requests are being answered from an archive."""
+    archive = _ARCHIVE
+    return archive is not None and archive.mode == "replay"
+
+
+def stop():
+    """Stops recording (saving the archive) or replaying."""
+    global _ARCHIVE
+    with _LOCK:
+        if _ARCHIVE is not None:
+            _ARCHIVE.close()
+        _ARCHIVE = None
@@ -1,8 +1,7 @@
+import functools
 import importlib.resources
 import json
 import re
-import requests
-import sys
 import xmltodict
 
 import numpy as np
@@ -10,9 +9,15 @@ import pandas as pd
 
 from bs4 import BeautifulSoup, Comment
 from collections import Counter
-from nltk import sent_tokenize, word_tokenize
 from pathlib import Path
 from urllib.parse import urlparse
+from xml.parsers.expat import ExpatError
+
+from .entrezpy_clients._client import EUtilsError, get_client
+from .entrezpy_clients._pipelines import get_runinfo_by_type
+from .entrezpy_clients._utils import set_up_logger
+from .errors import FetchError, InputError
+from .telemetry import MEMORY_BUDGET, PROFILER
 
 
 project_studies_pattern1 = r"(PRJ(E|D|N)[A-Z][0-9]{4,7})"
@@ -35,6 +40,106 @@ patterns = [
     old_sra_pattern
 ]
 
+# the accession patterns and keywords are compiled only once
+accession_res = [re.compile(pattern) for pattern in patterns]
+
+# Potential keywords denoting data upload in non-INSDC databases,
+# non-case sensitive
+db_name_list = ["figshare", "ega", "european phenome-genome archive",
+                "national genomics data center", "gsa",
+                "genome sequence archive", "ngdc",
+                "china national center for bioinformation",
+                "cncb", "mg-rast", "metagenomic rapid annotations "
+                                   "using subsystems technology",
+                "metagenomics rast", "cnsa", "cngb sequence archive",
+                "cngbdb", "china national genebank database"]
+db_name_dict = {"figshare": "Figshare",
+                "ega": "European Phenome-Genome Archive",
+                "european phenome-genome archive":
+                    "European Phenome-Genome Archive",
+                "gsa": "China National Center for Bioinformation: "
+                       "Genome Sequence Archive",
+                "genome sequence archive": "China National Center for "
+                                           "Bioinformation: Genome "
+                                           "Sequence Archive",
+                "ngdc": "China National Center for Bioinformation: "
+                        "National Genomics Data Center",
+                "national genomics data center":
+                    "China National Center for Bioinformation: "
+                    "National Genomics Data Cener",
+                "china national center for bioinformation":
+                    "China National Center for Bioinformation",
+                "cncb": "China National Center for Bioinformation:",
+                "mg-rast": "MG-RAST",
+                "metagenomic rapid annotations using subsystems "
+                    "technology": "MG-RAST",
+                "metagenomics rast": "MG-RAST",
+                "cnsa": "China National GeneBank Database Sequence "
+                        "Archive",
+                "cngb sequence archive": "China National GeneBank "
+                                         "Database Sequence Archive",
+                "cngbdb": "China National GeneBank Database Sequence "
+                          "Archive",
+                "china national genebank database":
+                    "China National GeneBank Database Sequence Archive"}
+
+url_search_list = ["figshare.com", "ega-archive.org",
+                   "ngdc.cncb.ac.cn/gsa", "mg-rast.org",
+                   "metagenomics.anl.gov", "db.cngb.org/cnsa"]
+
+prep_phrase_list = ["found in", "found at", "deposited in",
+                    "deposited into", "deposited on",
+                    "accessible at",
+                    "available in", "available from", "available on"]
+
+id_word_list = ["accession number", "accession number(s)",
+                "accession numbers",
+                "accession ID", "project ID",
+                "project access number",
+                "ID numbers", r'CRA([0-9]{6})', r'CNP([0-9]{6})',
+                r'[0-9]{7}\.[0-9]', r'mgp[0-9]{5}']
+
+
+def _keyword_res(keywords: list) -> list:
+    return [re.compile(fr'(\A|\W)({name})(\W|\Z)', re.IGNORECASE)
+            for name in keywords]
+
+
+db_name_re = _keyword_res(db_name_list)
+url_search_re = _keyword_res(url_search_list)
+prep_phrase_re = _keyword_res(prep_phrase_list)
+id_word_re = _keyword_res(id_word_list)
+
+
+def _search_sentences(keyword_res: list, sentences: list) -> list:
+    # keyword found in every sentence, for every keyword
+    matches = []
+    for regex in keyword_res:
+        for sentence in sentences:
+            match = regex.search(sentence)
+            if match:
+                matches.append(match.group(2))
+    return matches
+
+
+def install_nltk_punkt_dataset():
+    import nltk
+
+    try:
+        nltk.data.find("tokenizers/punkt_tab")
+    except LookupError:
+        nltk.download("punkt_tab")
+
+
+@functools.lru_cache(maxsize=None)
+def _tokenizers() -> tuple:
+    # NLTK is slow to import and its punkt tokenizer may have to be
+    # downloaded - both happen only once a detector tokenizes some text
+    install_nltk_punkt_dataset()
+    from nltk import sent_tokenize, word_tokenize
+
+    return sent_tokenize, word_tokenize
+
 
 def _contains_blocking_comment(content) -> bool:
     for element in content(string=lambda text: isinstance(text, Comment)):
@@ -48,22 +153,33 @@ def _contains_blocking_comment(content) -> bool:
 
 
 class PMCScraper:
-    def __init__(self, pmc_id):
+    def __init__(self, pmc_id, email: str = None, count_runs: bool = False):
         """
         Class to scrape a pmc_record.
         
         Inputs
         ------
         pmc_id: `int` PMC record ID.
+        email: `str` User email sent to NCBI with the requests (optional;
+            or an E-utilities client of the caller's own, see `get_client`).
+        count_runs: `bool` Whether to count the distinct runs listed in the
+            SRA RunInfo tables of the accession numbers found, instead of
+            the SRA records found for each of them.
 
         """
         self.pmc_id = pmc_id
+        self.email = email
+        self.count_runs = count_runs
         self.content = None
+        self.is_blocked = None
         self.core_text = None
+        self.sentences = None
+        self.sentence_words = None
         self.accession_tuples = None
         self.sra_records_count = None
         self.sra_record_xmls = None
         self.method_dict = {}
+        self.logger = set_up_logger("INFO", self)
 
         # Properties of journal and corresponding author
         self.journal_name = None
@@ -82,32 +198,43 @@ class PMCScraper:
         if self.content:
             return self.content
 
-        url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch." \
-              "fcgi?db=pmc&id={}".format(self.pmc_id)
-        for i in range(5):
+        # the shared E-utilities client retries the requests which failed
+        # transiently (with an exponential backoff), logging the failures
+        with PROFILER.stage("fetch"):
             try:
-                r = requests.get(url, 3)
-                r.raise_for_status()
-                break
-            except requests.exceptions.Timeout:
-                sys.exit(f"Connection to {url} has timed out. Please retry.")
-            except requests.exceptions.ChunkedEncodingError:
-                print(f"Connection to {url} has timed out. Please retry.")
-                continue
-            except requests.exceptions.HTTPError:
-                print(
-                    f"The download URL {url} is likely invalid.\n", flush=True,
+                content = get_client(self.email).post(
+                    "efetch", {"db": "pmc", "id": self.pmc_id}
                 )
-                continue
-            except KeyError:
-                print("Key error for: " + url, flush=True)
-                return 0
+            except EUtilsError as e:
+                raise FetchError(
+                    f"The record of {self.pmc_id} could not be downloaded "
+                    f"({e}). Please retry.") from e
 
-        self.content = BeautifulSoup(r.content, features="xml")
+        with PROFILER.stage("parse"):
+            self.content = BeautifulSoup(content, features="xml")
         return self.content
 
     def contains_blocking_comment(self):
-        return _contains_blocking_comment(self.get_xml())
+        if self.is_blocked is None:
+            self.is_blocked = _contains_blocking_comment(self.get_xml())
+        return self.is_blocked
+
+    def release_xml(self):
+        """
+        Drop the parsed XML record to free memory.
+
+        The text and the journal properties are extracted first, so that
+        the record does not need to be fetched again. Records without any
+        text are kept.
+        """
+        if self.content is None:
+            return
+        if not self.contains_blocking_comment():
+            try:
+                self.get_text()
+            except NoJournalTextError:
+                return
+        self.content = None
 
     def get_journal_name(self):
         if not self.journal_name:
@@ -144,7 +271,45 @@ class PMCScraper:
         if self.core_text:
             return self.core_text
 
-        content = self.get_xml()
+        self._parse_text(self.get_xml())
+        return self.core_text
+
+    def get_sentences(self) -> list:
+        """
+        Split the text of the record into sentences.
+
+        Returns
+        -------
+        self.sentences: `list` of the sentences of the article text.
+        """
+        if self.sentences is None:
+            sent_tokenize, _ = _tokenizers()
+            self.sentences = sent_tokenize(self.get_text())
+        return self.sentences
+
+    def get_sentence_words(self) -> list:
+        """
+        Split the sentences of the record into (lower-case) words.
+
+        The text is only tokenized once and shared by all the detectors.
+
+        Returns
+        -------
+        self.sentence_words: `list` of the word lists of every sentence.
+        """
+        if self.sentence_words is None:
+            _, word_tokenize = _tokenizers()
+            self.sentence_words = [
+                [word.lower() for word in word_tokenize(sentence)]
+                for sentence in self.get_sentences()
+            ]
+        return self.sentence_words
+
+    @PROFILER.timed("parse")
+    def _parse_text(self, content):
+        """
+        Extract the text and the journal properties from the XML record.
+        """
         if _contains_blocking_comment(content):
             raise RuntimeError(
                 "The publisher of this article does not allow downloading "
@@ -197,8 +362,8 @@ class PMCScraper:
                 for codetag in ref_list.find_all_next():
                     codetag.clear()
             except AttributeError:
-                print(f"No next elements found for ref-list tag in "
-                      "{self.pmc_id}.")
+                self.logger.info(f"No next elements found for ref-list tag "
+                                 f"in {self.pmc_id}.")
             self.core_text += core_text_back.text
         if core_text_front:
             self.core_text += core_text_front.text
@@ -206,8 +371,7 @@ class PMCScraper:
         if self.core_text == "":
             raise NoJournalTextError(f"No text found for {self.pmc_id}!")
 
-        return self.core_text
-
+    @PROFILER.timed("get_accession_tuples")
     def get_accession_tuples(self) -> list:
         """
         Retrieve accession numbers and database names from the record.
@@ -222,106 +386,25 @@ class PMCScraper:
 
         core_text = self.get_text()
         res = []
-        for pattern in patterns:
-            matches = re.findall(pattern, core_text)
+        for regex in accession_res:
+            matches = regex.findall(core_text)
             if matches:
                 res += matches
             self.accession_tuples = res
 
         return list(set(self.accession_tuples))
 
+    @PROFILER.timed("check_non_insdc_db")
     def check_non_insdc_db(self) -> str:
         # Checks text for keywords that may denote data upload in non-INSDC
         # databases
 
-        core_text = self.get_text()
-        tk_text = sent_tokenize(core_text)
-
-        # Potential keywords, non-case sensitive
-        db_name_list = ["figshare", "ega", "european phenome-genome archive",
-                        "national genomics data center", "gsa",
-                        "genome sequence archive", "ngdc",
-                        "china national center for bioinformation",
-                        "cncb", "mg-rast", "metagenomic rapid annotations "
-                                           "using subsystems technology",
-                        "metagenomics rast", "cnsa", "cngb sequence archive",
-                        "cngbdb", "china national genebank database"]
-        db_name_dict = {"figshare": "Figshare",
-                        "ega": "European Phenome-Genome Archive",
-                        "european phenome-genome archive":
-                            "European Phenome-Genome Archive",
-                        "gsa": "China National Center for Bioinformation: "
-                               "Genome Sequence Archive",
-                        "genome sequence archive": "China National Center for "
-                                                   "Bioinformation: Genome "
-                                                   "Sequence Archive",
-                        "ngdc": "China National Center for Bioinformation: "
-                                "National Genomics Data Center",
-                        "national genomics data center":
-                            "China National Center for Bioinformation: "
-                            "National Genomics Data Cener",
-                        "china national center for bioinformation":
-                            "China National Center for Bioinformation",
-                        "cncb": "China National Center for Bioinformation:",
-                        "mg-rast": "MG-RAST",
-                        "metagenomic rapid annotations using subsystems "
-                            "technology": "MG-RAST",
-                        "metagenomics rast": "MG-RAST",
-                        "cnsa": "China National GeneBank Database Sequence "
-                                "Archive",
-                        "cngb sequence archive": "China National GeneBank "
-                                                 "Database Sequence Archive",
-                        "cngbdb": "China National GeneBank Database Sequence "
-                                  "Archive",
-                        "china national genebank database":
-                            "China National GeneBank Database Sequence Archive"}
-        db_name_re = [fr'(\A|\W)({name})(\W|\Z)' for name in db_name_list]
-        db_match_list = [re.search(query, sent, re.IGNORECASE).group(2)
-                         for query
-                         in db_name_re for sent in tk_text
-                         if re.search(query, sent, re.IGNORECASE)]
-
-        url_search_list = ["figshare.com", "ega-archive.org",
-                           "ngdc.cncb.ac.cn/gsa", "mg-rast.org",
-                           "metagenomics.anl.gov", "db.cngb.org/cnsa"]
-        url_search_re = [fr'(\A|\W)({name})(\W|\Z)' for name in
-                         url_search_list]
-        url_match_list = [re.search(query, sent, re.IGNORECASE).group(2)
-                          for query in url_search_re for sent in tk_text
-                          if re.search(query, sent, re.IGNORECASE)]
-
-        prep_phrase_list = ["found in", "found at", "deposited in",
-                            "deposited into", "deposited on",
-                            "accessible at",
-                            "available in", "available from", "available on"]
-        prep_phrase_re = [fr'(\A|\W)({name})(\W|\Z)' for name in
-                          prep_phrase_list]
-        prep_match_list = [re.search(query, sent, re.IGNORECASE).group(2)
-                           for query in prep_phrase_re for sent in tk_text
-                           if re.search(query, sent, re.IGNORECASE)]
-
-        id_word_list = ["accession number", "accession number(s)",
-                        "accession numbers",
-                        "accession ID", "project ID",
-                        "project access number",
-                        "ID numbers", r'CRA([0-9]{6})', r'CNP([0-9]{6})',
-                        r'[0-9]{7}\.[0-9]', r'mgp[0-9]{5}']
-        id_word_re = [fr'(\A|\W)({name})(\W|\Z)' for name in id_word_list]
-        id_match_list = [re.search(query, sent, re.IGNORECASE).group(2)
-                         for query in id_word_re for sent in tk_text
-                         if re.search(query, sent, re.IGNORECASE)]
-
-        # Assume dict insertion order as of Python 3.7+
-        match_dict = {"db"   : db_match_list,
-                      "url"  : url_match_list,
-                      "prep" : prep_match_list,
-                      "id"   : id_match_list}
-
-        # For debugging purposes
-        match_len_df = pd.DataFrame(data=[[len(d) for d
-                                           in match_dict.values()]],
-                                    columns=list(match_dict.keys()),
-                                    index=[self.pmc_id])
+        tk_text = self.get_sentences()
+
+        db_match_list = _search_sentences(db_name_re, tk_text)
+        url_match_list = _search_sentences(url_search_re, tk_text)
+        prep_match_list = _search_sentences(prep_phrase_re, tk_text)
+        id_match_list = _search_sentences(id_word_re, tk_text)
 
         # To get at least Bronze:
         # >= 1 hit for DB, and # hits (URL + prep + ID) >= 1
@@ -350,6 +433,7 @@ class PMCScraper:
 
         return None
 
+    @PROFILER.timed("get_database_names")
     def get_database_names(self) -> str:
         """
         Get the database name from the associated accession IDs.
@@ -373,14 +457,23 @@ class PMCScraper:
 
         return None
 
+    @PROFILER.timed("sra_count")
     def get_number_of_records_sra(self) -> int:
         """
         Count the total number of INSDC Run records corresponding to all the
         accession numbers found in the paper.
 
+        By default, these are the SRA records found for every accession
+        number; with `count_runs`, the distinct runs listed in the RunInfo
+        tables of all the accession numbers are counted instead.
+
         Returns
         -------
         self.sra_records_count: `int`
+
+        Raises
+        ------
+        FetchError : if the records could not be searched for (or fetched)
         """
         if self.sra_records_count:
             return self.sra_records_count
@@ -392,30 +485,17 @@ class PMCScraper:
         if len(retrieved_accession_numbers) < 1:
             return 0
 
-        # Record count has not yet been processed
-        res_xmls = []
-        for n in retrieved_accession_numbers:
-            url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/" \
-                  "esearch.fcgi?db=sra&term={}".format(n)
-
-            for j in range(5):
-                try:
-                    res = requests.get(url)
-                    res.raise_for_status()
-                    break
-                except requests.exceptions.Timeout:
-                    sys.exit(
-                        f"Connection to {url} has timed out. "
-                        f"Please retry.")
-                except requests.exceptions.HTTPError:
-                    print(
-                        f"The download URL {url} is likely invalid.\n",
-                        flush=True,
-                    )
-                    continue
-            res_xmls.append(xmltodict.parse(res.content))
+        if self.count_runs:
+            self.sra_records_count = self._count_runs(
+                retrieved_accession_numbers
+            )
+            return self.sra_records_count
 
-        self.sra_record_xmls = res_xmls
+        # Record count has not yet been processed
+        if self.sra_record_xmls is None:
+            self.sra_record_xmls = [
+                self._search_sra(n) for n in retrieved_accession_numbers
+            ]
 
         total_count = 0
         for record in self.sra_record_xmls:
@@ -423,6 +503,39 @@ class PMCScraper:
         self.sra_records_count = total_count
         return self.sra_records_count
 
+    def _search_sra(self, accession: str) -> dict:
+        # the shared E-utilities client retries the failed requests
+        try:
+            content = get_client(self.email).post(
+                "esearch", {"db": "sra", "term": accession}
+            )
+        except EUtilsError as e:
+            raise FetchError(
+                f"SRA records of {accession} could not be searched for "
+                f"({e}). Please retry.") from e
+        try:
+            record = xmltodict.parse(content)
+            int(record["eSearchResult"]["Count"])
+        except (ExpatError, KeyError, TypeError, ValueError) as e:
+            raise FetchError(
+                f"SRA records of {accession} could not be searched for "
+                f"(invalid response: {e!r}). Please retry.") from e
+        return record
+
+    def _count_runs(self, accession_numbers: list) -> int:
+        # the runs are listed by the (compact) SRA RunInfo tables
+        try:
+            runinfo = get_runinfo_by_type(self.email, accession_numbers)
+        except RuntimeError as e:
+            raise FetchError(
+                f"Runs of the accession numbers of {self.pmc_id} could "
+                f"not be fetched ({e}). Please retry.") from e
+        if runinfo.failed:
+            raise FetchError(
+                f"Runs of the accession numbers of {self.pmc_id} could "
+                f"not be fetched ({runinfo.failed[0][1]}). Please retry.")
+        return len(runinfo)
+
     @staticmethod
     def _categorize_methods(words):
         amplicon_keywords = {"amplicon", "16s", "marker gene",
@@ -440,6 +553,7 @@ class PMCScraper:
             return "both_methods"
         return "no_method"
 
+    @PROFILER.timed("get_method_weights")
     def get_method_weights(self):
         self._parse_article_text()
 
@@ -488,14 +602,12 @@ class PMCScraper:
         `dict` providing total counts for each group category.
 
         """
-        sentences = [
-            [word.lower() for word in word_tokenize(sentence)]
-            for sentence in sent_tokenize(self.get_text())
-        ]
+        sentences = self.get_sentence_words()
         method_dict = dict(self._count_methods(sentences))
         self.method_dict = method_dict
         return
 
+    @PROFILER.timed("get_pcr_primers")
     def get_pcr_primers(self) -> list:
         """
         Get PCR primers.
@@ -512,6 +624,7 @@ class PMCScraper:
             res += re.findall(pcr_pattern, self.get_text())
         return ", ".join(res)
 
+    @PROFILER.timed("get_code_links")
     def get_code_links(self):
         url_list = re.findall(r"(https?://\S+)", str(self.get_text()))
         url_list = list(set([url.rstrip(",.;:)]") for url in url_list]))
@@ -553,10 +666,7 @@ class PMCScraper:
 
         # If no URLs are found while scraping
         if not url_list or len(token_list) == 0:
-            sentences = [
-                [word.lower() for word in word_tokenize(sentence)]
-                for sentence in sent_tokenize(self.get_text())
-            ]
+            sentences = self.get_sentence_words()
             repo_keywords = {"github", "zenodo", "bitbucket", "figshare",
                              "code ocean", "codeocean" "repository"}
             repo_match = [any(repo_keywords.intersection(words))
@@ -568,6 +678,25 @@ class PMCScraper:
         return code_dict
 
 
+SEQUENCE_COLUMNS = [
+    "PMC ID",
+    "Sequence Accessibility Badge",
+    "INSDC Accession Numbers",
+    "Sequence Database",
+    "Number of Sequence Records",
+    "Primer Sequences",
+    "Sequencing Method Probability",
+    "Includes Code Repository",
+    "Code URL",
+]
+JOURNAL_COLUMNS = [
+    "Publication Year",
+    "Journal Name",
+    "Publisher Name",
+    "First Author Affiliation",
+]
+
+
 def _check_input_file(inp_file):
     if Path(inp_file).is_file():
         id_df = pd.read_csv(inp_file, header=None)
@@ -579,12 +708,156 @@ def _check_input_file(inp_file):
         if id_df.shape[0] > 0:
             return id_df[id_df.columns[0]].tolist()
 
-        print(f"The provided file does not contain input IDs! Please check "
-              f"and try again: {inp_file}")
-        exit(1)
+        raise InputError(f"The provided file does not contain input IDs! "
+                         f"Please check and try again: {inp_file}")
+
+    raise InputError(f"The provided file path is not valid! Please check "
+                     f"and try again: {inp_file}")
+
+
+def assess_article(el: PMCScraper,
+                   include_journal_data: bool = False) -> dict:
+    """
+    Evaluate the reporting of the sequencing data of a single article.
+
+    Args
+    ------
+    el : scraper of an article (which is not blocked by its publisher)
+    include_journal_data : whether to include the journal columns
+
+    Returns
+    -------
+    row : `dict` with a value for every output column or None, if no
+        text was found for the article
+    """
+    pmc_id = el.pmc_id
+
+    try:
+        insdc_id_list = el.get_accession_numbers()
+        seq_db = el.get_database_names()
+    except NoJournalTextError:
+        return None
+    if insdc_id_list:
+        insdc_id_list = ", ".join(insdc_id_list)
+
+    try:
+        num_seqs = el.get_number_of_records_sra()
+    except FetchError as e:
+        # the rest of the article is assessed all the same
+        num_seqs, count_error = None, e
+    primer_seqs = el.get_pcr_primers()
+    method_prob = el.get_method_weights()
+    code_dict = el.get_code_links()
+
+    # Alternative check for non-INSDC database hit
+    if num_seqs == 0:
+        other_db = el.check_non_insdc_db()
+        seq_db = other_db
+
+    # Evaluate badge qualifications
+    output_badge = "None"
+    missing_steps = ""
+
+    # Records of the accession numbers could not be counted
+    if num_seqs is None:
+        missing_steps += "Sequence records of the INSDC accession " \
+                         f"numbers could not be counted ({count_error})! " \
+                         "May require manual review."
+
+    # Accession numbers found OR non-INSDC database hit
+    elif (num_seqs > 0) or (other_db):
+        output_badge = "Bronze"  # At minimum
+
+        if method_prob:
+            if (method_prob["amplicon"] > method_prob["shotgun"]) and not \
+                    primer_seqs:
+                missing_steps += "Primer sequences could not be found! " \
+                                 "May require manual review."
+            else:
+                output_badge = "Silver"
+
+                if code_dict["url"]:
+                    output_badge = "Gold"
+                else:
+                    missing_steps += "Link to code repository could not " \
+                                     "be found! May require manual " \
+                                     "review."
+
+        else:  # No methods to be found
+            missing_steps += "Text does not clearly denote whether an " \
+                             "amplicon or shotgun sequencing paper! May " \
+                             "require manual review."
+
+    else:
+        missing_steps += "INSDC accession numbers with corresponding Run " \
+                         "IDs could not be found! May require manual " \
+                         "review."
+
+    if missing_steps:
+        output_badge = f"{output_badge}: {missing_steps}"
+
+    row = {
+        "PMC ID": pmc_id,
+        "Sequence Accessibility Badge": output_badge,
+        "INSDC Accession Numbers": insdc_id_list,
+        "Sequence Database": seq_db,
+        "Number of Sequence Records": num_seqs,
+        "Primer Sequences": primer_seqs,
+        "Sequencing Method Probability": method_prob,
+        "Includes Code Repository": code_dict["has_link"],
+        "Code URL": code_dict["url"],
+    }
+    if include_journal_data:
+        row.update({
+            "Publication Year": el.get_publish_year(),
+            "Journal Name": el.get_journal_name(),
+            "Publisher Name": el.get_publisher_name(),
+            "First Author Affiliation": el.get_institution(),
+        })
+    return row
+
+
+def assess_articles(scrape_objects, include_journal_data: bool = False,
+                    blocked: list = None):
+    """
+    Evaluate the reporting of the sequencing data of articles, one by one.
+
+    Args
+    ------
+    scrape_objects : iterable of the article scrapers; articles are only
+        fetched once they are reached
+    include_journal_data : whether to include the journal columns
+    blocked : if provided, PMC IDs of the articles whose publisher does not
+        allow downloading of their full text are appended to it
+
+    Yields
+    ------
+    row : `dict` with a value for every output column, for every article
+        with some text
+    """
+    for el in scrape_objects:
+        if el.contains_blocking_comment():
+            if blocked is not None:
+                blocked.append(el.pmc_id)
+            continue
+        row = assess_article(el, include_journal_data)
+        # keep only the text of the articles when running out of memory
+        if MEMORY_BUDGET.approached():
+            el.release_xml()
+        if row is not None:
+            yield row
+
 
-    print(f"The provided file path is not valid! Please check and try "
-          f"again: {inp_file}")
+def assessments_to_df(rows, include_journal_data: bool = False):
+    """
+    Collect the article evaluations into a table indexed by the PMC IDs.
+    """
+    columns = SEQUENCE_COLUMNS
+    if include_journal_data:
+        columns = SEQUENCE_COLUMNS + JOURNAL_COLUMNS
+    with PROFILER.stage("rows"):
+        df = pd.DataFrame(list(rows), columns=columns)
+    return df.set_index("PMC ID", drop=True)
 
 
 def analyze_pdf(args,
@@ -597,174 +870,53 @@ def analyze_pdf(args,
     args
     pmc_ids: :list:
 
+    Raises
+    ------
+    InputError : if no PMC IDs were provided
+
     """
+    include_journal_data = bool(args and args.include_journal_data)
+    logger = set_up_logger("INFO", logger_name=__name__)
     if args:
         if args.pmc_list:
             pmc_ids = args.pmc_list
         elif args.pmc_input_file:
             pmc_ids = _check_input_file(args.pmc_input_file)
-            print("Input file has been found! Loading PMC IDs...")
+            logger.info("Input file has been found! Loading PMC IDs...")
         else:
-            print("Input PMC IDs must be provided via either the --pmc_list or "
-                  "--pmc_input_file flag! Please check your command "
-                  "and try again.")
-            exit(1)
+            raise InputError(
+                "Input PMC IDs must be provided via either the --pmc_list "
+                "or --pmc_input_file flag! Please check your command and "
+                "try again."
+            )
     if not pmc_ids:
-        print("No input PMC IDs have been detected! "
-              "Please check your command and try again.")
-        exit(1)
-
-    requested_objects = [PMCScraper(id) for id in pmc_ids]
-    scrape_objects = [
-        x for x in filter(lambda el: not el.contains_blocking_comment(),
-                          requested_objects)
-    ]
-    forbidden_objects = [
-        x for x in filter(lambda l: l.contains_blocking_comment(),
-                          requested_objects)
-    ]
+        raise InputError("No input PMC IDs have been detected! "
+                         "Please check your command and try again.")
+
+    email = getattr(args, "email", None)
+    count_runs = bool(getattr(args, "count_runs", False))
+    requested_objects = [PMCScraper(id, email, count_runs) for id in pmc_ids]
+    scrape_objects, forbidden_objects = [], []
+    for el in requested_objects:
+        if el.contains_blocking_comment():
+            forbidden_objects.append(el)
+        else:
+            scrape_objects.append(el)
+        # keep only the text of the articles when running out of memory
+        if MEMORY_BUDGET.approached():
+            el.release_xml()
     if len(forbidden_objects) > 0:
-        print(
+        logger.warning(
             "Papers represented by the following PMC IDs were not fetched; "
-            "the publisher of this article does not allow "
-            + "downloading of the full text in XML form:"
-        )
-        for el in forbidden_objects:
-            print(el.pmc_id)
-
-    df = pd.DataFrame(
-        {
-            "PMC ID": [],
-            "Sequence Accessibility Badge": [],
-            "INSDC Accession Numbers": [],
-            "Sequence Database": [],
-            "Number of Sequence Records": [],
-            "Primer Sequences": [],
-            "Sequencing Method Probability": [],
-            "Includes Code Repository": [],
-            "Code URL": []
-        }
-    )
-
-    if args and args.include_journal_data:
-        df = pd.DataFrame(
-            {
-                "PMC ID": [],
-                "Sequence Accessibility Badge": [],
-                "INSDC Accession Numbers": [],
-                "Sequence Database": [],
-                "Number of Sequence Records": [],
-                "Primer Sequences": [],
-                "Sequencing Method Probability": [],
-                "Includes Code Repository": [],
-                "Code URL": [],
-                "Publication Year": [],
-                "Journal Name": [],
-                "Publisher Name": [],
-                "First Author Affiliation": []
-            }
+            "the publisher of this article does not allow downloading of "
+            "the full text in XML form: "
+            + ", ".join(str(el.pmc_id) for el in forbidden_objects)
         )
 
-    for el in scrape_objects:
-        pmc_id = el.pmc_id
-
-        insdc_id_list = el.get_accession_numbers()
-        if insdc_id_list:
-            insdc_id_list = ", ".join(insdc_id_list)
-
-        try:
-            seq_db = el.get_database_names()
-        except NoJournalTextError:
-            continue
-
-        num_seqs = el.get_number_of_records_sra()
-        primer_seqs = el.get_pcr_primers()
-        method_prob = el.get_method_weights()
-        code_dict = el.get_code_links()
-        publish_year = el.get_publish_year()
-        journal_name = el.get_journal_name()
-        publisher_name = el.get_publisher_name()
-        institution = el.get_institution()
-
-        # Alternative check for non-INSDC database hit
-        if num_seqs == 0:
-            other_db = el.check_non_insdc_db()
-            seq_db = other_db
-
-        # Evaluate badge qualifications
-        output_badge = "None"
-        missing_steps = ""
-
-        # Accession numbers found OR non-INSDC database hit
-        if (num_seqs > 0) or (other_db):
-            output_badge = "Bronze"  # At minimum
-
-            if method_prob:
-                if (method_prob["amplicon"] > method_prob["shotgun"]) and not \
-                        primer_seqs:
-                    missing_steps += "Primer sequences could not be found! " \
-                                     "May require manual review."
-                else:
-                    output_badge = "Silver"
-
-                    if code_dict["url"]:
-                        output_badge = "Gold"
-                    else:
-                        missing_steps += "Link to code repository could not " \
-                                         "be found! May require manual " \
-                                         "review."
-
-            else:  # No methods to be found
-                missing_steps += "Text does not clearly denote whether an " \
-                                 "amplicon or shotgun sequencing paper! May " \
-                                 "require manual review."
-
-        else:
-            missing_steps += "INSDC accession numbers with corresponding Run " \
-                             "IDs could not be found! May require manual " \
-                             "review."
-
-        if missing_steps:
-            output_badge = f"{output_badge}: {missing_steps}"
-
-        tmp_df = pd.DataFrame(
-            {
-                "PMC ID": [pmc_id],
-                "Sequence Accessibility Badge": [output_badge],
-                "INSDC Accession Numbers":
-                    [insdc_id_list],
-                "Sequence Database": [seq_db],
-                "Number of Sequence Records": [num_seqs],
-                "Primer Sequences": [primer_seqs],
-                "Sequencing Method Probability": [method_prob],
-                "Includes Code Repository": [code_dict["has_link"]],
-                "Code URL": [code_dict["url"]]
-            }
-        )
-
-        if args and args.include_journal_data:
-            tmp_df = pd.DataFrame(
-                {
-                    "PMC ID": [pmc_id],
-                    "Sequence Accessibility Badge": [output_badge],
-                    "INSDC Accession Numbers":
-                        [insdc_id_list],
-                    "Sequence Database": [seq_db],
-                    "Number of Sequence Records": [num_seqs],
-                    "Primer Sequences": [primer_seqs],
-                    "Sequencing Method Probability": [method_prob],
-                    "Includes Code Repository": [code_dict["has_link"]],
-                    "Code URL": [code_dict["url"]],
-                    "Publication Year": [publish_year],
-                    "Journal Name": [journal_name],
-                    "Publisher Name": [publisher_name],
-                    "First Author Affiliation": [institution]
-                }
-            )
-
-        df = pd.concat([df, tmp_df])
-
-    return df.set_index("PMC ID", drop=True)
+    return assessments_to_df(
+        assess_articles(scrape_objects, include_journal_data),
+        include_journal_data
+    )
 
 
 class NoJournalTextError(AttributeError):
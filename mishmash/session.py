@@ -0,0 +1,225 @@
+"""
+Programmatic interface to the mishmash analyses
+"""
+
+import threading
+from typing import Iterator, Union
+
+import pandas as pd
+
+from .entrezpy_clients._cache import MetadataCache
+from .entrezpy_clients._client import EUtilsClient
+from .entrezpy_clients._utils import get_process_executor
+from .errors import InputError
+from .fetch_metadata import retrieve_metadata
+from .scrape_pdf import (
+    PMCScraper, _tokenizers, assess_articles, assessments_to_df
+)
+
+
+class Session:
+    """Runs the mishmash analyses from Python, keeping their state warm.
+
+    Unlike the command-line interface, a session takes plain arguments
+    (instead of parsed command-line options) and raises a `MishmashError`
+    (see `mishmash.errors`) instead of exiting on invalid input or when
+    nothing could be found. Everything that is expensive to set up is
+    kept between the calls: the E-utilities client and the HTTP sessions
+    (with their pools of open connections), the worker threads and
+    processes, the metadata cache, the NLTK tokenizer and the compiled
+    matchers of the detectors.
+
+    Every session has an E-utilities client (and a pool of open
+    connections) of its own, so sessions with different emails can run
+    side by side. The worker threads and processes are shared by the
+    whole process; pools of different sizes coexist. The E-utilities base
+    URL is set process-wide (see `set_eutils_url`) and taken over by the
+    client when it is created. Calls of a single session may be made from
+    different threads, one at a time.
+
+    Args:
+        email (str): User email required by NCBI (only needed to assess
+            metadata; sent along when counting the runs of the accession
+            IDs found in the articles, if provided).
+        n_jobs (int): Number of batches to fetch concurrently.
+        parse_jobs (int): Number of processes to parse the fetched
+            metadata in; if 0, it is parsed by the threads fetching it.
+        cache_file (str): Path to an SQLite file caching the metadata of
+            every fetched run (see `MetadataCache`).
+        cache_ttl (float): Number of days after which cached runs are
+            fetched again (by default, they never expire).
+
+    Attributes:
+        blocked (set): PMC IDs of the articles whose publisher does not
+            allow downloading of their full text; they are skipped by
+            `assess_sequences`.
+    """
+
+    def __init__(self, email: str = None, n_jobs: int = 1,
+                 parse_jobs: int = 0, cache_file: str = None,
+                 cache_ttl: float = None):
+        self.email = email
+        self.n_jobs = n_jobs
+        self.parse_jobs = parse_jobs
+        self.cache_file = cache_file
+        self.cache_ttl = cache_ttl
+        self.blocked = set()
+        self._cache = None
+        self._client = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Closes the metadata cache and the connections to NCBI."""
+        with self._lock:
+            if self._cache is not None:
+                self._cache.close()
+                self._cache = None
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    def _get_client(self) -> EUtilsClient:
+        if self._client is None:
+            self._client = EUtilsClient(self.email)
+        return self._client
+
+    def _get_cache(self) -> Union[MetadataCache, None]:
+        if self._cache is None and self.cache_file:
+            ttl = self.cache_ttl * 24 * 3600 \
+                if self.cache_ttl is not None else None
+            self._cache = MetadataCache(self.cache_file, ttl=ttl)
+        return self._cache
+
+    def preload(self):
+        """Sets up all the state of the analyses up front.
+
+        Otherwise, it is set up by the first call needing it: e.g., the
+        NLTK tokenizer is loaded (and downloaded, if not installed yet)
+        once the first article is assessed.
+        """
+        _tokenizers()
+        if self.parse_jobs:
+            get_process_executor(self.parse_jobs)
+        with self._lock:
+            self._get_client()
+            self._get_cache()
+
+    def iter_sequences(self, pmc_ids: list,
+                       include_journal_data: bool = False,
+                       count_runs: bool = False) -> Iterator[dict]:
+        """Assesses the reporting of the sequencing data of articles.
+
+        Articles are fetched and assessed one by one, as the results are
+        consumed.
+
+        Args:
+            pmc_ids (list): PubMed Central IDs of the articles.
+            include_journal_data (bool): Whether to include the journal
+                name, publisher, publication year and affiliation.
+            count_runs (bool): Whether to count the distinct runs of the
+                accession IDs found (see `PMCScraper`) instead of their
+                SRA records.
+
+        Returns:
+            Iterator[dict]: Values of the `assess_sequences` output
+                columns, for every article with some text (articles
+                blocked by their publishers are added to `blocked`).
+        Raises:
+            InputError: When no PMC IDs were provided.
+        """
+        if not pmc_ids:
+            raise InputError("No input PMC IDs have been provided!")
+        return self._iter_sequences(
+            list(pmc_ids), include_journal_data, count_runs
+        )
+
+    def _iter_sequences(self, pmc_ids: list, include_journal_data: bool,
+                        count_runs: bool):
+        with self._lock:
+            client = self._get_client()
+        blocked = []
+        try:
+            yield from assess_articles(
+                (PMCScraper(x, client, count_runs) for x in pmc_ids
+                 if x not in self.blocked),
+                include_journal_data, blocked
+            )
+        finally:
+            self.blocked.update(blocked)
+
+    def assess_sequences(self, pmc_ids: list,
+                         include_journal_data: bool = False,
+                         count_runs: bool = False) -> pd.DataFrame:
+        """Assesses the reporting of the sequencing data of articles.
+
+        Args:
+            pmc_ids (list): PubMed Central IDs of the articles.
+            include_journal_data (bool): Whether to include the journal
+                name, publisher, publication year and affiliation.
+            count_runs (bool): Whether to count the distinct runs of the
+                accession IDs found instead of their SRA records.
+
+        Returns:
+            pd.DataFrame: The `assess_sequences` output table, indexed by
+                the PMC IDs.
+        Raises:
+            InputError: When no PMC IDs were provided.
+        """
+        return assessments_to_df(
+            self.iter_sequences(pmc_ids, include_journal_data, count_runs),
+            include_journal_data
+        )
+
+    def assess_metadata(self, accessions: list = None, query: str = None,
+                        query_db: str = "biosample", layout: str = "wide",
+                        columns: Union[str, list] = None,
+                        levels: Union[str, list] = None,
+                        use_history: bool = False, runinfo: bool = False,
+                        runinfo_only: bool = False, refresh: bool = False):
+        """Fetches the metadata of the runs of accession IDs (or a query).
+
+        Args:
+            accessions (list): Accession IDs of any type (runs, studies,
+                BioProjects, BioSamples etc.).
+            query (str): Search query to find the runs by, if no
+                accession IDs are provided.
+            query_db (str): Database to run the query in ('biosample',
+                'bioproject' or 'sra').
+            layout (str): Layout of the metadata: 'wide', 'sparse' or
+                'long'.
+            columns (Union[str, list]): Output columns to keep.
+            levels (Union[str, list]): SRA levels to keep the metadata of.
+            use_history (bool): Whether to keep the search results on the
+                NCBI history server.
+            runinfo (bool): Whether to find the runs using SRA RunInfo.
+            runinfo_only (bool): Whether to return the RunInfo table of
+                the runs instead of their metadata.
+            refresh (bool): Whether to fetch (and cache) again the runs
+                which are already cached.
+
+        Returns:
+            Union[pd.DataFrame, LongMetadata]: The metadata table or, with
+                the long layout, an iterable of (ID, level, attribute,
+                value) records generated as they are consumed.
+        Raises:
+            InputError: When the email, the input or the requested columns
+                or levels are missing or invalid.
+            NoDataError: When no runs (or no metadata) could be found.
+        """
+        if not self.email:
+            raise InputError("An email is required to access the NCBI "
+                             "databases!")
+        with self._lock:
+            return retrieve_metadata(
+                self._get_client(), accessions, query, query_db,
+                n_jobs=self.n_jobs, parse_jobs=self.parse_jobs,
+                layout=layout, use_history=use_history, runinfo=runinfo,
+                runinfo_only=runinfo_only, columns=columns, levels=levels,
+                cache=self._get_cache(), refresh=refresh,
+            )
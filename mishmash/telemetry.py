@@ -0,0 +1,508 @@
+"""
+Run report and metrics collecting information about a single mishmash run
+"""
+
+import bisect
+import functools
+import json
+import math
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import nullcontext
+
+# upper bounds of the histogram buckets (in seconds)
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+# descriptions of the metrics recorded by mishmash
+METRIC_HELP = {
+    "mishmash_requests_total": "E-utilities requests sent.",
+    "mishmash_request_failures_total": "E-utilities requests which failed.",
+    "mishmash_retries_total": "E-utilities requests retried.",
+    "mishmash_response_bytes_total": "Bytes received from the E-utilities.",
+    "mishmash_request_seconds": "Duration of the E-utilities requests.",
+    "mishmash_parse_seconds": "Time spent parsing the responses.",
+    "mishmash_rows_total": "Rows (IDs, runs or records) produced by stage.",
+}
+
+
+def _labels_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: tuple, **extra) -> str:
+    labels = list(labels) + [(k, str(v)) for k, v in extra.items()]
+    if not labels:
+        return ""
+    escaped = (
+        (k, v.replace("\\", "\\\\").replace('"', '\\"')
+         .replace("\n", "\\n"))
+        for k, v in labels
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Distribution of observed values, counted in cumulative buckets."""
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list:
+        """Returns (upper bound, cumulative count) of every bucket."""
+        bounds = list(self.buckets) + [float("inf")]
+        totals, total = [], 0
+        for count in self.counts:
+            total += count
+            totals.append(total)
+        return list(zip(bounds, totals))
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count, "sum": self.sum,
+            "buckets": {_format_value(b): c for b, c in self.cumulative()},
+        }
+
+
+class Metrics:
+    """Counters and histograms of a run, optionally labelled.
+
+    Safe to be updated from several threads at once. The metrics can be
+    exported as a dictionary (included in the JSON run report) or in the
+    Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Increases a counter."""
+        key = _labels_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets: tuple = None,
+                **labels):
+        """Adds a value to a histogram."""
+        key = _labels_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram(buckets or DEFAULT_BUCKETS)
+            series[key].observe(value)
+
+    def value(self, name: str, **labels) -> float:
+        """Returns the current value of a counter (0 if never increased)."""
+        with self._lock:
+            return self._counters.get(name, {}).get(_labels_key(labels), 0)
+
+    def histogram(self, name: str, **labels) -> dict:
+        """Returns a histogram as a dictionary (empty if never observed)."""
+        with self._lock:
+            hist = self._histograms.get(name, {}).get(_labels_key(labels))
+            return hist.to_dict() if hist else {}
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def to_dict(self) -> dict:
+        """Returns all the metrics, with every series keyed by its labels."""
+        with self._lock:
+            metrics = {}
+            for name, series in sorted(self._counters.items()):
+                metrics[name] = {
+                    _format_labels(k) or "total": v for k, v in series.items()
+                }
+            for name, series in sorted(self._histograms.items()):
+                metrics[name] = {
+                    _format_labels(k) or "total": h.to_dict()
+                    for k, h in series.items()
+                }
+            return metrics
+
+    def to_prometheus(self) -> str:
+        """Returns the metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines += self._header(name, "counter")
+                for key, value in sorted(series.items()):
+                    lines.append(
+                        f"{name}{_format_labels(key)} {_format_value(value)}"
+                    )
+            for name, series in sorted(self._histograms.items()):
+                lines += self._header(name, "histogram")
+                for key, hist in sorted(series.items()):
+                    for bound, count in hist.cumulative():
+                        labels = _format_labels(key, le=_format_value(bound))
+                        lines.append(f"{name}_bucket{labels} {count}")
+                    labels = _format_labels(key)
+                    lines.append(f"{name}_sum{labels} {hist.sum!r}")
+                    lines.append(f"{name}_count{labels} {hist.count}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+    @staticmethod
+    def _header(name: str, metric_type: str) -> list:
+        lines = []
+        if name in METRIC_HELP:
+            lines.append(f"# HELP {name} {METRIC_HELP[name]}")
+        return lines + [f"# TYPE {name} {metric_type}"]
+
+    def write_prometheus(self, path: str):
+        """Saves the metrics to a Prometheus text file (e.g., for the
+        textfile collector of the node exporter)."""
+        with open(path, "w") as f:
+            f.write(self.to_prometheus())
+
+
+class RunReport:
+    """Collects information about a run, grouped into sections.
+
+    Every stage of a pipeline records its own section (e.g. the batch
+    sizes used to fetch the metadata); the whole report can be saved
+    as JSON at the end of the run, together with the `metrics` of the run.
+    """
+
+    def __init__(self):
+        self._sections = {}
+        self._lock = threading.Lock()
+        self.metrics = Metrics()
+
+    def record(self, section: str, **values):
+        """Adds values to a section, replacing any previous ones."""
+        with self._lock:
+            self._sections.setdefault(section, {}).update(values)
+
+    def get(self, section: str) -> dict:
+        with self._lock:
+            return dict(self._sections.get(section, {}))
+
+    def clear(self):
+        with self._lock:
+            self._sections.clear()
+        self.metrics.clear()
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            report = {k: dict(v) for k, v in self._sections.items()}
+        metrics = self.metrics.to_dict()
+        if metrics:
+            report["metrics"] = metrics
+        return report
+
+    def to_json(self, path: str):
+        """Saves the report to a JSON file."""
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+
+
+# report of the current run, shared by all the stages
+RUN_REPORT = RunReport()
+# metrics of the current run (part of the run report)
+METRICS = RUN_REPORT.metrics
+
+
+def _percentile(values: list, q: float) -> float:
+    # nearest-rank percentile of sorted values
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+
+class _Stage:
+    __slots__ = ("profiler", "name", "start", "mem_start", "mem_peak")
+
+    def __init__(self, profiler: "StageProfiler", name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        if self.profiler.memory:
+            self.profiler._memory_enter(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+        if self.profiler.memory:
+            self.profiler._memory_exit(self)
+        return False
+
+
+class StageProfiler:
+    """Wall-clock timings of the pipeline stages.
+
+    Stages are timed with the `stage` context manager or the `timed`
+    decorator; nothing is recorded (and hardly any overhead added) until
+    the profiler is enabled. Times of nested stages are also included in
+    the times of the enclosing ones.
+
+    With `memory` enabled, allocations are traced with tracemalloc and the
+    peak and retained memory of every stage are recorded as well: the peak
+    is the highest traced memory while the stage ran (above what was
+    allocated when it started), the retained memory is what it left
+    allocated when it finished. Stages running concurrently in several
+    threads share the same (process-wide) tracing, so their peaks overlap.
+    Whenever the traced memory reaches a new high at the end of a stage,
+    a snapshot is taken to find the top allocation sites.
+    """
+
+    # a new snapshot is only taken when the traced memory exceeds the one
+    # at the previous snapshot by this factor
+    SNAPSHOT_GROWTH = 1.1
+
+    def __init__(self):
+        self.enabled = False
+        self.memory = False
+        self._timings = {}
+        self._memory = {}
+        self._open = set()
+        self._snapshot = None
+        self._snapshot_size = 0
+        self._lock = threading.Lock()
+
+    def enable(self, memory: bool = False):
+        """Enables the profiler (and the memory tracing, if requested)."""
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.memory = self.memory or memory
+        self.enabled = True
+
+    def disable(self):
+        if self.memory:
+            tracemalloc.stop()
+        self.enabled = self.memory = False
+        with self._lock:
+            self._open.clear()
+
+    def _fold_peak(self, peak: int):
+        # every stage still open has seen the peak traced so far
+        for stage in self._open:
+            stage.mem_peak = max(stage.mem_peak, peak)
+        tracemalloc.reset_peak()
+
+    def _memory_enter(self, stage: _Stage):
+        with self._lock:
+            current, peak = tracemalloc.get_traced_memory()
+            self._fold_peak(peak)
+            stage.mem_start = stage.mem_peak = current
+            self._open.add(stage)
+
+    def _memory_exit(self, stage: _Stage):
+        with self._lock:
+            current, peak = tracemalloc.get_traced_memory()
+            self._fold_peak(peak)
+            self._open.discard(stage)
+            stats = self._memory.setdefault(
+                stage.name, {"calls": 0, "peak": 0, "retained": 0}
+            )
+            stats["calls"] += 1
+            stats["peak"] = max(stats["peak"],
+                                stage.mem_peak - stage.mem_start)
+            stats["retained"] += current - stage.mem_start
+            snapshot = current > self._snapshot_size * self.SNAPSHOT_GROWTH
+            if snapshot:
+                self._snapshot_size = current
+        if snapshot:
+            self._snapshot = tracemalloc.take_snapshot()
+
+    def stage(self, name: str):
+        """Returns a context manager timing a single call of a stage."""
+        if not self.enabled:
+            return nullcontext()
+        return _Stage(self, name)
+
+    def timed(self, name: str):
+        """Decorator timing every call of a function as a stage."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Stage(self, name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            self._timings.setdefault(name, []).append(seconds)
+
+    def clear(self):
+        with self._lock:
+            self._timings.clear()
+            self._memory.clear()
+            self._snapshot, self._snapshot_size = None, 0
+
+    def memory_summary(self) -> dict:
+        """Returns the number of calls, the highest peak and the total
+        retained memory (in bytes) of every stage."""
+        with self._lock:
+            return {k: dict(v) for k, v in self._memory.items()}
+
+    def top_allocations(self, limit: int = 10) -> list:
+        """Lists the sites which allocated most of the memory.
+
+        Taken from the snapshot at the highest traced memory.
+
+        Args:
+            limit (int): Number of sites to list.
+
+        Returns:
+            list: Site (file and line), size (in bytes) and number of
+                blocks allocated by each of the sites, the largest first.
+        """
+        if self._snapshot is None:
+            return []
+        snapshot = self._snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ])
+        return [
+            {"site": f"{stat.traceback[0].filename}:"
+                     f"{stat.traceback[0].lineno}",
+             "size": stat.size, "count": stat.count}
+            for stat in snapshot.statistics("lineno")[:limit]
+        ]
+
+    def format_memory_summary(self, limit: int = 10) -> str:
+        """Formats the memory summary and the top allocation sites."""
+        summary = sorted(self.memory_summary().items(),
+                         key=lambda x: x[1]["peak"], reverse=True)
+        width = max([len("stage")] + [len(name) for name, _ in summary])
+        lines = [f"{'stage':<{width}} {'peak (MB)':>10} "
+                 f"{'retained (MB)':>14} {'calls':>8}"]
+        for name, stats in summary:
+            lines.append(
+                f"{name:<{width}} {stats['peak'] / 2**20:>10.1f} "
+                f"{stats['retained'] / 2**20:>14.1f} {stats['calls']:>8}"
+            )
+        allocations = self.top_allocations(limit)
+        if allocations:
+            lines += ["", "Top allocation sites:"]
+            lines += [f"{x['size'] / 2**20:>10.1f} MB {x['site']}"
+                      for x in allocations]
+        return "\n".join(lines)
+
+    def summary(self) -> dict:
+        """Summarizes the timings of every stage.
+
+        Returns:
+            dict: Number of calls together with the total, median and 95th
+                percentile of their durations (in seconds), by stage.
+        """
+        with self._lock:
+            timings = {k: sorted(v) for k, v in self._timings.items()}
+        return {
+            name: {
+                "calls": len(values), "total": sum(values),
+                "p50": _percentile(values, 0.5),
+                "p95": _percentile(values, 0.95),
+            }
+            for name, values in timings.items()
+        }
+
+    def format_summary(self) -> str:
+        """Formats the summary as a table, the slowest stages first."""
+        summary = sorted(self.summary().items(),
+                         key=lambda x: x[1]["total"], reverse=True)
+        width = max([len("stage")] + [len(name) for name, _ in summary])
+        lines = [f"{'stage':<{width}} {'total (s)':>10} {'p50 (s)':>10} "
+                 f"{'p95 (s)':>10} {'calls':>8}"]
+        for name, stats in summary:
+            lines.append(
+                f"{name:<{width}} {stats['total']:>10.3f} "
+                f"{stats['p50']:>10.4f} {stats['p95']:>10.4f} "
+                f"{stats['calls']:>8}"
+            )
+        return "\n".join(lines)
+
+
+# stage timings of the current run (see the --profile option)
+PROFILER = StageProfiler()
+
+
+def _rss_bytes():
+    # resident set size of the process - what the OOM killer looks at
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class MemoryBudget:
+    """Soft limit on the memory used by the process.
+
+    The streaming stages check whether the budget is being `approached`
+    and, if so, flush what they hold or shrink their batches. The usage is
+    the resident set size of the process where it can be read (Linux);
+    elsewhere, memory allocations are traced with tracemalloc instead.
+
+    Attributes:
+        limit (int): The budget (in bytes); None if there is no budget.
+        threshold (float): Fraction of the budget at which it is
+            considered to be approached.
+        hits (int): Number of times the budget was found approached.
+        peak (int): The highest usage observed (in bytes).
+    """
+
+    def __init__(self, limit: int = None, threshold: float = 0.8):
+        self.threshold = threshold
+        self.hits = 0
+        self.peak = 0
+        self.set_limit(limit)
+
+    def set_limit(self, limit: int = None):
+        self.limit = limit
+        if limit is not None and _rss_bytes() is None \
+                and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def usage(self) -> int:
+        """Returns the memory currently used (in bytes)."""
+        rss = _rss_bytes()
+        if rss is None:
+            rss = tracemalloc.get_traced_memory()[0]
+        self.peak = max(self.peak, rss)
+        return rss
+
+    def approached(self) -> bool:
+        """Checks whether the usage is close to (or over) the budget."""
+        if self.limit is None:
+            return False
+        if self.usage() < self.threshold * self.limit:
+            return False
+        self.hits += 1
+        return True
+
+    def summary(self) -> dict:
+        """Summarizes the budget (for a run report)."""
+        return {"limit": self.limit, "threshold": self.threshold,
+                "hits": self.hits, "peak_usage": self.peak}
+
+
+# memory budget of the current run (see the --memory_budget option)
+MEMORY_BUDGET = MemoryBudget()
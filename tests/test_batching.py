@@ -0,0 +1,64 @@
+import unittest
+from unittest.mock import MagicMock
+
+from mishmash.entrezpy_clients._batching import AdaptiveBatchSizer
+
+
+class TestAdaptiveBatchSizer(unittest.TestCase):
+    def test_grows_for_small_fast_responses(self):
+        sizer = AdaptiveBatchSizer(initial=150, max_size=1000)
+        sizer.record_success(150, 150 * 1024, 1.5)
+        self.assertEqual(sizer.size, 300)
+        sizer.record_success(300, 300 * 1024, 3.0)
+        sizer.record_success(600, 600 * 1024, 6.0)
+        self.assertEqual(sizer.size, 1000)
+
+    def test_shrinks_for_large_responses(self):
+        sizer = AdaptiveBatchSizer(
+            initial=150, target_bytes=10 * 2**20, target_seconds=1000
+        )
+        # 200 KiB per run -> 51 runs fit into 10 MiB
+        sizer.record_success(150, 150 * 200 * 1024, 5.0)
+        self.assertEqual(sizer.size, 51)
+
+    def test_shrinks_for_slow_responses(self):
+        sizer = AdaptiveBatchSizer(initial=150, target_seconds=10)
+        sizer.record_success(150, 1024, 30.0)
+        self.assertEqual(sizer.size, 50)
+
+    def test_backs_off_on_failure(self):
+        sizer = AdaptiveBatchSizer(initial=150, min_size=50)
+        sizer.record_failure(150)
+        self.assertEqual(sizer.size, 75)
+        sizer.record_failure(75)
+        self.assertEqual(sizer.size, 50)
+
+    def test_shrinks_when_memory_budget_approached(self):
+        budget = MagicMock()
+        budget.approached.side_effect = [False, True]
+        sizer = AdaptiveBatchSizer(initial=100, memory_budget=budget)
+        sizer.record_success(100, 1024, 1.0)
+        self.assertEqual(sizer.size, 200)
+        sizer.record_success(200, 2048, 2.0)
+        self.assertEqual(sizer.size, 100)
+        self.assertEqual(sizer.summary()["memory_shrinks"], 1)
+
+    def test_summary(self):
+        sizer = AdaptiveBatchSizer(initial=100)
+        sizer.record_success(100, 1024, 1.0)
+        sizer.record_failure(200)
+        summary = sizer.summary()
+        self.assertEqual(summary["initial_size"], 100)
+        self.assertEqual(summary["final_size"], 100)
+        self.assertEqual(summary["min_size_used"], 100)
+        self.assertEqual(summary["max_size_used"], 200)
+        self.assertEqual(summary["batches"], 2)
+        self.assertEqual(summary["failed_batches"], 1)
+
+    def test_invalid_bounds(self):
+        with self.assertRaisesRegex(ValueError, "min_size"):
+            AdaptiveBatchSizer(initial=5, min_size=10)
+
+
+if __name__ == "__main__":
+    unittest.main()
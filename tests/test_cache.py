@@ -0,0 +1,112 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import pandas as pd
+
+from mishmash.entrezpy_clients._cache import MetadataCache
+from mishmash.entrezpy_clients._efetch import EFetchResult
+from mishmash.fetch_metadata import _fetch_run_metadata
+from tests.test_efetch import RUN_IDS, make_result
+
+
+class TestMetadataCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "cache.sqlite")
+        self.result = make_result(compact=True)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_store_and_load_roundtrip(self):
+        with MetadataCache(self.path) as cache:
+            self.assertEqual(cache.store(self.result.iter_run_records()), 3)
+        with MetadataCache(self.path) as cache:
+            records = cache.load(RUN_IDS + ["SRR9999999"])
+        self.assertSetEqual(set(records), set(RUN_IDS))
+
+        from_cache = EFetchResult.empty(compact=True)
+        from_cache.add_cached_records(records)
+        pd.testing.assert_frame_equal(
+            from_cache.metadata_to_df().loc[RUN_IDS],
+            self.result.metadata_to_df()
+        )
+
+    def test_parents_are_not_duplicated(self):
+        with MetadataCache(self.path) as cache:
+            cache.store(self.result.iter_run_records())
+            counts = {
+                level: cache.conn.execute(
+                    f"SELECT COUNT(*) FROM {level}"
+                ).fetchone()[0]
+                for level in ("run", "experiment", "sample", "study")
+            }
+        self.assertDictEqual(
+            counts, {"run": 3, "experiment": 2, "sample": 2, "study": 2}
+        )
+
+    def test_expired_runs_are_not_loaded(self):
+        with MetadataCache(self.path, ttl=3600) as cache:
+            cache.store(
+                self.result.iter_run_records(), fetched_at=time.time() - 7200
+            )
+            self.assertDictEqual(cache.load(RUN_IDS), {})
+            cache.store(self.result.iter_run_records())
+            self.assertEqual(len(cache.load(RUN_IDS)), 3)
+
+    def test_runs_with_missing_parents_are_not_loaded(self):
+        with MetadataCache(self.path) as cache:
+            cache.store(self.result.iter_run_records())
+            cache.conn.execute("DELETE FROM study WHERE id = 'SRP1000002'")
+            self.assertSetEqual(
+                set(cache.load(RUN_IDS)), {"SRR1000001", "SRR1000002"}
+            )
+
+
+class TestCachedFetch(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = MetadataCache(os.path.join(self.tmp.name, "c.sqlite"))
+        self.cache.store(
+            make_result(uids=RUN_IDS[:2], compact=True).iter_run_records()
+        )
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp.cleanup()
+
+    @patch("mishmash.fetch_metadata.fetch_run_metadata")
+    def test_only_missing_runs_are_fetched(self, mock_fetch):
+        mock_fetch.return_value = (
+            make_result(uids=RUN_IDS[2:], compact=True), []
+        )
+
+        result = _fetch_run_metadata("a@b.c", RUN_IDS, 1, self.cache)
+
+        self.assertListEqual(mock_fetch.call_args.args[1], RUN_IDS[2:])
+        pd.testing.assert_frame_equal(
+            result.metadata_to_df().loc[RUN_IDS],
+            make_result(compact=True).metadata_to_df()
+        )
+        self.assertEqual(len(self.cache.load(RUN_IDS)), 3)
+
+    @patch("mishmash.fetch_metadata.fetch_run_metadata")
+    def test_all_cached(self, mock_fetch):
+        result = _fetch_run_metadata("a@b.c", RUN_IDS[:2], 1, self.cache)
+        mock_fetch.assert_not_called()
+        self.assertListEqual(
+            result.metadata_to_df().index.tolist(), RUN_IDS[:2]
+        )
+
+    @patch("mishmash.fetch_metadata.fetch_run_metadata")
+    def test_refresh(self, mock_fetch):
+        mock_fetch.return_value = (make_result(compact=True), [])
+        _fetch_run_metadata("a@b.c", RUN_IDS, 1, self.cache, refresh=True)
+        self.assertListEqual(mock_fetch.call_args.args[1], RUN_IDS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from parameterized import parameterized
+
+from mishmash.cli import main
+
+HEAVY_MODULES = ("pandas", "nltk", "bs4", "entrezpy", "requests")
+
+
+class TestStartup(unittest.TestCase):
+    def loaded_modules(self, code):
+        # run in a fresh interpreter, reporting the modules on stderr
+        code += (
+            "\nimport sys"
+            f"\nprint(*(m for m in {HEAVY_MODULES!r} if m in sys.modules),"
+            " file=sys.stderr)"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True,
+            check=True,
+        )
+        return result.stderr.split()
+
+    @parameterized.expand([
+        ("import", "import mishmash.cli"),
+        ("package", "import mishmash"),
+        ("help", "import sys\nfrom mishmash.cli import main\n"
+                 "sys.argv = ['mishmash', 'assess_metadata', '--help']\n"
+                 "try:\n    main()\nexcept SystemExit:\n    pass"),
+    ])
+    def test_no_heavy_imports(self, name, code):
+        self.assertListEqual(self.loaded_modules(code), [])
+
+    def test_nltk_loaded_on_first_use(self):
+        self.assertNotIn(
+            "nltk", self.loaded_modules("from mishmash import PMCScraper")
+        )
+
+
+class TestErrors(unittest.TestCase):
+    @patch("sys.argv", ["mishmash", "assess_sequences"])
+    def test_error_printed_and_exits(self):
+        with patch("sys.stdout", new_callable=io.StringIO) as stdout, \
+                self.assertRaises(SystemExit) as cm:
+            main()
+        self.assertEqual(cm.exception.code, 1)
+        self.assertIn("--pmc_list", stdout.getvalue())
+
+
+class TestOverwrite(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.output_file = os.path.join(tmp.name, "output.csv")
+        open(self.output_file, "w").close()
+
+    def run_main(self, response):
+        argv = ["mishmash", "assess_sequences", "--pmc_list", "PMC1",
+                "--output_file", self.output_file]
+        with patch("sys.argv", argv), \
+                patch("builtins.input", return_value=response), \
+                patch("mishmash.cli.run_profiled") as run, \
+                patch("sys.stdout", new_callable=io.StringIO) as stdout:
+            run.return_value = MagicMock()
+            main()
+        return run, stdout.getvalue()
+
+    def test_declined_before_running(self):
+        run, stdout = self.run_main("n")
+        run.assert_not_called()
+        self.assertIn("Operation aborted by the user.", stdout)
+
+    def test_confirmed_runs_and_overwrites(self):
+        run, stdout = self.run_main("y")
+        run.assert_called_once()
+        run.return_value.to_csv.assert_called_once_with(self.output_file)
+        self.assertIn("Results saved to", stdout)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,252 @@
+import json
+import unittest
+from unittest.mock import patch
+from urllib.parse import parse_qs
+
+import responses
+from entrezpy.elink.elink_analyzer import ElinkAnalyzer
+from parameterized import parameterized
+
+from mishmash.entrezpy_clients import _client, _pipelines
+from mishmash.entrezpy_clients._client import (
+    EUTILS_URL, EUtilsClient, EUtilsError
+)
+from mishmash.entrezpy_clients._efetch import EFetchAnalyzer
+from mishmash.entrezpy_clients._esearch import ESearchAnalyzer
+from mishmash.entrezpy_clients._utils import RateLimiter
+from mishmash.telemetry import METRICS, PROFILER
+from tests.test_efetch import RUN_IDS, fpath
+
+EFETCH_URL = f"{EUTILS_URL}/efetch.fcgi"
+ESEARCH_URL = f"{EUTILS_URL}/esearch.fcgi"
+ELINK_URL = f"{EUTILS_URL}/elink.fcgi"
+
+
+def sent_params(call):
+    return {k: v[0] for k, v in parse_qs(call.request.body).items()}
+
+
+def esearch_body(count, ids, retstart=0, **extra):
+    return json.dumps({
+        "header": {"type": "esearch"},
+        "esearchresult": {
+            "count": str(count), "retmax": str(len(ids)),
+            "retstart": str(retstart), "idlist": ids,
+            "translationstack": [
+                {"term": "SRP1000001[All Fields]", "count": str(count)}
+            ],
+            **extra,
+        },
+    })
+
+
+class TestEUtilsClient(unittest.TestCase):
+    def setUp(self):
+        self.client = EUtilsClient(
+            "me@example.com", limiter=RateLimiter(1000), backoff=0
+        )
+        with open(fpath("data/sra_experiment_packages.xml")) as f:
+            self.xml = f.read()
+
+    def tearDown(self):
+        self.client.close()
+
+    @responses.activate
+    def test_efetch_paged_by_uids(self):
+        responses.post(EFETCH_URL, body=self.xml)
+        query = self.client.query("efetch")
+        analyzer = query.inquire(
+            {"db": "sra", "id": RUN_IDS, "rettype": "xml", "retmode": "xml",
+             "retmax": 3, "reqsize": 2},
+            EFetchAnalyzer("ERROR"),
+        )
+
+        self.assertEqual(len(responses.calls), 2)
+        params = [sent_params(call) for call in responses.calls]
+        self.assertListEqual(
+            [p["id"] for p in params], ["SRR1000001,SRR1000002", "SRR1000003"]
+        )
+        self.assertTrue(all("retmax" not in p for p in params))
+        self.assertEqual(params[0]["email"], "me@example.com")
+        self.assertEqual(params[0]["tool"], "mishmash")
+        self.assertListEqual(sorted(analyzer.result.runs), RUN_IDS)
+        self.assertEqual(
+            analyzer.response_bytes[query.id], 2 * len(self.xml.encode())
+        )
+
+    @responses.activate
+    def test_stages_profiled(self):
+        responses.post(EFETCH_URL, body=self.xml)
+        PROFILER.enable()
+        try:
+            self.client.inquire(
+                "efetch",
+                {"db": "sra", "id": RUN_IDS, "rettype": "xml",
+                 "retmode": "xml", "reqsize": 2},
+                EFetchAnalyzer("ERROR"),
+            )
+            obs = PROFILER.summary()
+        finally:
+            PROFILER.disable()
+            PROFILER.clear()
+        self.assertEqual(obs["efetch"]["calls"], 2)
+        self.assertEqual(obs["parse"]["calls"], 2)
+        self.assertNotIn("docsum", obs)
+
+    @responses.activate
+    def test_efetch_paged_by_retstart(self):
+        responses.post(EFETCH_URL, body=self.xml)
+        self.client.inquire(
+            "efetch",
+            {"db": "sra", "WebEnv": "MCID_1", "query_key": "1",
+             "rettype": "xml", "retmode": "xml", "retmax": 5, "reqsize": 2},
+            EFetchAnalyzer("ERROR"),
+        )
+        params = [sent_params(call) for call in responses.calls]
+        self.assertListEqual(
+            [(p["retstart"], p["retmax"]) for p in params],
+            [("0", "2"), ("2", "2"), ("4", "1")]
+        )
+        self.assertTrue(all(p["WebEnv"] == "MCID_1" for p in params))
+
+    @responses.activate
+    @patch.object(_client, "ESEARCH_REQSIZE", 2)
+    def test_esearch_collects_all_uids(self):
+        responses.post(ESEARCH_URL, body=esearch_body(3, ["1", "2"]))
+        responses.post(ESEARCH_URL, body=esearch_body(3, ["3"], retstart=2))
+        analyzer = self.client.inquire(
+            "esearch",
+            {"db": "sra", "term": "SRP1000001", "usehistory": False,
+             "rettype": "json"},
+            ESearchAnalyzer(["SRP1000001"]),
+        )
+        params = [sent_params(call) for call in responses.calls]
+        self.assertListEqual([p["retstart"] for p in params], ["0", "2"])
+        self.assertTrue(all(p["retmode"] == "json" for p in params))
+        self.assertTrue(all("usehistory" not in p for p in params))
+        self.assertListEqual(analyzer.result.uids, ["1", "2", "3"])
+        self.assertDictEqual(
+            analyzer.result.result.to_dict(), {"SRP1000001": 3}
+        )
+
+    @responses.activate
+    def test_esearch_history(self):
+        responses.post(
+            ESEARCH_URL,
+            body=esearch_body(42, [], webenv="MCID_1", querykey="1")
+        )
+        history = _pipelines._search_history(
+            self.client.query("esearch"), "sra", "SRP1000001"
+        )
+        self.assertEqual(len(responses.calls), 1)
+        params = sent_params(responses.calls[0])
+        self.assertEqual(params["usehistory"], "y")
+        self.assertEqual(params["retmax"], "0")
+        self.assertDictEqual(
+            history, {"WebEnv": "MCID_1", "query_key": 1, "count": 42}
+        )
+
+    @responses.activate
+    def test_elink_single_request(self):
+        responses.post(ELINK_URL, json={
+            "header": {"type": "elink"},
+            "linksets": [{
+                "dbfrom": "biosample", "ids": ["1", "2"],
+                "linksetdbs": [{"dbto": "sra", "linkname": "biosample_sra",
+                                "links": ["10", "11"]}],
+            }],
+        })
+        analyzer = self.client.inquire(
+            "elink",
+            {"db": "sra", "dbfrom": "biosample", "id": [1, 2], "link": False},
+            ElinkAnalyzer(),
+        )
+        self.assertEqual(len(responses.calls), 1)
+        params = sent_params(responses.calls[0])
+        self.assertEqual(params["id"], "1,2")
+        self.assertNotIn("link", params)
+        self.assertListEqual(
+            analyzer.result.get_link_parameter()["id"], [10, 11]
+        )
+
+    @responses.activate
+    def test_transient_errors_retried(self):
+        METRICS.clear()
+        responses.post(EFETCH_URL, status=429)
+        responses.post(EFETCH_URL, status=503)
+        responses.post(EFETCH_URL, body="<xml/>")
+        self.assertEqual(self.client.post("efetch", {"id": "1"}), b"<xml/>")
+        self.assertEqual(len(responses.calls), 3)
+        self.assertEqual(
+            METRICS.value("mishmash_requests_total", eutil="efetch"), 3
+        )
+        self.assertEqual(
+            METRICS.value("mishmash_retries_total", eutil="efetch"), 2
+        )
+        self.assertEqual(
+            METRICS.value("mishmash_response_bytes_total", eutil="efetch"), 6
+        )
+        self.assertEqual(METRICS.histogram(
+            "mishmash_request_seconds", eutil="efetch")["count"], 3
+        )
+
+    @parameterized.expand([(400, 1), (503, 4)])
+    @responses.activate
+    def test_failed_request_raises(self, status, n_calls):
+        responses.post(EFETCH_URL, status=status)
+        with self.assertRaisesRegex(EUtilsError, f"HTTP {status}"):
+            self.client.post("efetch", {"id": "1"})
+        self.assertEqual(len(responses.calls), n_calls)
+
+    @responses.activate
+    def test_error_response_raises(self):
+        responses.post(ESEARCH_URL, body=esearch_body(
+            0, [], ERROR="Invalid query"
+        ))
+        with self.assertRaises(RuntimeError):
+            _pipelines._run_query(
+                self.client.query("esearch"),
+                {"db": "sra", "term": "(", "rettype": "json"},
+                ESearchAnalyzer(None),
+            )
+
+    @responses.activate
+    def test_error_response_fails_only_its_batch(self):
+        responses.post(EFETCH_URL, body="<eFetchResult><ERROR>Invalid ID"
+                                        "</ERROR></eFetchResult>")
+        responses.post(EFETCH_URL, body=self.xml)
+        analyzer = EFetchAnalyzer("ERROR")
+        params = {"db": "sra", "rettype": "xml", "retmode": "xml"}
+        with self.assertRaisesRegex(EUtilsError, "error response"):
+            self.client.inquire("efetch", {**params, "id": ["SRR0"]},
+                                analyzer)
+
+        # the analyzer is shared by the next batch, whose response is valid
+        self.client.inquire("efetch", {**params, "id": RUN_IDS}, analyzer)
+        self.assertListEqual(sorted(analyzer.result.runs), RUN_IDS)
+
+
+class TestSharedClient(unittest.TestCase):
+    def tearDown(self):
+        _client._CLIENT = None
+
+    def test_queries_share_client(self):
+        queries = [
+            _pipelines._new_esearcher("me@example.com"),
+            _pipelines._new_elinker("me@example.com", "ERROR"),
+            _pipelines._new_efetcher("me@example.com", "ERROR"),
+        ]
+        self.assertEqual(len({id(q.client) for q in queries}), 1)
+        self.assertEqual(len({q.id for q in queries}), 3)
+        self.assertListEqual(
+            [q.eutil for q in queries], ["esearch", "elink", "efetch"]
+        )
+
+    def test_client_replaced_for_other_email(self):
+        client = _client.get_client("me@example.com")
+        self.assertIs(_client.get_client("me@example.com"), client)
+        self.assertIsNot(_client.get_client("you@example.com"), client)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,432 @@
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pandas as pd
+from parameterized import parameterized
+
+from mishmash.entrezpy_clients._efetch import (
+    EFetchAnalyzer, EFetchResult, parse_metadata_response
+)
+from mishmash.entrezpy_clients._projection import MetadataProjection
+from mishmash.entrezpy_clients._sra_compact import (
+    CompactSRABaseMeta, CompactSRARun
+)
+from mishmash.entrezpy_clients._sra_meta import (
+    META_DTYPES, META_REQUIRED_COLUMNS
+)
+from mishmash.entrezpy_clients._utils import rename_columns
+from mishmash.entrezpy_clients._writers import (
+    LONG_COLUMNS, LongMetadata, format_metadata
+)
+
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def fpath(fname):
+    return os.path.join(THIS_DIR, fname)
+
+
+RUN_IDS = ["SRR1000001", "SRR1000002", "SRR1000003"]
+
+
+def make_result(uids=None, xml_file="data/sra_experiment_packages.xml",
+                compact=False, projection=None):
+    uids = RUN_IDS if uids is None else uids
+    request = SimpleNamespace(
+        eutil="efetch.fcgi", query_id="test", db="sra",
+        rettype="xml", retmode="xml", uids=uids
+    )
+    result = EFetchResult(
+        None, request, "ERROR", compact=compact, projection=projection
+    )
+    with open(fpath(xml_file)) as f:
+        result.add_metadata(io.StringIO(f.read()), uids)
+    return result
+
+
+class TestMetadataToDf(unittest.TestCase):
+    def setUp(self):
+        self.result = make_result()
+
+    def test_metadata_to_df_index_and_columns(self):
+        df = self.result.metadata_to_df()
+        self.assertListEqual(df.index.tolist(), RUN_IDS)
+        self.assertEqual(df.index.name, "ID")
+        self.assertListEqual(
+            df.columns[:len(META_REQUIRED_COLUMNS)].tolist(),
+            META_REQUIRED_COLUMNS
+        )
+        extra = df.columns[len(META_REQUIRED_COLUMNS):].tolist()
+        self.assertListEqual(extra, sorted(extra))
+
+    def test_metadata_without_uids_includes_all_runs(self):
+        # records fetched from the history server come without any UIDs
+        df = make_result(uids=[]).metadata_to_df()
+        self.assertListEqual(df.index.tolist(), RUN_IDS)
+
+    def test_metadata_to_df_inherited_fields(self):
+        df = self.result.metadata_to_df()
+        self.assertEqual(df.loc["SRR1000002", "Experiment ID"], "SRX1000001")
+        self.assertEqual(df.loc["SRR1000002", "Bioproject ID"], "PRJNA1000001")
+        self.assertEqual(df.loc["SRR1000002", "Host Age [sample]"], "34")
+        self.assertEqual(df.loc["SRR1000002", "Lane [run]"], "2")
+        self.assertEqual(df.loc["SRR1000003", "Platform"], "OXFORD_NANOPORE")
+        self.assertEqual(df.loc["SRR1000003", "Avg Spot Len"], 5000)
+        self.assertTrue(pd.isna(df.loc["SRR1000003", "Funding [study]"]))
+
+    def test_metadata_to_df_dtypes(self):
+        df = self.result.metadata_to_df()
+        for col, dtype in META_DTYPES.items():
+            self.assertEqual(str(df[col].dtype), dtype, msg=col)
+        self.assertListEqual(
+            df["Public"].tolist(), [True, True, False]
+        )
+        self.assertListEqual(
+            df["Library Layout"].cat.categories.tolist(), ["PAIRED", "SINGLE"]
+        )
+
+    def test_metadata_to_df_matches_nested_generation(self):
+        nested = pd.concat([v.generate_meta() for v in
+                            self.result.studies.values()])
+        nested = nested.loc[nested.index.isin(self.result.runs.keys())]
+        nested = rename_columns(nested.dropna(axis=1, how="all").copy())
+
+        df = self.result.metadata_to_df()
+        self.assertSetEqual(set(df.columns), set(nested.columns))
+        for col in df.columns:
+            expected = nested[col].where(nested[col].notna(), None)
+            observed = df[col].where(df[col].notna(), None)
+            self.assertListEqual(
+                [str(x) for x in observed.tolist()],
+                [str(x if not isinstance(x, float) else int(x))
+                 for x in expected.tolist()],
+                msg=col
+            )
+
+
+class TestPackageProcessing(unittest.TestCase):
+    def test_pooled_samples_get_own_attributes(self):
+        result = make_result()
+        self.assertDictEqual(
+            result.samples["SRS1000002"].custom_meta,
+            {"depth [SAMPLE]": "10 cm"}
+        )
+        self.assertDictEqual(
+            result.samples["SRS1000003"].custom_meta,
+            {"depth [SAMPLE]": "20 cm", "ph [SAMPLE]": "6.5"}
+        )
+
+    def test_all_runs_of_experiment_extracted_at_once(self):
+        result = make_result()
+        self.assertListEqual(
+            [r.id for r in result.experiments["SRX1000001"].runs],
+            ["SRR1000001", "SRR1000002"]
+        )
+        self.assertListEqual(result.metadata, RUN_IDS)
+
+    @patch.object(EFetchResult, "_index_package",
+                  wraps=EFetchResult._index_package)
+    def test_every_package_indexed_once(self, mock_index):
+        make_result(uids=["SRR1000002", "SRR1000003", "SRR1000001"])
+        self.assertEqual(mock_index.call_count, 2)
+
+    def test_unrequested_runs_skipped(self):
+        result = make_result(uids=["SRR1000002"])
+        self.assertListEqual(list(result.runs), ["SRR1000002"])
+        self.assertListEqual(
+            result.metadata_to_df().index.tolist(), ["SRR1000002"]
+        )
+
+    def test_find_all_run_ids(self):
+        result = make_result()
+        packages = result.metadata_raw["EXPERIMENT_PACKAGE_SET"][
+            "EXPERIMENT_PACKAGE"
+        ]
+        self.assertDictEqual(
+            EFetchResult._find_all_run_ids(packages),
+            {"SRR1000001": 0, "SRR1000002": 0, "SRR1000003": 1}
+        )
+
+
+class TestExtractRunIds(unittest.TestCase):
+    def extract(self, content):
+        result = EFetchResult.empty("ERROR")
+        result.extract_run_ids(io.StringIO(content))
+        return result
+
+    def test_extract_run_ids(self):
+        with open(fpath("data/sra_docsums.xml")) as f:
+            result = self.extract(f.read())
+        self.assertListEqual(sorted(result.metadata), RUN_IDS)
+
+    def test_extract_run_ids_single_docsum(self):
+        result = self.extract(
+            "<eSummaryResult><DocSum><Id>1</Id>"
+            '<Item Name="Runs" Type="String">&lt;Run acc="SRR1000001"/&gt;'
+            "</Item></DocSum></eSummaryResult>"
+        )
+        self.assertListEqual(result.metadata, ["SRR1000001"])
+
+    def test_extract_run_ids_no_docsum(self):
+        with self.assertLogs("mishmash", level="ERROR"):
+            result = self.extract("<eSummaryResult></eSummaryResult>")
+        self.assertListEqual(result.metadata, [])
+
+
+class TestAttributeNormalisation(unittest.TestCase):
+    def setUp(self):
+        self.result = make_result(uids=[])
+
+    @parameterized.expand([
+        ([{"TAG": "b", "VALUE": "2"}, {"TAG": "a", "VALUE": "1"}],
+         {"b [SAMPLE]": "2", "a [SAMPLE]": "1"}),
+        ([{"TAG": "t", "VALUE": "z"}, {"TAG": "u", "VALUE": "1"},
+          {"TAG": "t", "VALUE": "x"}, {"TAG": "t", "VALUE": "y"}],
+         {"t_1 [SAMPLE]": "x", "t_2 [SAMPLE]": "y", "t_3 [SAMPLE]": "z",
+          "u [SAMPLE]": "1"}),
+        ({"TAG": "single", "VALUE": "v"}, {"single [SAMPLE]": "v"}),
+        ([{"TAG": "no_value"}, {"TAG": "t", "VALUE": None}],
+         {"t [SAMPLE]": None}),
+    ])
+    def test_custom_attributes_to_dict(self, attributes, expected):
+        self.assertDictEqual(
+            self.result._custom_attributes_to_dict(attributes, "SAMPLE"),
+            expected
+        )
+
+    def test_vocabulary_shared_within_result(self):
+        result = make_result(compact=True)
+        self.assertIn("host_diet_2 [SAMPLE]", result.vocabulary)
+        for objects in (result.studies, result.samples, result.runs):
+            for obj in objects.values():
+                self.assertIs(obj.vocabulary, result.vocabulary)
+
+        keys = [
+            next(k for k in s.get_custom_meta() if k.startswith("depth"))
+            for s in (result.samples["SRS1000002"],
+                      result.samples["SRS1000003"])
+        ]
+        self.assertIs(keys[0], keys[1])
+        self.assertEqual(
+            result.vocabulary.column("host_diet_2 [SAMPLE]"),
+            "Host Diet 2 [sample]"
+        )
+
+
+class TestProcessPoolParsing(unittest.TestCase):
+    @parameterized.expand([(True,), (False,)])
+    def test_records_roundtrip(self, compact):
+        result = make_result(compact=compact)
+        merged = EFetchResult.empty(compact=compact)
+        merged.merge_records(result.to_records())
+        pd.testing.assert_frame_equal(
+            merged.metadata_to_df(), result.metadata_to_df()
+        )
+        self.assertListEqual(merged.metadata, result.metadata)
+
+    def test_merge_keeps_parents_deduplicated(self):
+        merged = EFetchResult.empty(compact=True)
+        merged.merge_records(make_result(uids=["SRR1000001"]).to_records())
+        merged.merge_records(make_result(uids=["SRR1000002"]).to_records())
+        self.assertEqual(len(merged.studies), 1)
+        self.assertEqual(len(merged.samples), 1)
+        self.assertListEqual(
+            [r.id for r in merged.experiments["SRX1000001"].runs],
+            ["SRR1000001", "SRR1000002"]
+        )
+
+    def test_analyzer_parses_in_process_pool(self):
+        with open(fpath("data/sra_experiment_packages.xml")) as f:
+            xml = f.read()
+        with ProcessPoolExecutor(max_workers=2) as pool:
+            analyzer = EFetchAnalyzer("ERROR", compact=True, process_pool=pool)
+            for uids in (RUN_IDS[:1], RUN_IDS[1:]):
+                request = SimpleNamespace(
+                    eutil="efetch.fcgi", query_id="test", db="sra",
+                    rettype="xml", retmode="xml", uids=uids
+                )
+                analyzer.analyze_result(io.StringIO(xml), request)
+            self.assertEqual(len(analyzer.result.runs), 0)
+            analyzer.merge_parsed()
+
+        pd.testing.assert_frame_equal(
+            analyzer.result.metadata_to_df(),
+            make_result(compact=True).metadata_to_df()
+        )
+
+
+class TestProjection(unittest.TestCase):
+    COLUMNS = "Lane [run], Organism,Host Age [sample],Bases,Missing [run]"
+
+    @parameterized.expand([(True,), (False,)])
+    def test_columns_projection(self, compact):
+        projection = MetadataProjection.from_options(self.COLUMNS)
+        self.assertSetEqual(
+            set(projection.attribute_levels), {"run", "sample"}
+        )
+        result = make_result(compact=compact, projection=projection)
+
+        df = result.metadata_to_df()
+        self.assertListEqual(
+            df.columns.tolist(),
+            ["Lane [run]", "Organism", "Host Age [sample]", "Bases",
+             "Missing [run]"]
+        )
+        full = make_result(compact=compact).metadata_to_df()
+        pd.testing.assert_frame_equal(
+            df.drop(columns="Missing [run]"), full[df.columns[:-1]]
+        )
+        self.assertTrue(df["Missing [run]"].isna().all())
+
+    def test_unrequested_attributes_never_built(self):
+        projection = MetadataProjection.from_options(self.COLUMNS)
+        result = make_result(compact=True, projection=projection)
+        self.assertDictEqual(
+            result.samples["SRS1000003"].get_custom_meta(), {}
+        )
+        self.assertIn("host_age [SAMPLE]",
+                      result.samples["SRS1000001"].get_custom_meta())
+        for study in result.studies.values():
+            self.assertDictEqual(study.get_custom_meta(), {})
+        # study and experiment attributes were dropped during parsing
+        package = result.metadata_raw["EXPERIMENT_PACKAGE_SET"][
+            "EXPERIMENT_PACKAGE"][0]
+        self.assertNotIn("STUDY_ATTRIBUTES", package["STUDY"])
+        self.assertIn("SAMPLE_ATTRIBUTES", package["SAMPLE"])
+
+    def test_levels_projection(self):
+        projection = MetadataProjection.from_options(levels="run,experiment")
+        result = make_result(compact=True, projection=projection)
+        df = result.metadata_to_df()
+        self.assertIn("Lane [run]", df.columns)
+        self.assertIn("Library Layout", df.columns)
+        self.assertNotIn("Organism", df.columns)
+        self.assertFalse(any(c.endswith("[sample]") for c in df.columns))
+        self.assertTrue(all(
+            level in ("run", "experiment")
+            for _, level, _, _ in result.iter_long_records()
+        ))
+
+    def test_projection_in_worker(self):
+        projection = MetadataProjection.from_options(self.COLUMNS)
+        with open(fpath("data/sra_experiment_packages.xml")) as f:
+            records = parse_metadata_response(
+                f.read(), RUN_IDS, True, projection
+            )
+        merged = EFetchResult.empty(compact=True, projection=projection)
+        merged.merge_records(records)
+        pd.testing.assert_frame_equal(
+            merged.metadata_to_df(),
+            make_result(compact=True, projection=projection).metadata_to_df()
+        )
+
+    def test_from_options(self):
+        self.assertIsNone(MetadataProjection.from_options(None, ""))
+        with self.assertRaisesRegex(ValueError, "Unknown level"):
+            MetadataProjection.from_options(levels="run,package")
+        with self.assertRaisesRegex(
+            ValueError, r"Unknown column\(s\): Missing, Ph \[SAMPLE\] -"
+        ):
+            MetadataProjection.from_options("Organism,Missing,Ph [SAMPLE]")
+        projection = MetadataProjection.from_options(
+            "Sample Accession,Library Layout,Avg Spot Len,Ph [sample]"
+        )
+        self.assertEqual(projection.attribute_levels, {"sample"})
+
+
+class TestCompactModel(unittest.TestCase):
+    def test_compact_objects_have_no_dict(self):
+        result = make_result(compact=True)
+        for objects in (result.studies, result.samples,
+                        result.experiments, result.runs):
+            for obj in objects.values():
+                self.assertFalse(hasattr(obj, "__dict__"))
+
+    def test_compact_custom_meta(self):
+        result = make_result(compact=True)
+        self.assertDictEqual(
+            result.runs["SRR1000002"].get_custom_meta(),
+            {"lane [RUN]": "2"}
+        )
+        self.assertIsNone(result.studies["SRP1000002"].attr_keys)
+
+    def test_compact_base_is_abstract(self):
+        with self.assertRaises(TypeError):
+            CompactSRABaseMeta("SRR1")
+
+    def test_vocabulary_scoped_to_result(self):
+        first, second = make_result(compact=True), make_result(compact=True)
+        self.assertIsNot(first.vocabulary, second.vocabulary)
+        run = first.runs["SRR1000002"]
+        self.assertIs(run.vocabulary, first.vocabulary)
+        self.assertIsNot(
+            CompactSRARun("SRR1", spots=0).vocabulary,
+            CompactSRARun("SRR2", spots=0).vocabulary
+        )
+
+    def test_compact_metadata_to_df_identical(self):
+        pd.testing.assert_frame_equal(
+            make_result(compact=True).metadata_to_df(),
+            make_result(compact=False).metadata_to_df()
+        )
+
+
+class TestLayouts(unittest.TestCase):
+    def setUp(self):
+        self.result = make_result(compact=True)
+
+    def test_long_records_pivot_to_wide(self):
+        long_df = LongMetadata(self.result).to_df()
+        self.assertListEqual(long_df.columns.tolist(), LONG_COLUMNS)
+        self.assertSetEqual(
+            set(long_df["Level"].cat.categories),
+            {"run", "experiment", "sample", "study"}
+        )
+        pivoted = long_df.pivot(
+            index="ID", columns="Attribute", values="Value"
+        )
+        wide = self.result.metadata_to_df()
+        pivoted = pivoted.reindex(index=wide.index, columns=wide.columns)
+        pd.testing.assert_frame_equal(
+            pivoted.astype(str), wide.astype(str), check_names=False
+        )
+
+    def test_long_records_levels(self):
+        records = list(LongMetadata(self.result))
+        self.assertIn(
+            ("SRR1000001", "sample", "Host Age [sample]", "34"), records
+        )
+        self.assertIn(
+            ("SRR1000001", "experiment", "Library Layout", "PAIRED"), records
+        )
+        self.assertIn(("SRR1000003", "run", "Public", False), records)
+
+    def test_long_to_csv_streams_rows(self):
+        buffer = io.StringIO()
+        LongMetadata(self.result).to_csv(buffer)
+        lines = buffer.getvalue().splitlines()
+        self.assertEqual(lines[0], ",".join(LONG_COLUMNS))
+        self.assertEqual(len(lines) - 1, len(list(LongMetadata(self.result))))
+
+    def test_sparse_layout(self):
+        sparse = format_metadata(self.result, "sparse")
+        self.assertIsInstance(sparse["Host Age [sample]"].dtype,
+                              pd.SparseDtype)
+        self.assertNotIsInstance(sparse["Organism"].dtype, pd.SparseDtype)
+        dense = sparse.astype(object)
+        pd.testing.assert_frame_equal(
+            dense.astype(str), self.result.metadata_to_df().astype(str)
+        )
+
+    def test_unknown_layout(self):
+        with self.assertRaisesRegex(ValueError, "Unknown layout"):
+            format_metadata(self.result, "tall")
+
+
+if __name__ == "__main__":
+    unittest.main()
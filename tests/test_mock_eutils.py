@@ -0,0 +1,143 @@
+import os
+import time
+import unittest
+from unittest.mock import patch
+
+from mishmash.entrezpy_clients import _client, _pipelines
+from mishmash.entrezpy_clients._client import (
+    EUTILS_URL, EUtilsClient, EUtilsError, eutils_url, set_eutils_url
+)
+from mishmash.entrezpy_clients._efetch import EFetchAnalyzer
+from mishmash.entrezpy_clients._utils import RateLimiter
+from mishmash.mock_eutils import MockEUtilsData, MockEUtilsServer
+from mishmash.scrape_pdf import PMCScraper
+from tests.test_efetch import RUN_IDS, fpath
+
+
+def make_data():
+    data = MockEUtilsData()
+    with open(fpath("data/sra_experiment_packages.xml")) as f:
+        data.add_package_set(f.read())
+    with open(fpath("data/sra_docsums.xml")) as f:
+        data.add_docsums(f.read())
+    with open(fpath("data/test_sample_1.xml")) as f:
+        data.add_article("PMC1000001", f.read())
+    data.add_search("biosample", "SAMN1000001", ["501"])
+    data.add_link("biosample", "501", ["1000001"])
+    return data
+
+
+class TestEUtilsUrl(unittest.TestCase):
+    def tearDown(self):
+        set_eutils_url(None)
+
+    def test_default(self):
+        self.assertEqual(eutils_url(), EUTILS_URL)
+
+    @patch.dict(os.environ, {"MISHMASH_EUTILS_URL": "http://env/eutils/"})
+    def test_set_url_overrides_environment(self):
+        self.assertEqual(eutils_url(), "http://env/eutils")
+        set_eutils_url("http://local/eutils")
+        self.assertEqual(eutils_url(), "http://local/eutils")
+        self.assertEqual(
+            EUtilsClient("me@example.com").base_url, "http://local/eutils"
+        )
+
+
+class TestMockEUtilsServer(unittest.TestCase):
+    def setUp(self):
+        self.server = MockEUtilsServer(make_data()).start()
+        set_eutils_url(self.server.url)
+        self.client = EUtilsClient(
+            "me@example.com", limiter=RateLimiter(1000), backoff=0,
+            timeout=1
+        )
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+        set_eutils_url(None)
+        _client._CLIENT = None
+
+    def fetch_metadata(self, ids):
+        return self.client.inquire(
+            "efetch",
+            {"db": "sra", "id": ids, "rettype": "xml", "retmode": "xml"},
+            EFetchAnalyzer("ERROR"),
+        ).result
+
+    def test_efetch_metadata(self):
+        result = self.fetch_metadata(RUN_IDS)
+        self.assertListEqual(sorted(result.runs), RUN_IDS)
+        self.assertEqual(self.server.stats["efetch"], 1)
+
+    def test_run_ids_from_study(self):
+        run_ids = _pipelines.get_run_ids_by_type(
+            "me@example.com", ["SRP1000001"]
+        )
+        self.assertListEqual(run_ids, RUN_IDS)
+        self.assertEqual(self.server.stats["esearch"], 1)
+
+    def test_run_ids_from_biosample(self):
+        run_ids = _pipelines.get_run_ids_by_type(
+            "me@example.com", ["SAMN1000001"]
+        )
+        self.assertListEqual(run_ids, RUN_IDS[:2])
+        self.assertEqual(self.server.stats["elink"], 1)
+
+    def test_run_ids_from_history(self):
+        run_ids = _pipelines.get_run_ids_by_type(
+            "me@example.com", ["SAMN1000001", "SRP1000001"],
+            use_history=True
+        )
+        self.assertListEqual(run_ids, RUN_IDS)
+
+    def test_pmc_scraper(self):
+        scraper = PMCScraper("PMC1000001")
+        self.assertTrue(scraper.contains_blocking_comment())
+        with patch.object(scraper, "get_accession_numbers",
+                          return_value=["SRP1000001", "SRR1000003"]):
+            self.assertEqual(scraper.get_number_of_records_sra(), 3)
+        self.assertEqual(self.server.stats["efetch"], 1)
+        self.assertEqual(self.server.stats["esearch"], 2)
+
+    def test_pmc_scraper_counting_runs(self):
+        scraper = PMCScraper("PMC1000001", count_runs=True)
+        with patch.object(scraper, "get_accession_numbers",
+                          return_value=["SRP1000001", "SRR1000003"]):
+            self.assertEqual(scraper.get_number_of_records_sra(), 3)
+        # the RunInfo tables of the study and of the run
+        self.assertEqual(self.server.stats["efetch"], 2)
+        # only the study needs to be searched for
+        self.assertEqual(self.server.stats["esearch"], 1)
+
+    def test_rate_limited_requests_retried(self):
+        self.server.rate_limit = 1
+        with patch.object(self.client, "_retry_delay", return_value=1.0):
+            self.fetch_metadata(RUN_IDS[:1])
+            self.fetch_metadata(RUN_IDS[1:])
+        self.assertEqual(self.server.stats["rate_limited"], 1)
+        self.assertEqual(self.server.stats["efetch"], 3)
+
+    def test_truncated_responses_retried(self):
+        self.server.truncate_rate = 1.0
+        with self.assertRaisesRegex(EUtilsError, "ChunkedEncodingError"):
+            self.client.post("efetch", {"db": "sra", "id": RUN_IDS[0]})
+        self.assertEqual(self.server.stats["truncated"], 4)
+
+    def test_timeouts_retried(self):
+        self.server.timeout_rate, self.server.stall = 1.0, 1.5
+        self.client.max_retries = 1
+        with self.assertRaisesRegex(EUtilsError, "Timeout"):
+            self.client.post("efetch", {"db": "sra", "id": RUN_IDS[0]})
+        self.assertEqual(self.server.stats["timeout"], 2)
+
+    def test_latency(self):
+        self.server.latency = 0.2
+        start = time.perf_counter()
+        self.fetch_metadata(RUN_IDS)
+        self.assertGreaterEqual(time.perf_counter() - start, 0.2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,421 @@
+import unittest
+from concurrent.futures import Future
+from unittest.mock import MagicMock, patch
+from xml.parsers.expat import ExpatError
+
+from parameterized import parameterized
+
+from mishmash.entrezpy_clients import _pipelines
+from mishmash.entrezpy_clients._batching import AdaptiveBatchSizer
+from mishmash.entrezpy_clients._client import EUtilsError
+from mishmash.entrezpy_clients._pipelines import (
+    _fetch_metadata_batch, _get_run_ids, _link_and_fetch_run_ids,
+    _link_history, _search_history, _search_history_chunks, _search_uids,
+    fetch_run_metadata, get_run_ids_by_type, get_sra_history
+)
+from mishmash.entrezpy_clients._utils import (
+    classify_accessions, get_executor
+)
+
+
+class TestAccessionRouting(unittest.TestCase):
+    @parameterized.expand(
+        [
+            (["SRR123456", "ERR123456", "DRR123456"],
+             {"run": ["SRR123456", "ERR123456", "DRR123456"]}),
+            (["PRJNA607574", "PRJEB1234"],
+             {"bioproject": ["PRJNA607574", "PRJEB1234"]}),
+            (["SAMN00000001", "SAMEA1234567", "SRS123456"],
+             {"biosample": ["SAMN00000001", "SAMEA1234567"],
+              "sample": ["SRS123456"]}),
+            (["SRP123456", "SRX123456", "SRX123456", "GSE1234"],
+             {"study": ["SRP123456"], "experiment": ["SRX123456"],
+              "other": ["GSE1234"]}),
+        ]
+    )
+    def test_classify_accessions(self, ids, expected):
+        self.assertDictEqual(classify_accessions(ids), expected)
+
+    @patch("mishmash.entrezpy_clients._pipelines._get_run_ids")
+    def test_get_run_ids_by_type_mixed(self, mock_get):
+        mock_get.side_effect = lambda email, ids, query, source, *args: {
+            "bioproject": ["SRR000003", "SRR000004"],
+            "biosample": ["SRR000005"],
+            "": ["SRR000001", "SRR000006"],
+        }[source]
+
+        obs = get_run_ids_by_type(
+            "a@b.c",
+            ["SRR000001", "PRJNA1", "SAMN00000001", "SRP000001", "SRX000001"]
+        )
+
+        self.assertListEqual(
+            obs, ["SRR000001", "SRR000003", "SRR000004",
+                  "SRR000005", "SRR000006"]
+        )
+        self.assertListEqual(
+            [(c.args[1], c.args[3]) for c in mock_get.call_args_list],
+            [(["PRJNA1"], "bioproject"), (["SAMN00000001"], "biosample"),
+             (["SRP000001", "SRX000001"], "")]
+        )
+
+    @patch("mishmash.entrezpy_clients._pipelines._get_run_ids")
+    def test_get_run_ids_by_type_runs_only(self, mock_get):
+        obs = get_run_ids_by_type("a@b.c", ["SRR000002", "SRR000001"])
+        self.assertListEqual(obs, ["SRR000001", "SRR000002"])
+        mock_get.assert_not_called()
+
+
+class TestChunkedSearch(unittest.TestCase):
+    @staticmethod
+    def fake_search(esearcher, db, ids, query):
+        if "BAD1" in ids:
+            raise RuntimeError("request failed")
+        # neighbouring chunks share some of the UIDs
+        return [f"uid{_id[-2:]}" for _id in ids] + ["shared"]
+
+    @patch.object(_pipelines, "ESEARCH_BATCH_SIZE", 3)
+    @patch("mishmash.entrezpy_clients._pipelines._new_esearcher")
+    @patch("mishmash.entrezpy_clients._pipelines._esearch_chunk")
+    def test_search_uids_chunks_and_failures(self, mock_search, _):
+        mock_search.side_effect = self.fake_search
+        ids = ["ID01", "ID02", "ID03", "ID04", "BAD1", "ID06", "ID07"]
+
+        with self.assertLogs(_pipelines.__name__, level="ERROR") as logs:
+            uids, failed = _search_uids("a@b.c", "sra", ids, None, n_jobs=3)
+
+        self.assertEqual(mock_search.call_count, 3)
+        self.assertListEqual(
+            sorted(uids), ["shared", "uid01", "uid02", "uid03", "uid07"]
+        )
+        self.assertListEqual(
+            failed, [(["ID04", "BAD1", "ID06"], "request failed")]
+        )
+        self.assertIn("ID04, BAD1, ID06", logs.output[0])
+
+    @patch("mishmash.entrezpy_clients._pipelines._new_esearcher")
+    @patch("mishmash.entrezpy_clients._pipelines._esearch_chunk")
+    def test_search_uids_query(self, mock_search, mock_esearcher):
+        mock_search.return_value = ["1", "2", "2"]
+        uids, failed = _search_uids("a@b.c", "biosample", None, "q[Filter]")
+        mock_search.assert_called_once_with(
+            mock_esearcher.return_value, "biosample", None, "q[Filter]"
+        )
+        self.assertListEqual(uids, ["1", "2"])
+        self.assertListEqual(failed, [])
+
+    @patch.object(_pipelines, "ESEARCH_BATCH_SIZE", 2)
+    @patch("mishmash.entrezpy_clients._pipelines._new_esearcher")
+    @patch("mishmash.entrezpy_clients._pipelines._esearch_chunk")
+    def test_pool_of_another_size_requested_meanwhile(self, mock_search, _):
+        def fake_search(esearcher, db, ids, query):
+            # e.g. another query running with a different n_jobs
+            get_executor(3).submit(lambda: None).result()
+            return ids
+        mock_search.side_effect = fake_search
+        ids = [f"ID{i}" for i in range(20)]
+
+        uids, failed = _search_uids("a@b.c", "sra", ids, None, n_jobs=2)
+
+        self.assertListEqual(sorted(uids), sorted(ids))
+        self.assertListEqual(failed, [])
+        self.assertIsNot(get_executor(2), get_executor(3))
+        self.assertIs(get_executor(2), get_executor(2))
+
+
+class TestLinkAndFetch(unittest.TestCase):
+    def test_link_and_fetch_fetches_all_linked_uids(self):
+        elinker, efetcher = MagicMock(), MagicMock()
+        elinker.inquire.return_value.result.get_link_parameter.return_value = \
+            {"db": "sra", "id": [str(x) for x in range(1200)]}
+        efetcher.inquire.return_value.result.metadata = ["SRR1", "SRR2"]
+
+        obs = _link_and_fetch_run_ids(
+            elinker, efetcher, "bioproject", "ERROR", ["1", "2"]
+        )
+
+        self.assertListEqual(obs, ["SRR1", "SRR2"])
+        params = efetcher.inquire.call_args.args[0]
+        self.assertEqual(params["retmax"], 1200)
+        self.assertEqual(params["rettype"], "docsum")
+
+    def test_link_and_fetch_nothing_linked(self):
+        elinker, efetcher = MagicMock(), MagicMock()
+        elinker.inquire.return_value.result.get_link_parameter.return_value = \
+            None
+        obs = _link_and_fetch_run_ids(
+            elinker, efetcher, "bioproject", "ERROR", ["1"]
+        )
+        self.assertListEqual(obs, [])
+        efetcher.inquire.assert_not_called()
+
+    def test_link_and_fetch_failure(self):
+        elinker = MagicMock()
+        elinker.inquire.side_effect = SystemExit("HTTP 400")
+        with self.assertRaisesRegex(RuntimeError, "aborted"):
+            _link_and_fetch_run_ids(
+                elinker, MagicMock(), "bioproject", "ERROR", ["1"]
+            )
+
+    @patch.object(_pipelines, "BATCH_SIZE", 2)
+    @patch("mishmash.entrezpy_clients._pipelines._new_efetcher")
+    @patch("mishmash.entrezpy_clients._pipelines._new_elinker")
+    @patch("mishmash.entrezpy_clients._pipelines._link_and_fetch_run_ids")
+    @patch("mishmash.entrezpy_clients._pipelines._search_uids")
+    def test_get_run_ids_batches(self, mock_search, mock_link, *_):
+        mock_search.return_value = (["1", "2", "3", "4", "5"], [])
+
+        def fake_link(elinker, efetcher, db, log_level, uids):
+            if "3" in uids:
+                raise RuntimeError("request failed")
+            return [f"SRR{x}" for x in uids] + ["SRR1"]
+        mock_link.side_effect = fake_link
+
+        with self.assertLogs(_pipelines.__name__, level="ERROR") as logs:
+            obs = _get_run_ids(
+                "a@b.c", ["PRJNA1"], None, "bioproject", n_jobs=3
+            )
+
+        self.assertListEqual(obs, ["SRR1", "SRR2", "SRR5"])
+        self.assertEqual(mock_link.call_count, 3)
+        self.assertIn("3, 4", logs.output[0])
+
+    @patch("mishmash.entrezpy_clients._pipelines._search_uids")
+    def test_get_run_ids_not_found(self, mock_search):
+        mock_search.return_value = ([], [])
+
+        with self.assertLogs(_pipelines.__name__, level="WARNING") as logs:
+            obs = _get_run_ids(
+                "a@b.c", ["PRJNA1"], None, "bioproject", log_level="WARNING"
+            )
+
+        self.assertListEqual(obs, [])
+        self.assertIn("could be found", logs.output[0])
+        self.assertIn("PRJNA1", logs.output[0])
+
+
+class TestHistoryServer(unittest.TestCase):
+    @staticmethod
+    def make_esearcher(count, webenv="WE1", query_key=1):
+        esearcher = MagicMock()
+        result = esearcher.inquire.return_value.result
+        result.count = count
+        result.get_link_parameter.return_value = {
+            "db": "sra", "WebEnv": webenv, "query_key": query_key,
+            "retmax": count
+        }
+        return esearcher
+
+    def test_search_history(self):
+        esearcher = self.make_esearcher(250000)
+        obs = _search_history(esearcher, "biosample", "gut[Filter]")
+        self.assertDictEqual(
+            obs, {"WebEnv": "WE1", "query_key": 1, "count": 250000}
+        )
+        params = esearcher.inquire.call_args.args[0]
+        self.assertTrue(params["usehistory"])
+        self.assertEqual(params["retmax"], 0)
+        self.assertNotIn("WebEnv", params)
+
+    def test_search_history_nothing_found(self):
+        self.assertIsNone(
+            _search_history(self.make_esearcher(0), "sra", "nothing")
+        )
+
+    @parameterized.expand([
+        ({"db": "sra", "WebEnv": "WE1", "query_key": 2}, "#2"),
+        ({"db": "sra", "WebEnv": "WE1", "term": "#2 OR #3"}, "#2 OR #3"),
+    ])
+    def test_link_history(self, link_params, exp_term):
+        elinker = MagicMock()
+        elinker.inquire.return_value.result.get_link_parameter.return_value = \
+            link_params
+        esearcher = self.make_esearcher(1200, query_key=4)
+
+        obs = _link_history(
+            elinker, esearcher, "biosample",
+            {"WebEnv": "WE1", "query_key": 1, "count": 10}
+        )
+
+        self.assertDictEqual(
+            obs, {"WebEnv": "WE1", "query_key": 4, "count": 1200}
+        )
+        link_params = elinker.inquire.call_args.args[0]
+        self.assertEqual(link_params["cmd"], "neighbor_history")
+        self.assertEqual(link_params["query_key"], 1)
+        search_params = esearcher.inquire.call_args.args[0]
+        self.assertEqual(search_params["term"], exp_term)
+        self.assertEqual(search_params["WebEnv"], "WE1")
+
+    @patch("mishmash.entrezpy_clients._pipelines._new_elinker")
+    @patch("mishmash.entrezpy_clients._pipelines._link_history")
+    @patch("mishmash.entrezpy_clients._pipelines._search_history")
+    @patch("mishmash.entrezpy_clients._pipelines._new_esearcher")
+    def test_get_sra_history_sra_ids_not_linked(
+            self, _, mock_search, mock_link, __
+    ):
+        mock_search.return_value = {"WebEnv": "WE1", "query_key": 1,
+                                    "count": 2}
+        obs = get_sra_history("a@b.c", ["SRP1", "SRX1"], None, "")
+        self.assertEqual(obs, mock_search.return_value)
+        self.assertEqual(
+            mock_search.call_args.args[1:], ("sra", "SRP1 OR SRX1")
+        )
+        mock_link.assert_not_called()
+
+    @patch.object(_pipelines, "ESEARCH_BATCH_SIZE", 2)
+    def test_search_history_chunks(self):
+        esearcher = MagicMock()
+        results = []
+        for count, query_key in ((2, 1), (0, None), (1, 2), (3, 3)):
+            result = MagicMock(count=count)
+            result.get_link_parameter.return_value = {
+                "WebEnv": "WE1", "query_key": query_key
+            }
+            results.append(MagicMock(result=result))
+        esearcher.inquire.side_effect = results
+
+        obs = _search_history_chunks(
+            esearcher, "sra", ["SRP1", "SRP2", "SRP3", "SRP4", "SRP5"]
+        )
+
+        self.assertDictEqual(
+            obs, {"WebEnv": "WE1", "query_key": 3, "count": 3}
+        )
+        params = [x.args[0] for x in esearcher.inquire.call_args_list]
+        self.assertListEqual(
+            [x["term"] for x in params],
+            ["SRP1 OR SRP2", "SRP3 OR SRP4", "SRP5", "#1 OR #2"]
+        )
+        self.assertNotIn("WebEnv", params[0])
+        self.assertTrue(all(x["WebEnv"] == "WE1" for x in params[1:]))
+
+    @patch("mishmash.entrezpy_clients._pipelines.fetch_history")
+    @patch("mishmash.entrezpy_clients._pipelines.get_sra_history")
+    @patch("mishmash.entrezpy_clients._pipelines._search_uids")
+    def test_get_run_ids_history(self, mock_search, mock_history, mock_fetch):
+        mock_history.return_value = {"WebEnv": "WE1", "query_key": 1,
+                                     "count": 2}
+        mock_fetch.return_value.metadata = ["SRR2", "SRR1", "SRR2"]
+
+        obs = _get_run_ids(
+            "a@b.c", None, "gut[Filter]", "biosample", use_history=True
+        )
+
+        self.assertListEqual(obs, ["SRR1", "SRR2"])
+        self.assertEqual(mock_fetch.call_args.args[2], "docsum")
+        mock_search.assert_not_called()
+
+    @patch("mishmash.entrezpy_clients._pipelines._new_efetcher")
+    @patch("mishmash.entrezpy_clients._pipelines._link_and_fetch_run_ids")
+    @patch("mishmash.entrezpy_clients._pipelines.get_sra_history")
+    @patch("mishmash.entrezpy_clients._pipelines._search_uids")
+    def test_get_run_ids_history_fallback(
+            self, mock_search, mock_history, mock_link, _
+    ):
+        mock_history.side_effect = RuntimeError("request failed")
+        mock_search.return_value = (["1", "2"], [])
+        mock_link.return_value = ["SRR1"]
+
+        with self.assertLogs(_pipelines.__name__, level="WARNING") as logs:
+            obs = _get_run_ids(
+                "a@b.c", ["SRP1"], None, "", log_level="WARNING",
+                use_history=True
+            )
+
+        self.assertListEqual(obs, ["SRR1"])
+        mock_search.assert_called_once()
+        self.assertIn("falling back", logs.output[0])
+
+
+class TestAdaptiveFetch(unittest.TestCase):
+    @patch("mishmash.entrezpy_clients._pipelines._new_efetcher")
+    @patch("mishmash.entrezpy_clients._pipelines._fetch_metadata_batch")
+    def test_fetch_run_metadata_adapts_batches(self, mock_fetch, _):
+        fetched = []
+
+        def fake_fetch(efetcher, analyzer, run_ids):
+            fetched.append(run_ids)
+            return 1024 * len(run_ids), 0.01 * len(run_ids), []
+        mock_fetch.side_effect = fake_fetch
+        run_ids = [f"SRR{i}" for i in range(100)]
+        sizer = AdaptiveBatchSizer(initial=10, min_size=1)
+
+        fetch_run_metadata("a@b.c", run_ids, MagicMock(), sizer=sizer)
+
+        self.assertListEqual([len(x) for x in fetched], [10, 20, 40, 30])
+        self.assertListEqual([x for b in fetched for x in b], run_ids)
+
+    @patch.object(_pipelines, "EFETCH_MAX_ATTEMPTS", 2)
+    @patch("mishmash.entrezpy_clients._pipelines._new_efetcher")
+    @patch("mishmash.entrezpy_clients._pipelines._fetch_metadata_batch")
+    def test_fetch_run_metadata_backs_off(self, mock_fetch, _):
+        fetched = []
+
+        def fake_fetch(efetcher, analyzer, run_ids):
+            fetched.append(run_ids)
+            if "SRR3" in run_ids:
+                raise RuntimeError("request failed")
+            return 1024, 1.0, []
+        mock_fetch.side_effect = fake_fetch
+        run_ids = [f"SRR{i}" for i in range(8)]
+        sizer = AdaptiveBatchSizer(initial=8, min_size=1)
+
+        with self.assertLogs(_pipelines.__name__, level="ERROR") as logs:
+            _, failed = fetch_run_metadata(
+                "a@b.c", run_ids, MagicMock(), sizer=sizer
+            )
+
+        self.assertListEqual(
+            fetched,
+            [run_ids, run_ids[:4], run_ids[4:]]
+        )
+        self.assertListEqual(failed, [(run_ids[:4], "request failed")])
+        self.assertIn("SRR0, SRR1, SRR2, SRR3", logs.output[-1])
+        self.assertEqual(sizer.summary()["failed_batches"], 2)
+
+    def test_unparsable_batch_raises(self):
+        efetcher, analyzer = MagicMock(), MagicMock()
+        efetcher.inquire.side_effect = ExpatError("no element found")
+        parsed = MagicMock()
+        analyzer.pop_pending.return_value = [parsed]
+
+        with self.assertRaisesRegex(EUtilsError, "ExpatError"):
+            _fetch_metadata_batch(efetcher, analyzer, ["SRR1"])
+        parsed.cancel.assert_called_once()
+
+    @patch("mishmash.entrezpy_clients._pipelines._new_efetcher")
+    @patch("mishmash.entrezpy_clients._pipelines._fetch_metadata_batch")
+    def test_fetch_run_metadata_retries_unparsable(self, mock_fetch, _):
+        fetched = []
+
+        def fake_fetch(efetcher, analyzer, run_ids):
+            # the first response of SRR3 is truncated
+            future = Future()
+            if "SRR3" in run_ids and not any("SRR3" in x for x in fetched):
+                future.set_exception(ExpatError("no element found"))
+            else:
+                future.set_result(run_ids)
+            fetched.append(run_ids)
+            return 1024, 1.0, [future]
+        mock_fetch.side_effect = fake_fetch
+        merged = []
+        analyzer = MagicMock()
+        analyzer.merge_future.side_effect = \
+            lambda future: merged.extend(future.result())
+        run_ids = [f"SRR{i}" for i in range(8)]
+        sizer = AdaptiveBatchSizer(initial=4, min_size=1)
+
+        with self.assertLogs(_pipelines.__name__, level="WARNING") as logs:
+            _, failed = fetch_run_metadata(
+                "a@b.c", run_ids, analyzer, log_level="WARNING", sizer=sizer
+            )
+
+        self.assertListEqual(failed, [])
+        self.assertListEqual(sorted(merged), run_ids)
+        self.assertIn("invalid response (ExpatError", logs.output[0])
+        self.assertEqual(sizer.summary()["failed_batches"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
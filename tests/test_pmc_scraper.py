@@ -1,11 +1,16 @@
 import os
 import unittest
 import xmltodict
+from unittest.mock import patch
 
 from parameterized import parameterized
-from mishmash import PMCScraper, analyze_pdf
+from mishmash import FetchError, PMCScraper, analyze_pdf
+from mishmash.scrape_pdf import assess_articles
 from bs4 import BeautifulSoup
 
+from tests.test_runinfo import RUNINFO, make_result
+from tests.test_session import _tokenizers
+
 
 THIS_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -42,6 +47,15 @@ class TestPMCScraper(unittest.TestCase):
         res = a.get_text()
         self.assertEqual(res, expected_value)
 
+    def test_release_xml(self):
+        a = PMCScraper("id")
+        with open(self.xml_file_2) as f:
+            a.content = BeautifulSoup(f.read(), features="xml")
+        a.release_xml()
+        self.assertIsNone(a.content)
+        self.assertFalse(a.contains_blocking_comment())
+        self.assertEqual(a.get_text(), "\nIntroduction.\n")
+
     def test_get_text_exception(self):
         xml_file_1 = fpath("data/test_sample_1.xml")
         a = PMCScraper("id")
@@ -125,6 +139,52 @@ class TestPMCScraper(unittest.TestCase):
         res = a.get_number_of_records_sra()
         self.assertEqual(res, expected_res)
 
+    @parameterized.expand([
+        (RUNINFO, 3),
+        # runs listed in the tables of several accessions are counted once
+        (RUNINFO + RUNINFO, 3),
+        ("Run,spots,bases\n", 0),
+    ])
+    def test_run_count(self, runinfo, expected_res):
+        a = PMCScraper("id", "me@example.com", count_runs=True)
+        a.accession_tuples = [("PRJNA1", "PRJN"), ("SRR1000001", "SRR")]
+        with patch("mishmash.scrape_pdf.get_runinfo_by_type",
+                   return_value=make_result(runinfo)) as mock_runinfo:
+            res = a.get_number_of_records_sra()
+        self.assertEqual(res, expected_res)
+        self.assertListEqual(
+            sorted(mock_runinfo.call_args.args[1]), ["PRJNA1", "SRR1000001"]
+        )
+
+    def test_run_count_failed(self):
+        a = PMCScraper("id", count_runs=True)
+        a.accession_tuples = [("PRJNA1", "PRJN")]
+        result = make_result()
+        result.add_failed([(["PRJNA1"], "request failed")])
+        with patch("mishmash.scrape_pdf.get_runinfo_by_type",
+                   return_value=result):
+            with self.assertRaisesRegex(FetchError, "request failed"):
+                a.get_number_of_records_sra()
+
+    @patch("mishmash.scrape_pdf._tokenizers", _tokenizers)
+    def test_failed_count_recorded_in_row(self):
+        articles = [PMCScraper("1"), PMCScraper("2")]
+        for el in articles:
+            el.is_blocked = False
+            el.core_text = "The reads were deposited under PRJNA100001."
+
+        def fail(el):
+            if el.pmc_id == "1":
+                raise FetchError("esearch request failed (HTTP 500)")
+            return 2
+        with patch.object(PMCScraper, "get_number_of_records_sra", fail):
+            rows = list(assess_articles(articles))
+
+        self.assertListEqual([x["PMC ID"] for x in rows], ["1", "2"])
+        self.assertIsNone(rows[0]["Number of Sequence Records"])
+        self.assertIn("HTTP 500", rows[0]["Sequence Accessibility Badge"])
+        self.assertEqual(rows[1]["Number of Sequence Records"], 2)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,127 @@
+import os
+import tempfile
+import unittest
+import zipfile
+
+import requests
+
+from mishmash import replay
+from mishmash.entrezpy_clients import _client, _pipelines
+from mishmash.entrezpy_clients._client import (
+    EUtilsClient, EUtilsError, set_eutils_url
+)
+from mishmash.entrezpy_clients._efetch import EFetchAnalyzer
+from mishmash.entrezpy_clients._utils import RateLimiter
+from mishmash.mock_eutils import MockEUtilsServer
+from mishmash.scrape_pdf import PMCScraper
+from tests.test_efetch import RUN_IDS
+from tests.test_mock_eutils import make_data
+
+
+class TestRequestKey(unittest.TestCase):
+    def key(self, url, data=None):
+        return replay.request_key(
+            requests.Request("POST", url, data=data).prepare()
+        )
+
+    def test_independent_of_host_and_user(self):
+        self.assertEqual(
+            self.key("https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+                     "efetch.fcgi",
+                     {"id": "1", "db": "sra", "email": "me@example.com"}),
+            self.key("http://127.0.0.1:8080/efetch.fcgi?db=sra",
+                     {"id": "1", "email": "you@example.com",
+                      "api_key": "secret"}),
+        )
+        self.assertEqual(
+            self.key("http://h/efetch.fcgi", {"db": "sra", "id": "1"}),
+            "POST efetch.fcgi?db=sra&id=1"
+        )
+
+
+class TestRecordReplay(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "traffic.zip")
+        self.server = MockEUtilsServer(make_data()).start()
+        set_eutils_url(self.server.url)
+
+    def tearDown(self):
+        replay.stop()
+        self.server.stop()
+        set_eutils_url(None)
+        _client._CLIENT = None
+        self.tmp.cleanup()
+
+    def new_client(self):
+        return EUtilsClient("me@example.com", limiter=RateLimiter(1000),
+                            backoff=0)
+
+    def fetch_metadata(self, client):
+        return client.inquire(
+            "efetch",
+            {"db": "sra", "id": RUN_IDS, "rettype": "xml", "retmode": "xml"},
+            EFetchAnalyzer("ERROR"),
+        ).result.metadata_to_df()
+
+    def run_all(self):
+        run_ids = _pipelines.get_run_ids_by_type(
+            "me@example.com", ["SRP1000001"]
+        )
+        scraper = PMCScraper("PMC1000001")
+        return run_ids, scraper.contains_blocking_comment(), \
+            self.fetch_metadata(self.new_client())
+
+    def test_replay_without_network(self):
+        replay.start_recording(self.path)
+        recorded = self.run_all()
+        replay.stop()
+        self.server.stop()
+        self.server = MockEUtilsServer().start()
+
+        replay.start_replay(self.path)
+        replayed = self.run_all()
+        self.assertListEqual(replayed[0], recorded[0])
+        self.assertEqual(replayed[1], recorded[1])
+        self.assertTrue(replayed[2].equals(recorded[2]))
+        self.assertEqual(sum(self.server.stats.values()), 0)
+
+        with zipfile.ZipFile(self.path) as zf:
+            self.assertEqual(zf.getinfo("index.json").compress_type,
+                             zipfile.ZIP_LZMA)
+
+    def test_responses_replayed_in_order(self):
+        self.server.rate_limit = 1
+        client = self.new_client()
+        replay.start_recording(self.path)
+        client.post("efetch", {"db": "sra", "id": RUN_IDS[0]})
+        client.post("efetch", {"db": "sra", "id": RUN_IDS[0]})
+        replay.stop()
+        self.assertEqual(self.server.stats["rate_limited"], 1)
+
+        archive = replay.start_replay(self.path)
+        entries = archive.entries[f"POST efetch.fcgi?db=sra&id={RUN_IDS[0]}"]
+        self.assertListEqual([x[0] for x in entries], [200, 429, 200])
+        # identical responses are stored only once
+        self.assertEqual(len({x[3] for x in entries}), 2)
+        client.post("efetch", {"db": "sra", "id": RUN_IDS[0]})
+        client.post("efetch", {"db": "sra", "id": RUN_IDS[0]})
+        self.assertEqual(self.server.stats["efetch"], 3)
+
+    def test_missing_request(self):
+        replay.start_recording(self.path)
+        replay.stop()
+        replay.start_replay(self.path)
+        client = self.new_client()
+        client.max_retries = 0
+        with self.assertRaisesRegex(EUtilsError, "was not recorded"):
+            client.post("efetch", {"db": "sra", "id": RUN_IDS[0]})
+
+    def test_single_archive(self):
+        replay.start_recording(self.path)
+        with self.assertRaises(RuntimeError):
+            replay.start_replay(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
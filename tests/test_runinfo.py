@@ -0,0 +1,125 @@
+import io
+import unittest
+from unittest.mock import MagicMock, patch
+from urllib.parse import parse_qs
+
+import pandas as pd
+import responses
+
+from mishmash.entrezpy_clients import _client, _pipelines
+from mishmash.entrezpy_clients._client import EUTILS_URL
+from mishmash.entrezpy_clients._runinfo import RunInfoAnalyzer, RunInfoResult
+from mishmash.entrezpy_clients._utils import RateLimiter
+
+HEADER = (
+    "Run,ReleaseDate,spots,bases,avgLength,size_MB,Experiment,"
+    "LibraryLayout,Platform,BioSample"
+)
+RUNINFO = "\n".join([
+    HEADER,
+    "SRR1000001,2020-01-01 10:00:00,100,20000,200,5,SRX1000001,PAIRED,"
+    "ILLUMINA,SAMN1",
+    "SRR1000002,2020-01-02 10:00:00,50,10000,200,3,SRX1000001,PAIRED,"
+    "ILLUMINA,SAMN1",
+    "",
+    HEADER,
+    "SRR1000003,,7,35000,5000,,SRX1000002,SINGLE,OXFORD_NANOPORE,SAMN2",
+    "",
+])
+
+
+def make_result(text=RUNINFO, query_id="q1"):
+    result = RunInfoResult()
+    result.add_rows(io.StringIO(text), query_id)
+    return result
+
+
+class TestRunInfoResult(unittest.TestCase):
+    def test_rows_parsed_across_repeated_headers(self):
+        result = make_result()
+        self.assertListEqual(
+            result.run_ids, ["SRR1000001", "SRR1000002", "SRR1000003"]
+        )
+        self.assertListEqual(result.query_runs["q1"], result.run_ids)
+
+    def test_typed_columns(self):
+        df = make_result().to_df()
+        self.assertEqual(df.index.name, "Run")
+        self.assertEqual(str(df["spots"].dtype), "Int64")
+        self.assertEqual(str(df["bases"].dtype), "Int64")
+        self.assertTrue(pd.isna(df.loc["SRR1000003", "size_MB"]))
+        self.assertEqual(str(df["ReleaseDate"].dtype), "datetime64[ns]")
+        self.assertListEqual(
+            df["LibraryLayout"].cat.categories.tolist(), ["PAIRED", "SINGLE"]
+        )
+        self.assertEqual(df.loc["SRR1000002", "Experiment"], "SRX1000001")
+
+    def test_stats(self):
+        self.assertDictEqual(
+            make_result().stats(),
+            {"runs": 3, "spots": 157, "bases": 65000, "bytes": 8 * 2**20}
+        )
+
+    def test_runs_deduplicated(self):
+        result = make_result()
+        result.add_rows(io.StringIO(RUNINFO), "q2")
+        other = make_result("\n".join([
+            "Run,spots,Model", "SRR1000003,7,MinION", "SRR1000004,1,MinION"
+        ]))
+        result.merge(other)
+        df = result.to_df()
+        self.assertEqual(len(df), 4)
+        self.assertListEqual(result.query_runs["q2"], result.run_ids[:3])
+        self.assertTrue(pd.isna(df.loc["SRR1000001", "Model"]))
+        self.assertTrue(pd.isna(df.loc["SRR1000004", "bases"]))
+
+    def test_empty(self):
+        result = RunInfoResult()
+        self.assertTrue(result.to_df().empty)
+        self.assertEqual(result.stats()["runs"], 0)
+
+
+class TestRunInfoPipelines(unittest.TestCase):
+    def test_link_and_fetch_runinfo(self):
+        elinker, efetcher = MagicMock(), MagicMock()
+        elinker.inquire.return_value.result.get_link_parameter.return_value = \
+            {"db": "sra", "id": ["1", "2"]}
+        efetcher.id = "q1"
+        runinfo = RunInfoAnalyzer()
+
+        def fetch(params, analyzer):
+            analyzer.result.add_rows(io.StringIO(RUNINFO), efetcher.id)
+            return analyzer
+        efetcher.inquire.side_effect = fetch
+
+        obs = _pipelines._link_and_fetch_run_ids(
+            elinker, efetcher, "biosample", "ERROR", ["1"], runinfo=runinfo
+        )
+
+        self.assertListEqual(
+            obs, ["SRR1000001", "SRR1000002", "SRR1000003"]
+        )
+        params = efetcher.inquire.call_args.args[0]
+        self.assertEqual(params["rettype"], "runinfo")
+        self.assertEqual(params["retmode"], "text")
+
+    @responses.activate
+    @patch.object(_pipelines, "BATCH_SIZE", 2)
+    def test_runinfo_of_run_ids(self):
+        client = _client.EUtilsClient("me@example.com",
+                                      limiter=RateLimiter(1000))
+        responses.post(f"{EUTILS_URL}/efetch.fcgi", body=RUNINFO)
+        with patch.object(_client, "_CLIENT", client):
+            result = _pipelines.get_runinfo_by_type(
+                "me@example.com", ["SRR1000003", "SRR1000001", "SRR1000002"]
+            )
+
+        self.assertEqual(len(responses.calls), 2)
+        ids = [parse_qs(call.request.body)["id"][0]
+               for call in responses.calls]
+        self.assertListEqual(ids, ["SRR1000001,SRR1000002", "SRR1000003"])
+        self.assertEqual(result.stats()["runs"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+import pandas as pd
+
+from mishmash import FetchError, InputError, NoDataError, Session, scrape_pdf
+from mishmash.entrezpy_clients import _client
+from mishmash.entrezpy_clients._client import EUtilsClient, set_eutils_url
+from mishmash.entrezpy_clients._utils import RateLimiter
+from mishmash.mock_eutils import MockEUtilsServer
+from tests.test_efetch import RUN_IDS, fpath
+from tests.test_mock_eutils import make_data
+
+EMAIL = "me@example.com"
+
+
+def _tokenizers():
+    # punkt may not be installed (nor downloadable) where the tests run
+    return (lambda text: text.split(". "), lambda sentence: sentence.split())
+
+
+class TestSession(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        data = make_data()
+        # PMC1000001 is blocked by its publisher, PMC1000002 is not
+        with open(fpath("data/test_sample_2.xml")) as f:
+            data.add_article("PMC1000002", f.read())
+        self.server = MockEUtilsServer(data).start()
+        set_eutils_url(self.server.url)
+        # the clients of the sessions share the NCBI rate limit
+        limiter = patch.object(_client, "NCBI_RATE_LIMITER",
+                               RateLimiter(1000))
+        limiter.start()
+        self.addCleanup(limiter.stop)
+        self.session = Session(
+            EMAIL, cache_file=os.path.join(self.tmp.name, "cache.sqlite")
+        )
+
+    def tearDown(self):
+        self.session.close()
+        self.server.stop()
+        set_eutils_url(None)
+        _client._CLIENT = None
+        self.tmp.cleanup()
+
+    def test_metadata_cached_across_calls(self):
+        df = self.session.assess_metadata(["SRP1000001"])
+        self.assertListEqual(sorted(df.index), RUN_IDS)
+        fetched = self.server.stats["efetch"]
+
+        # the cache opened by the first call is reused (by another thread)
+        results = []
+        thread = threading.Thread(target=lambda: results.append(
+            self.session.assess_metadata(RUN_IDS)
+        ))
+        thread.start()
+        thread.join()
+        pd.testing.assert_frame_equal(results[0].loc[df.index], df)
+        self.assertEqual(self.server.stats["efetch"], fetched)
+
+    def test_sessions_with_other_emails(self):
+        other = Session("you@example.com")
+        self.addCleanup(other.close)
+        self.session.assess_metadata(["SRP1000001"])
+        client = self.session._get_client()
+
+        with patch.object(EUtilsClient, "close") as close:
+            other.assess_metadata(["SRP1000001"])
+            self.session.assess_metadata(["SRP1000001"], refresh=True)
+        close.assert_not_called()
+        self.assertIs(self.session._get_client(), client)
+        self.assertIsNot(other._get_client(), client)
+        self.assertIsNone(_client._CLIENT)
+
+    def test_metadata_long_layout(self):
+        records = list(self.session.assess_metadata(RUN_IDS, layout="long"))
+        self.assertSetEqual({x[0] for x in records}, set(RUN_IDS))
+
+    def test_metadata_errors(self):
+        with self.assertRaisesRegex(InputError, "accession IDs"):
+            self.session.assess_metadata()
+        with self.assertRaisesRegex(InputError, "Unknown level"):
+            self.session.assess_metadata(RUN_IDS, levels="planet")
+        with self.assertRaisesRegex(InputError, "Unknown column"):
+            self.session.assess_metadata(RUN_IDS, columns="Organism,Planet")
+        with self.assertRaisesRegex(InputError, "email"):
+            Session().assess_metadata(RUN_IDS)
+        with self.assertRaisesRegex(InputError, "number of jobs"):
+            Session(EMAIL, n_jobs=0).assess_metadata(RUN_IDS)
+        with self.assertRaises(NoDataError):
+            self.session.assess_metadata(["SRP9999999"])
+
+    @patch("mishmash.scrape_pdf._tokenizers", _tokenizers)
+    def test_sequences(self):
+        rows = self.session.iter_sequences(["PMC1000001", "PMC1000002"])
+        self.assertEqual(next(rows)["PMC ID"], "PMC1000002")
+        self.assertListEqual(list(rows), [])
+        self.assertSetEqual(self.session.blocked, {"PMC1000001"})
+
+        fetched = self.server.stats["efetch"]
+        df = self.session.assess_sequences(
+            ["PMC1000001", "PMC1000002"], include_journal_data=True
+        )
+        self.assertListEqual(df.index.tolist(), ["PMC1000002"])
+        self.assertListEqual(
+            df.columns.tolist(),
+            scrape_pdf.SEQUENCE_COLUMNS[1:] + scrape_pdf.JOURNAL_COLUMNS
+        )
+        # blocked articles are not fetched again
+        self.assertEqual(self.server.stats["efetch"], fetched + 1)
+
+    def test_sequences_fetch_failed(self):
+        # every response is cut off, also when the requests are retried
+        self.server.truncate_rate = 1.0
+        session = Session()
+        client = session._get_client()
+        client.backoff = 0
+        with self.assertRaisesRegex(FetchError, "ChunkedEncodingError"):
+            session.assess_sequences(["123"])
+        self.assertEqual(
+            self.server.stats["truncated"], client.max_retries + 1
+        )
+
+    def test_sequences_without_ids(self):
+        with self.assertRaises(InputError):
+            self.session.iter_sequences([])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,183 @@
+import json
+import logging
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from mishmash.entrezpy_clients._utils import (
+    PACKAGE_LOGGER, configure_logging, set_up_logger
+)
+from mishmash import telemetry
+from mishmash.telemetry import MemoryBudget, Metrics, RunReport, StageProfiler
+
+
+class TestLogging(unittest.TestCase):
+    def test_handlers_not_accumulated(self):
+        for _ in range(5):
+            logger = set_up_logger("INFO", logger_name="mishmash.test")
+            configure_logging("WARNING")
+        self.assertListEqual(logger.handlers, [])
+        self.assertEqual(logger.level, logging.INFO)
+        self.assertEqual(len(logging.getLogger(PACKAGE_LOGGER).handlers), 1)
+
+    def test_records_handled_once(self):
+        logger = set_up_logger("INFO", logger_name="mishmash.test")
+        handler = logging.getLogger(PACKAGE_LOGGER).handlers[0]
+        records = []
+        original, handler.emit = handler.emit, records.append
+        try:
+            set_up_logger("INFO", logger_name="mishmash.test")
+            logger.info("hello")
+        finally:
+            handler.emit = original
+        self.assertEqual(len(records), 1)
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics()
+        self.metrics.inc("mishmash_requests_total", eutil="efetch")
+        self.metrics.inc("mishmash_requests_total", 2, eutil="efetch")
+        self.metrics.inc("mishmash_requests_total", eutil="esearch")
+        self.metrics.observe("mishmash_request_seconds", 0.3,
+                             buckets=(0.1, 1.0), eutil="efetch")
+        self.metrics.observe("mishmash_request_seconds", 2.0, eutil="efetch")
+
+    def test_counters(self):
+        self.assertEqual(
+            self.metrics.value("mishmash_requests_total", eutil="efetch"), 3
+        )
+        self.assertEqual(self.metrics.value("mishmash_retries_total"), 0)
+
+    def test_histograms(self):
+        obs = self.metrics.histogram("mishmash_request_seconds",
+                                     eutil="efetch")
+        self.assertDictEqual(
+            obs, {"count": 2, "sum": 2.3,
+                  "buckets": {"0.1": 0, "1.0": 1, "+Inf": 2}}
+        )
+
+    def test_prometheus(self):
+        obs = self.metrics.to_prometheus().splitlines()
+        self.assertListEqual(obs, [
+            "# HELP mishmash_requests_total E-utilities requests sent.",
+            "# TYPE mishmash_requests_total counter",
+            'mishmash_requests_total{eutil="efetch"} 3',
+            'mishmash_requests_total{eutil="esearch"} 1',
+            "# HELP mishmash_request_seconds Duration of the E-utilities "
+            "requests.",
+            "# TYPE mishmash_request_seconds histogram",
+            'mishmash_request_seconds_bucket{eutil="efetch",le="0.1"} 0',
+            'mishmash_request_seconds_bucket{eutil="efetch",le="1.0"} 1',
+            'mishmash_request_seconds_bucket{eutil="efetch",le="+Inf"} 2',
+            'mishmash_request_seconds_sum{eutil="efetch"} 2.3',
+            'mishmash_request_seconds_count{eutil="efetch"} 2',
+        ])
+
+    def test_report_includes_metrics(self):
+        report = RunReport()
+        self.assertDictEqual(report.to_dict(), {})
+        report.record("efetch", runs=3)
+        report.metrics.inc("mishmash_rows_total", 3, stage="efetch")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "report.json")
+            report.to_json(path)
+            with open(path) as f:
+                obs = json.load(f)
+        self.assertDictEqual(obs, {
+            "efetch": {"runs": 3},
+            "metrics": {"mishmash_rows_total": {'{stage="efetch"}': 3}},
+        })
+        report.clear()
+        self.assertDictEqual(report.to_dict(), {})
+
+
+class TestStageProfiler(unittest.TestCase):
+    def setUp(self):
+        self.profiler = StageProfiler()
+
+    def test_disabled(self):
+        @self.profiler.timed("double")
+        def double(x):
+            return 2 * x
+
+        with self.profiler.stage("parse"):
+            self.assertEqual(double(2), 4)
+        self.assertDictEqual(self.profiler.summary(), {})
+
+    def test_summary(self):
+        self.profiler.enable()
+
+        @self.profiler.timed("double")
+        def double(x):
+            return 2 * x
+
+        self.assertEqual(double(2), 4)
+        with self.profiler.stage("parse"):
+            pass
+        for seconds in range(1, 21):
+            self.profiler.record("fetch", seconds)
+
+        obs = self.profiler.summary()
+        self.assertSetEqual(set(obs), {"double", "parse", "fetch"})
+        self.assertEqual(obs["double"]["calls"], 1)
+        self.assertDictEqual(
+            obs["fetch"], {"calls": 20, "total": 210, "p50": 10, "p95": 19}
+        )
+        lines = self.profiler.format_summary().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[1].startswith("fetch"))
+
+    def test_exception_recorded(self):
+        self.profiler.enable()
+        with self.assertRaises(ValueError):
+            with self.profiler.stage("parse"):
+                raise ValueError()
+        self.assertEqual(self.profiler.summary()["parse"]["calls"], 1)
+
+
+class TestMemoryProfiling(unittest.TestCase):
+    def setUp(self):
+        self.profiler = StageProfiler()
+        self.profiler.enable(memory=True)
+
+    def tearDown(self):
+        self.profiler.disable()
+
+    def test_peak_and_retained(self):
+        with self.profiler.stage("outer"):
+            kept = bytearray(4 * 2**20)
+            with self.profiler.stage("inner"):
+                freed = bytearray(8 * 2**20)
+                del freed
+
+        obs = self.profiler.memory_summary()
+        self.assertGreaterEqual(obs["inner"]["peak"], 8 * 2**20)
+        self.assertLess(obs["inner"]["retained"], 2**20)
+        self.assertGreaterEqual(obs["outer"]["peak"], 12 * 2**20)
+        self.assertGreaterEqual(obs["outer"]["retained"], 4 * 2**20)
+        self.assertEqual(obs["outer"]["calls"], 1)
+
+        sites = self.profiler.top_allocations(1)
+        self.assertGreaterEqual(sites[0]["size"], 4 * 2**20)
+        self.assertIn("test_telemetry.py", sites[0]["site"])
+        self.assertIn("inner", self.profiler.format_memory_summary())
+        del kept
+
+
+class TestMemoryBudget(unittest.TestCase):
+    @patch.object(telemetry, "_rss_bytes", return_value=900)
+    def test_approached(self, _):
+        self.assertFalse(MemoryBudget().approached())
+        self.assertFalse(MemoryBudget(2000).approached())
+        budget = MemoryBudget(1000)
+        self.assertTrue(budget.approached())
+        self.assertDictEqual(
+            budget.summary(),
+            {"limit": 1000, "threshold": 0.8, "hits": 1, "peak_usage": 900}
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()